@@ -1,4 +1,5 @@
 import os
+import pytz
 from dotenv import load_dotenv
 # config.py - Configurações do sistema
 
@@ -7,8 +8,51 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 CHAT_IDS = [int(cid) for cid in os.getenv('CHAT_IDS', '').split(',') if cid.strip()]
 
-# URL base da API do Telegram
-TELEGRAM_API_URL = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}'
+# Fuso horário de referência do sistema (previsões e horários exibidos são de Brasília)
+TZ_BR = pytz.timezone('America/Sao_Paulo')
+
+# URL base da API do Telegram; TELEGRAM_API_BASE aponta para outro servidor compatível, como o falso
+# local (fake_telegram.py), para testes de integração e de carga sem rede
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+TELEGRAM_API_URL = f'{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}'
+
+# Conexões keep-alive mantidas abertas com a API do Telegram (por pool: síncrono e assíncrono)
+TELEGRAM_POOL_CONEXOES = int(os.getenv('TELEGRAM_POOL_CONEXOES', '10'))
+
+# Disjuntor (circuit breaker) da API do Telegram: abre quando, entre as chamadas recentes (no mínimo
+# TELEGRAM_DISJUNTOR_MINIMO), a fração de falhas ou de chamadas lentas (acima de TELEGRAM_DISJUNTOR_LENTIDAO
+# segundos) chega a TELEGRAM_DISJUNTOR_TAXA; aberto, recusa as chamadas por TELEGRAM_DISJUNTOR_ABERTO segundos
+TELEGRAM_DISJUNTOR_TAXA = float(os.getenv('TELEGRAM_DISJUNTOR_TAXA', '0.5'))
+TELEGRAM_DISJUNTOR_LENTIDAO = float(os.getenv('TELEGRAM_DISJUNTOR_LENTIDAO', '5'))
+TELEGRAM_DISJUNTOR_MINIMO = int(os.getenv('TELEGRAM_DISJUNTOR_MINIMO', '10'))
+TELEGRAM_DISJUNTOR_ABERTO = float(os.getenv('TELEGRAM_DISJUNTOR_ABERTO', '30'))
+
+# Limites de envio de mensagens do Telegram (mensagens por segundo): total do bot e por chat
+TELEGRAM_LIMITE_GLOBAL = float(os.getenv('TELEGRAM_LIMITE_GLOBAL', '30'))
+TELEGRAM_LIMITE_POR_CHAT = float(os.getenv('TELEGRAM_LIMITE_POR_CHAT', '1'))
+
+# Janela (segundos) em que as perguntas de alertas novos para um mesmo chat viram um único resumo; 0 desliga
+TELEGRAM_JANELA_RESUMO = float(os.getenv('TELEGRAM_JANELA_RESUMO', '0'))
+
+# Outbox das mensagens ao Telegram: tentativas de envio antes de a mensagem ir para a tabela de falhas
+# (dead-letter) e teto (segundos) da espera entre tentativas, que dobra a cada falha
+TELEGRAM_SAIDA_TENTATIVAS = int(os.getenv('TELEGRAM_SAIDA_TENTATIVAS', '8'))
+TELEGRAM_SAIDA_ESPERA_MAXIMA = float(os.getenv('TELEGRAM_SAIDA_ESPERA_MAXIMA', '300'))
+# Prazo (segundos) de uma mensagem em envio: sem resultado até lá (thread ou callback perdidos), ela volta
+# para o outbox; deve passar da maior espera na fila de saída (limite por chat e retry_after dos 429)
+TELEGRAM_SAIDA_PRAZO_ENVIO = float(os.getenv('TELEGRAM_SAIDA_PRAZO_ENVIO', '600'))
+
+# Workers que processam a fila de updates do webhook (updates de um mesmo chat nunca em paralelo)
+TELEGRAM_WEBHOOK_WORKERS = int(os.getenv('TELEGRAM_WEBHOOK_WORKERS', '4'))
+
+# Deduplicação de updates reenviados pelo Telegram: update_ids lembrados em memória (LRU) e por quanto
+# tempo (horas) ficam registrados no banco; o Telegram desiste de reenviar um update após 24h
+TELEGRAM_DEDUP_CACHE = int(os.getenv('TELEGRAM_DEDUP_CACHE', '10000'))
+TELEGRAM_DEDUP_TTL_HORAS = int(os.getenv('TELEGRAM_DEDUP_TTL_HORAS', '24'))
+
+# Por quanto tempo (horas) as mudanças de alertas ficam no journal (alerta_mudancas) de GET /alertas/changes;
+# um cliente com versão mais antiga que isso recarrega a listagem completa
+ALERTA_MUDANCAS_RETENCAO_HORAS = int(os.getenv('ALERTA_MUDANCAS_RETENCAO_HORAS', '24'))
 
 # Configuração do banco de dados - SQLite em arquivo temporário (resolve problemas de threading)
 DATABASE_URL = "sqlite:///temp_database.db"
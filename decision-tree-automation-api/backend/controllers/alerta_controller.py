@@ -1,17 +1,43 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, and_
 from sqlalchemy.orm import Session
 from backend.models.responses_model import SessionLocal
-from backend.models.alerta_model import Alerta
-from backend.config import TELEGRAM_API_URL
-import requests
+from backend.models.alerta_model import Alerta, CATEGORIAS, filtro_categoria
+from backend.services.alerta_versao import alerta_versao
+from backend.services.alerta_mudancas import listar_mudancas, ultima_mudanca, versao_atual
+from backend.services.alerta_estado import alerta_estado
+from backend.services.alerta_contadores import resumo_contadores
+from backend.services.alerta_busca import buscar_alertas, extrair_termos
+from backend.services.alerta_serializacao import (
+    CAMPOS_ALERTA, POSICAO, TAMANHO_LOTE, selecionar_alertas, serializar_linha, linha_para_dict,
+    projetar_categoria, projetar_colunas
+)
+from backend.services.alerta_eventos import alerta_eventos, formatar_evento
+from backend.views.json_rapido import RespostaJSONRapida, RespostaJSONStream
+from backend.views.compressao import cache_compressao
+from backend.services.telegram_saida import saida_telegram
+from backend.config import TZ_BR
 from datetime import datetime, timezone, timedelta
 import pytz
+import asyncio
+import base64
+from typing import Optional
 
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Tamanho máximo de página aceito nos parâmetros limit_<categoria> de GET /alertas
+LIMITE_MAXIMO_PAGINA = 500
+
+# Acima deste total de alertas, GET /alertas é enviado em streaming (sem montar o JSON inteiro em memória)
+LIMITE_RESPOSTA_STREAM = 5000
+
+# Intervalo (segundos) entre comentários de keep-alive no stream de eventos
+INTERVALO_KEEPALIVE_STREAM = 15
+
 @router.post('/alertas')
 def criar_alerta(alerta: dict):
     db: Session = SessionLocal()
@@ -46,28 +72,10 @@ def criar_alerta(alerta: dict):
         )
         logger.info(f"Criando alerta: problema={alerta['problema']}, status_operacao=não operando")
         db.add(novo_alerta)
+        saida_telegram.registrar_pergunta(db, novo_alerta)
         db.commit()
         db.refresh(novo_alerta)
         
-        # Envia mensagem ao líder no Telegram
-        try:
-            mensagem = f"Qual o prazo para resolução do problema?\n\n{novo_alerta.problema}\n\n(Responda apenas o horário no formato HH:MM)"
-            payload = {
-                'chat_id': novo_alerta.chat_id,
-                'text': mensagem
-            }
-            resp = requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload, timeout=10)
-            if resp.ok:
-                mensagem_id = resp.json().get('result', {}).get('message_id')
-                novo_alerta.mensagem_id = mensagem_id
-                db.commit()
-                logger.info(f"Mensagem enviada ao Telegram para chat_id {novo_alerta.chat_id}")
-            else:
-                logger.warning(f'Erro ao enviar mensagem ao Telegram: {resp.status_code} - {resp.text}')
-        except Exception as e:
-            logger.error(f'Erro ao enviar mensagem ao Telegram: {str(e)}')
-            # Continua mesmo se falhar o envio da mensagem
-        
         return {"id": novo_alerta.id, "message": "Alerta criado com sucesso"}
     except HTTPException:
         raise
@@ -96,20 +104,19 @@ def atualizar_status_operacao(alerta_id: int, body: dict):
         alerta.status_operacao = novo_status
         # Se mudou para operando, salva o horário e rastreia origem
         if novo_status == 'operando':
-            tz_br = pytz.timezone('America/Sao_Paulo')
-            alerta.horario_operando = datetime.now(tz_br)
+            alerta.horario_operando = datetime.now(TZ_BR)
             
             # Rastreia a origem do encerramento baseado na categoria atual
             # A categorização será feita dinamicamente na listagem
             if alerta.previsao:
                 # Verifica se estava em atrasadas (previsão excedida)
-                now = datetime.now(tz_br)
+                now = datetime.now(TZ_BR)
                 previsao_dt = alerta.previsao_datetime
                 if previsao_dt:
                     if previsao_dt.tzinfo is None:
-                        previsao_dt = tz_br.localize(previsao_dt)
+                        previsao_dt = TZ_BR.localize(previsao_dt)
                     else:
-                        previsao_dt = previsao_dt.astimezone(tz_br)
+                        previsao_dt = previsao_dt.astimezone(TZ_BR)
                     
                     if previsao_dt < now:
                         # Estava em atrasadas
@@ -132,119 +139,279 @@ def atualizar_status_operacao(alerta_id: int, body: dict):
     finally:
         db.close()
 
-@router.get('/alertas')
-def listar_alertas():
-    db: Session = SessionLocal()
+def _codificar_cursor(criado_em, alerta_id):
+    """Cursor opaco de paginação a partir de (criado_em, id) do último alerta da página"""
+    bruto = f"{criado_em.isoformat()}|{alerta_id}"
+    return base64.urlsafe_b64encode(bruto.encode('utf-8')).decode('ascii')
+
+def _decodificar_cursor(cursor: str):
+    """Converte o cursor recebido de volta em (criado_em, id)"""
     try:
-        now = datetime.now(pytz.timezone('America/Sao_Paulo'))
-        pendentes = []
-        escaladas = []
-        atrasadas = []
-        encerradas = []
+        criado_em, alerta_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return datetime.fromisoformat(criado_em), int(alerta_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f'Cursor inválido: {cursor}')
+
+def _parse_campos(fields: Optional[str]):
+    """Converte o parâmetro fields (campos separados por vírgula) em tupla; o id é sempre incluído"""
+    if not fields:
+        return None
+    campos = []
+    for campo in fields.split(','):
+        campo = campo.strip()
+        if not campo or campo in campos:
+            continue
+        if campo not in CAMPOS_ALERTA:
+            raise HTTPException(status_code=400, detail=f'Campo inválido em fields: {campo}')
+        campos.append(campo)
+    if 'id' not in campos:
+        campos.insert(0, 'id')
+    return tuple(campos)
+
+# Filtros de igualdade aceitos por GET /alertas (parâmetro -> coluna)
+FILTROS_ALERTA = {
+    'unidade': Alerta.unidade,
+    'frente': Alerta.frente,
+    'equipamento': Alerta.equipamento,
+    'codigo_equipamento': Alerta.codigo_equipamento,
+    'tipo_operacao': Alerta.tipo_operacao,
+}
+
+def _parse_data_filtro(nome: str, valor: str):
+    """Converte um limite de criado_em (ISO 8601) para UTC sem fuso, como criado_em é gravado
+
+    Datas sem fuso são interpretadas no horário de Brasília.
+    """
+    try:
+        data = datetime.fromisoformat(valor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f'{nome} inválido: {valor} (use ISO 8601)')
+    if data.tzinfo is None:
+        data = TZ_BR.localize(data)
+    return data.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _condicoes_filtro(filtros: dict, criado_de: Optional[str], criado_ate: Optional[str]):
+    """Condições SQL dos filtros informados (lista vazia se nenhum); recusa um intervalo invertido"""
+    condicoes = [FILTROS_ALERTA[nome] == valor for nome, valor in filtros.items() if valor]
+    inicio = _parse_data_filtro('criado_de', criado_de) if criado_de else None
+    fim = _parse_data_filtro('criado_ate', criado_ate) if criado_ate else None
+    if inicio is not None and fim is not None and inicio > fim:
+        raise HTTPException(status_code=400, detail=f'criado_de ({criado_de}) é posterior a criado_ate ({criado_ate})')
+    if inicio is not None:
+        condicoes.append(Alerta.criado_em >= inicio)
+    if fim is not None:
+        condicoes.append(Alerta.criado_em <= fim)
+    return condicoes
+
+def _etag_confere(if_none_match: Optional[str], etag: str):
+    """Verifica se o cabeçalho If-None-Match do cliente já contém o ETag atual"""
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(',')]
+    return '*' in candidatos or etag in candidatos
+
+def _listar_do_banco(db: Session, limites: dict, cursores: dict, campos: tuple = None, condicoes: list = ()):
+    """Mesma listagem do estado em memória, feita no banco (usada com filtros ou se o estado não estiver carregado)
+
+    Com campos, só essas colunas (e as da paginação) são lidas do banco. As condições (filtros)
+    usam os índices compostos (unidade/frente/equipamento/... + criado_em, id) do modelo.
+
+    Categorias paginadas (com limite) vêm em listas; as sem limite vêm em geradores, que só consultam
+    o banco quando percorridos, em lotes com sessões próprias (ver _serializar_em_lotes): db pode ser
+    fechada assim que a função retorna.
+    """
+    now = datetime.now(TZ_BR)
+    categorias = {}
+    proximos_cursores = {}
+    # Lida antes das listas: o cliente pode reaplicar uma mudança, mas nunca perder uma
+    versao_mudancas = versao_atual(db)
+    colunas = None if campos is None else set(campos) | {'id', 'criado_em'}
+    
+    # Uma query por categoria, já filtrada pelo banco (filtro_categoria) e paginada por (criado_em, id):
+    # Pendentes: Alertas sem previsão
+    # Escaladas: Alertas com previsão sem a previsão ter sido excedida
+    # Atrasadas: Tempo excedido da previsão e status não operando
+    # Encerradas: Tempo excedido ou não porém com status operando
+    for categoria in CATEGORIAS:
+        limite = limites[categoria]
+        proximos_cursores[categoria] = None
+        if limite == 0:
+            categorias[categoria] = []
+            continue
         
-        logger.info(f"Listando alertas - horário atual: {now}")
+        query = selecionar_alertas(campos=colunas).where(filtro_categoria(categoria, now), *condicoes)
+        if cursores[categoria]:
+            criado_em, alerta_id = cursores[categoria]
+            query = query.where(or_(
+                Alerta.criado_em < criado_em,
+                and_(Alerta.criado_em == criado_em, Alerta.id < alerta_id)
+            ))
+        query = query.order_by(Alerta.criado_em.desc(), Alerta.id.desc())
         
-        for alerta in db.query(Alerta).order_by(Alerta.criado_em.desc()).all():
-            logger.info(f"Processando alerta ID {alerta.id}: previsao={alerta.previsao}, status_operacao={alerta.status_operacao}")
-            
-            # NOVA REGRA DE NEGÓCIO:
-            # Pendentes: Alertas sem previsão
-            # Escaladas: Alertas com previsão sem a previsão ter sido excedida
-            # Atrasadas: Tempo excedido da previsão e status não operando
-            # Encerradas: Tempo excedido ou não porém com status operando
-            
-            # 1. Pendentes: Alertas sem previsão
-            if not alerta.previsao:
-                pendentes.append(alerta)
-                logger.info(f"Alerta {alerta.id} adicionado aos pendentes (sem previsão)")
-                continue
-            
-            # 2. Encerradas: Status operando (independente da previsão)
-            if alerta.status_operacao == 'operando':
-                encerradas.append(alerta)
-                logger.info(f"Alerta {alerta.id} adicionado aos encerrados (status operando)")
-                continue
-            
-            # 3. Para alertas com previsão e status não operando, verifica se a previsão foi excedida
-            previsao_dt = alerta.previsao_datetime
-            if previsao_dt:
-                # Garante que previsao_datetime tem timezone para comparação
-                if previsao_dt.tzinfo is None:
-                    tz_br = pytz.timezone('America/Sao_Paulo')
-                    previsao_dt = tz_br.localize(previsao_dt)
-                    logger.info(f"Alerta {alerta.id}: previsao_datetime sem timezone, assumido como Brasília: {previsao_dt}")
-                else:
-                    tz_br = pytz.timezone('America/Sao_Paulo')
-                    previsao_dt = previsao_dt.astimezone(tz_br)
-                    logger.info(f"Alerta {alerta.id}: previsao_datetime com timezone, convertido para Brasília: {previsao_dt}")
-                
-                # 4. Escaladas: Com previsão, dentro da previsão e status não operando
-                if previsao_dt >= now:
-                    escaladas.append(alerta)
-                    logger.info(f"Alerta {alerta.id} adicionado aos escalados (previsão não excedida: {alerta.previsao})")
-                else:
-                    # 5. Atrasadas: Previsão excedida e status não operando
-                    atrasadas.append(alerta)
-                    logger.info(f"Alerta {alerta.id} adicionado aos atrasados (previsão excedida: {alerta.previsao})")
-            else:
-                # Se tem previsão mas não tem previsao_datetime, vai para escaladas
-                escaladas.append(alerta)
-                logger.info(f"Alerta {alerta.id} adicionado aos escalados (sem previsao_datetime)")
+        if limite is None:
+            categorias[categoria] = _serializar_em_lotes(query)
+            continue
+        # Busca um item a mais só para saber se existe próxima página
+        linhas = db.execute(query.limit(limite + 1)).all()
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            proximos_cursores[categoria] = (linhas[-1][POSICAO['criado_em']], linhas[-1][POSICAO['id']])
+        categorias[categoria] = [serializar_linha(linha) for linha in linhas]
+    
+    return categorias, proximos_cursores, versao_mudancas
+
+def _serializar_em_lotes(query, lote: int = TAMANHO_LOTE):
+    """Linhas serializadas de uma categoria sem limite, lidas do banco em lotes durante o envio
+
+    Cada lote é uma consulta keyset (criado_em, id) numa sessão própria, fechada antes de as linhas serem
+    enviadas: nenhuma transação de leitura fica aberta enquanto o cliente baixa a resposta (no SQLite,
+    ela impediria os commits). Um alerta que muda de categoria entre dois lotes pode faltar ou se repetir.
+    """
+    posicao = None
+    while True:
+        consulta = query
+        if posicao is not None:
+            criado_em, alerta_id = posicao
+            consulta = consulta.where(or_(
+                Alerta.criado_em < criado_em,
+                and_(Alerta.criado_em == criado_em, Alerta.id < alerta_id)
+            ))
+        db: Session = SessionLocal()
+        try:
+            linhas = db.execute(consulta.limit(lote)).all()
+        finally:
+            db.close()
+        for linha in linhas:
+            yield serializar_linha(linha)
+        if len(linhas) < lote:
+            return
+        posicao = (linhas[-1][POSICAO['criado_em']], linhas[-1][POSICAO['id']])
+
+def _projetar_linhas(linhas, categoria, campos):
+    """Projeta as linhas de uma categoria sob demanda (usado nas respostas em streaming)"""
+    for linha in linhas:
+        yield projetar_categoria(linha, categoria, campos)
+
+@router.get('/alertas')
+def listar_alertas(
+    request: Request,
+    limit_pendentes: Optional[int] = None,
+    limit_escaladas: Optional[int] = None,
+    limit_atrasadas: Optional[int] = None,
+    limit_encerradas: Optional[int] = None,
+    cursor_pendentes: Optional[str] = None,
+    cursor_escaladas: Optional[str] = None,
+    cursor_atrasadas: Optional[str] = None,
+    cursor_encerradas: Optional[str] = None,
+    fields: Optional[str] = None,
+    formato: Optional[str] = Query(None, alias='format'),
+    unidade: Optional[str] = None,
+    frente: Optional[str] = None,
+    equipamento: Optional[str] = None,
+    codigo_equipamento: Optional[str] = None,
+    tipo_operacao: Optional[str] = None,
+    criado_de: Optional[str] = None,
+    criado_ate: Optional[str] = None
+):
+    """Lista os alertas por categoria, com paginação por cursor (criado_em, id) opcional em cada uma
+
+    Responde com ETag derivado da versão global dos alertas e devolve 304 quando o cliente
+    envia If-None-Match com a versão atual. A versão (alerta_versao) fica na memória do processo: o ETag
+    só é válido com um único worker do uvicorn (com vários, cada processo tem a sua). Os dados vêm do estado em memória (alerta_estado),
+    sem consulta ao banco; o banco só é usado com filtros ou se o estado não foi carregado. A resposta é
+    serializada com orjson e enviada em streaming acima de LIMITE_RESPOSTA_STREAM alertas ou, quando
+    vem do banco, se alguma categoria não tem limite (lida em lotes durante o envio).
+
+    fields=id,problema,... limita os campos de cada alerta (o id sempre vem); sem ele, cada categoria
+    traz os seus campos padrão. format=columnar devolve, em cada categoria, um array por campo em vez
+    de uma lista de objetos.
+
+    Filtros (unidade, frente, equipamento, codigo_equipamento, tipo_operacao e o intervalo
+    criado_de/criado_ate em ISO 8601) são aplicados no SQL, com índices compostos: o custo de um
+    painel por unidade acompanha os alertas daquela unidade, não os da empresa toda.
+    """
+    limites = {'pendentes': limit_pendentes, 'escaladas': limit_escaladas, 'atrasadas': limit_atrasadas, 'encerradas': limit_encerradas}
+    cursores = {'pendentes': cursor_pendentes, 'escaladas': cursor_escaladas, 'atrasadas': cursor_atrasadas, 'encerradas': cursor_encerradas}
+    for categoria, limite in limites.items():
+        if limite is not None and (limite < 0 or limite > LIMITE_MAXIMO_PAGINA):
+            raise HTTPException(status_code=400, detail=f'limit_{categoria} deve estar entre 0 e {LIMITE_MAXIMO_PAGINA}')
+    cursores = {categoria: _decodificar_cursor(cursor) if cursor else None for categoria, cursor in cursores.items()}
+    campos = _parse_campos(fields)
+    if formato not in (None, 'columnar'):
+        raise HTTPException(status_code=400, detail=f'Formato inválido: {formato} (use format=columnar)')
+    condicoes = _condicoes_filtro({
+        'unidade': unidade, 'frente': frente, 'equipamento': equipamento,
+        'codigo_equipamento': codigo_equipamento, 'tipo_operacao': tipo_operacao
+    }, criado_de, criado_ate)
+    
+    # Requisição condicional: se nada mudou desde a versão que o cliente já tem, responde 304 sem ir ao banco
+    etag = alerta_versao.etag()
+    if _etag_confere(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    
+    db = None
+    try:
+        if alerta_estado.carregado and not condicoes:
+            categorias, proximos_cursores, versao_mudancas = alerta_estado.listar(limites, cursores)
+        else:
+            db: Session = SessionLocal()
+            categorias, proximos_cursores, versao_mudancas = _listar_do_banco(db, limites, cursores, campos, condicoes)
         
-        return {
-            "pendentes": [
-                {
-                    "id": a.id, "chat_id": a.chat_id, "problema": a.problema, "criado_em": a.criado_em.isoformat() if a.criado_em else None, 
-                    "nome_lider": a.nome_lider, "status_operacao": a.status_operacao, "previsao": None,
-                    "codigo": a.codigo, "unidade": a.unidade, "frente": a.frente, "equipamento": a.equipamento, "codigo_equipamento": a.codigo_equipamento,
-                    "tipo_operacao": a.tipo_operacao, "operacao": a.operacao, "nome_operador": a.nome_operador, "data_operacao": a.data_operacao.isoformat() if a.data_operacao else None, "tempo_abertura": a.tempo_abertura,
-                    "tipo_arvore": a.tipo_arvore, "justificativa": a.justificativa
-                } for a in pendentes
-            ],
-            "escaladas": [
-                {
-                    "id": a.id, "chat_id": a.chat_id, "problema": a.problema, "previsao": a.previsao, 
-                    "previsao_datetime": a.previsao_datetime.isoformat() if a.previsao_datetime else None, "respondido_em": a.respondido_em.isoformat() if a.respondido_em else None, "nome_lider": a.nome_lider, 
-                    "status_operacao": a.status_operacao, "codigo": a.codigo, "unidade": a.unidade, "frente": a.frente, "equipamento": a.equipamento, "codigo_equipamento": a.codigo_equipamento,
-                    "tipo_operacao": a.tipo_operacao, "operacao": a.operacao, "nome_operador": a.nome_operador, "data_operacao": a.data_operacao.isoformat() if a.data_operacao else None, "tempo_abertura": a.tempo_abertura,
-                    "tipo_arvore": a.tipo_arvore, "justificativa": a.justificativa
-                } for a in escaladas
-            ],
-            "atrasadas": [
-                {
-                    "id": a.id, "chat_id": a.chat_id, "problema": a.problema, "previsao": a.previsao, 
-                    "previsao_datetime": a.previsao_datetime.isoformat() if a.previsao_datetime else None, "respondido_em": a.respondido_em.isoformat() if a.respondido_em else None, "nome_lider": a.nome_lider, 
-                    "status_operacao": a.status_operacao, "codigo": a.codigo, "unidade": a.unidade, "frente": a.frente, "equipamento": a.equipamento, "codigo_equipamento": a.codigo_equipamento,
-                    "tipo_operacao": a.tipo_operacao, "operacao": a.operacao, "nome_operador": a.nome_operador, "data_operacao": a.data_operacao.isoformat() if a.data_operacao else None, "tempo_abertura": a.tempo_abertura,
-                    "tipo_arvore": a.tipo_arvore, "justificativa": a.justificativa
-                } for a in atrasadas
-            ],
-            "encerradas": [
-                {
-                    "id": a.id, "chat_id": a.chat_id, "problema": a.problema, "previsao": a.previsao, 
-                    "previsao_datetime": a.previsao_datetime.isoformat() if a.previsao_datetime else None, "respondido_em": a.respondido_em.isoformat() if a.respondido_em else None, "nome_lider": a.nome_lider, 
-                    "status_operacao": a.status_operacao, "horario_operando": a.horario_operando.isoformat() if a.horario_operando else None, "origem_encerramento": a.origem_encerramento, "codigo": a.codigo, "unidade": a.unidade, "frente": a.frente, "equipamento": a.equipamento, "codigo_equipamento": a.codigo_equipamento,
-                    "tipo_operacao": a.tipo_operacao, "operacao": a.operacao, "nome_operador": a.nome_operador, "data_operacao": a.data_operacao.isoformat() if a.data_operacao else None, "tempo_abertura": a.tempo_abertura,
-                    "tipo_arvore": a.tipo_arvore, "justificativa": a.justificativa
-                } for a in encerradas
-            ]
+        # Categorias sem limite lidas do banco chegam como geradores: o tamanho só é conhecido no envio
+        em_lotes = [categoria for categoria, linhas in categorias.items() if not isinstance(linhas, list)]
+        logger.info("Listando alertas: " + ", ".join(
+            f"{len(linhas) if isinstance(linhas, list) else 'todas as'} {categoria}"
+            for categoria, linhas in categorias.items()
+        ))
+        
+        cursores_codificados = {
+            categoria: _codificar_cursor(*cursor) if cursor else None
+            for categoria, cursor in proximos_cursores.items()
         }
+        
+        if formato == 'columnar':
+            # O formato colunar transpõe as linhas: precisa de cada categoria inteira
+            return RespostaJSONRapida({
+                **{categoria: projetar_colunas(list(linhas), categoria, campos) for categoria, linhas in categorias.items()},
+                "cursores": cursores_codificados,
+                "versao_mudancas": versao_mudancas
+            }, headers=headers)
+        
+        if em_lotes or sum(len(linhas) for linhas in categorias.values()) > LIMITE_RESPOSTA_STREAM:
+            # Cada alerta é lido (em lotes), projetado e serializado só no momento de ser enviado
+            return RespostaJSONStream({
+                **{categoria: _projetar_linhas(linhas, categoria, campos) for categoria, linhas in categorias.items()},
+                "cursores": cursores_codificados,
+                "versao_mudancas": versao_mudancas
+            }, headers=headers)
+        
+        return RespostaJSONRapida({
+            **{
+                categoria: [projetar_categoria(linha, categoria, campos) for linha in linhas]
+                for categoria, linhas in categorias.items()
+            },
+            "cursores": cursores_codificados,
+            "versao_mudancas": versao_mudancas
+        }, headers=headers)
     except Exception as e:
         logger.error(f"Erro ao listar alertas: {str(e)}")
         import traceback
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
     finally:
-        db.close()
+        if db is not None:
+            db.close()
 
 @router.post("/alertas/forcar-atualizacao")
 def forcar_atualizacao():
     """Força uma atualização dos alertas"""
     db = SessionLocal()
     try:
-        # Simplesmente retorna o status atual para forçar o frontend a recarregar
-        total_alertas = db.query(Alerta).count()
-        alertas_com_previsao = db.query(Alerta).filter(Alerta.previsao.isnot(None)).count()
+        # Simplesmente retorna o status atual para forçar o frontend a recarregar (contagens vindas dos contadores)
+        total = resumo_contadores(db)['total']
+        total_alertas = sum(total.values())
+        alertas_com_previsao = total_alertas - total['pendentes']
         
         logger.info(f"Forçando atualização - Total: {total_alertas}, Com previsão: {alertas_com_previsao}")
         
@@ -263,83 +430,190 @@ def forcar_atualizacao():
 
 @router.get("/alertas/ultima-atualizacao")
 def get_ultima_atualizacao():
-    """Retorna a data da última atualização de alertas"""
+    """Retorna a data da última atualização de alertas
+
+    Lida do registro mais recente do journal (alerta_mudancas), gravado na mesma transação de cada
+    criação, alteração (inclusive status e horario_operando) ou exclusão: uma leitura por chave primária.
+    """
     db = SessionLocal()
     try:
-        # Busca o alerta mais recentemente atualizado considerando múltiplos campos
-        ultimo_alerta_respondido = db.query(Alerta).filter(
-            Alerta.respondido_em.isnot(None)
-        ).order_by(Alerta.respondido_em.desc()).first()
-        
-        ultimo_alerta_criado = db.query(Alerta).order_by(Alerta.criado_em.desc()).first()
-        
-        ultimo_alerta_previsao = db.query(Alerta).filter(
-            Alerta.previsao_datetime.isnot(None)
-        ).order_by(Alerta.previsao_datetime.desc()).first()
-        
-        # Determina qual é o mais recente
-        timestamps = []
-        if ultimo_alerta_respondido and ultimo_alerta_respondido.respondido_em:
-            timestamps.append(('respondido_em', ultimo_alerta_respondido.respondido_em, ultimo_alerta_respondido.id))
-        
-        if ultimo_alerta_criado and ultimo_alerta_criado.criado_em:
-            timestamps.append(('criado_em', ultimo_alerta_criado.criado_em, ultimo_alerta_criado.id))
-            
-        if ultimo_alerta_previsao and ultimo_alerta_previsao.previsao_datetime:
-            timestamps.append(('previsao_datetime', ultimo_alerta_previsao.previsao_datetime, ultimo_alerta_previsao.id))
-        
-        if timestamps:
-            # Pega o timestamp mais recente
-            timestamps.sort(key=lambda x: x[1], reverse=True)
-            campo_mais_recente, timestamp_mais_recente, alerta_id = timestamps[0]
-            
-            return {
-                "ultima_atualizacao": timestamp_mais_recente.isoformat() if timestamp_mais_recente else None,
-                "alerta_id": alerta_id,
-                "campo_atualizado": campo_mais_recente,
-                "tem_atualizacao": True
-            }
-        else:
+        mudanca = ultima_mudanca(db)
+        if mudanca is None:
             return {
                 "ultima_atualizacao": None,
                 "alerta_id": None,
                 "campo_atualizado": None,
+                "tipo": None,
+                "versao_mudancas": 0,
                 "tem_atualizacao": False
             }
+        
+        registrado_em = mudanca.registrado_em
+        if registrado_em.tzinfo is None:
+            registrado_em = TZ_BR.localize(registrado_em)
+        return {
+            "ultima_atualizacao": registrado_em.isoformat(),
+            "alerta_id": mudanca.alerta_id,
+            "campo_atualizado": mudanca.campos,
+            "tipo": mudanca.tipo,
+            "versao_mudancas": mudanca.id,
+            "tem_atualizacao": True
+        }
     except Exception as e:
         logger.error(f"Erro ao buscar última atualização: {str(e)}")
         return {"error": str(e)}
     finally:
         db.close()
 
+@router.get("/alertas/changes")
+def listar_mudancas_alertas(since: int = 0):
+    """Retorna apenas os alertas criados, alterados (inclusive de categoria) ou removidos desde a versão since
+
+    A versão inicial vem em "versao_mudancas" de GET /alertas; cada resposta traz a nova versão a ser
+    usada na próxima chamada. Se "recarregar" vier true, o cliente deve buscar GET /alertas novamente.
+    """
+    db: Session = SessionLocal()
+    try:
+        versao, alterados, removidos, recarregar = listar_mudancas(db, since)
+        return RespostaJSONRapida({
+            "versao": versao,
+            "recarregar": recarregar,
+            "alterados": [linha_para_dict(serializar_linha(linha), linha[-1]) for linha in alterados],
+            "removidos": removidos
+        })
+    except Exception as e:
+        logger.error(f"Erro ao listar mudanças de alertas: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    finally:
+        db.close()
+
+@router.get("/alertas/summary")
+def resumo_alertas():
+    """Quantidade de alertas por categoria, no total e por unidade, frente e equipamento
+
+    Lido das linhas de alerta_contadores, mantidas na mesma transação de cada escrita em alertas:
+    o custo não depende do tamanho da tabela de alertas.
+    """
+    db: Session = SessionLocal()
+    try:
+        return RespostaJSONRapida(resumo_contadores(db))
+    except Exception as e:
+        logger.error(f"Erro ao montar resumo dos alertas: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    finally:
+        db.close()
+
+def _decodificar_cursor_busca(cursor: str):
+    """Converte o cursor de GET /alertas/busca de volta em (relevancia, id)"""
+    try:
+        relevancia, alerta_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return float(relevancia), int(alerta_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f'Cursor inválido: {cursor}')
+
+@router.get("/alertas/busca")
+def buscar_alertas_texto(q: str = '', limit: int = 20, cursor: Optional[str] = None):
+    """Busca textual em problema, justificativa, equipamento e operação, do mais relevante ao menos relevante
+
+    Todos os termos precisam aparecer (sem diferenciar acentos e maiúsculas); o último, se curto, vale
+    como prefixo. Usa o índice FTS5 (SQLite) / tsvector (Postgres) mantido pelo próprio banco, que também
+    calcula a relevância (bm25 / ts_rank, com o problema pesando mais que a justificativa) e ordena por ela.
+    Cada página traz "proximo_cursor" (null na última), com a relevância e o id do último resultado.
+    """
+    if limit < 1 or limit > LIMITE_MAXIMO_PAGINA:
+        raise HTTPException(status_code=400, detail=f'limit deve estar entre 1 e {LIMITE_MAXIMO_PAGINA}')
+    posicao_cursor = _decodificar_cursor_busca(cursor) if cursor else None
+    db: Session = SessionLocal()
+    try:
+        linhas, relevancias, proxima = buscar_alertas(db, q, limit, posicao_cursor)
+        resultados = []
+        for linha, relevancia in zip(linhas, relevancias):
+            alerta = linha_para_dict(serializar_linha(linha), linha[-1])
+            alerta['relevancia'] = relevancia
+            resultados.append(alerta)
+        proximo_cursor = None
+        if proxima is not None:
+            bruto = '|'.join(str(valor) for valor in proxima)
+            proximo_cursor = base64.urlsafe_b64encode(bruto.encode('utf-8')).decode('ascii')
+        return RespostaJSONRapida({
+            "termos": extrair_termos(q),
+            "resultados": resultados,
+            "proximo_cursor": proximo_cursor
+        })
+    except Exception as e:
+        logger.error(f"Erro na busca de alertas: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    finally:
+        db.close()
+
+@router.get("/alertas/stream")
+async def stream_alertas(request: Request, unidade: Optional[str] = None, frente: Optional[str] = None):
+    """Stream (Server-Sent Events) com as mudanças dos alertas assim que acontecem
+
+    Eventos: alerta_criado, status_alterado, previsao_registrada, alerta_atrasado, alerta_atualizado,
+    alerta_removido (data: {"alerta": {...com categoria}, "versao_mudancas": n}) e recarregar, quando o
+    cliente deve buscar GET /alertas de novo. unidade/frente filtram os eventos no servidor.
+    O primeiro evento (conectado) traz a versão atual; o cliente usa /alertas/changes para cobrir o
+    intervalo em que esteve desconectado.
+    """
+    assinatura = alerta_eventos.assinar(asyncio.get_running_loop(), unidade, frente)
+
+    async def gerar_eventos():
+        try:
+            yield formatar_evento('conectado', {'versao_mudancas': alerta_estado.versao_mudancas})
+            while True:
+                try:
+                    mensagem = await asyncio.wait_for(assinatura.fila.get(), timeout=INTERVALO_KEEPALIVE_STREAM)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ': keepalive\n\n'
+                    continue
+                yield mensagem
+        finally:
+            alerta_eventos.cancelar(assinatura)
+
+    return StreamingResponse(
+        gerar_eventos(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @router.get("/alertas/debug")
 def debug_alertas():
     """Endpoint para debug dos alertas"""
     db = SessionLocal()
     try:
-        total_alertas = db.query(Alerta).count()
-        pendentes = db.query(Alerta).filter(Alerta.previsao.is_(None)).count()
-        com_previsao = db.query(Alerta).filter(Alerta.previsao.isnot(None)).count()
+        total = resumo_contadores(db)['total']
+        total_alertas = sum(total.values())
+        pendentes = total['pendentes']
+        com_previsao = total_alertas - pendentes
         
         # Últimos 5 alertas
-        ultimos_alertas = db.query(Alerta).order_by(Alerta.criado_em.desc()).limit(5).all()
+        ultimos_alertas = [
+            linha_para_dict(serializar_linha(linha))
+            for linha in db.execute(selecionar_alertas().order_by(Alerta.criado_em.desc()).limit(5))
+        ]
         
-        return {
+        return RespostaJSONRapida({
             "total_alertas": total_alertas,
             "pendentes": pendentes,
             "com_previsao": com_previsao,
+            "categorias_em_memoria": alerta_estado.contagens() if alerta_estado.carregado else None,
+            "conexoes_stream": alerta_eventos.total_conexoes(),
+            "cache_compressao": cache_compressao.estatisticas(),
             "ultimos_alertas": [
                 {
-                    "id": a.id,
-                    "problema": a.problema[:50] + "..." if len(a.problema) > 50 else a.problema,
-                    "previsao": a.previsao,
-                    "previsao_datetime": a.previsao_datetime.isoformat() if a.previsao_datetime else None,
-                    "respondido_em": a.respondido_em.isoformat() if a.respondido_em else None,
-                    "status_operacao": a.status_operacao,
-                    "criado_em": a.criado_em.isoformat() if a.criado_em else None
+                    "id": a['id'],
+                    "problema": a['problema'][:50] + "..." if len(a['problema']) > 50 else a['problema'],
+                    "previsao": a['previsao'],
+                    "previsao_datetime": a['previsao_datetime'],
+                    "respondido_em": a['respondido_em'],
+                    "status_operacao": a['status_operacao'],
+                    "criado_em": a['criado_em']
                 } for a in ultimos_alertas
             ]
-        }
+        })
     except Exception as e:
         logger.error(f"Erro no debug de alertas: {str(e)}")
         return {"error": str(e)}
@@ -1,6 +1,5 @@
 # telegram_scheduler.py - Controller para envio de perguntas sob demanda
-import requests
-from backend.config import TELEGRAM_API_URL
+from backend.services.telegram_envio import fila_envio, PRIORIDADE_INFORMATIVA
 from backend.models.responses_model import set_aguardando_resposta, is_aguardando_resposta
 
 MENSAGEM_INICIAL = 'Automação de previsões'
@@ -12,8 +11,8 @@ def enviar_mensagem_inicial(user_id):
         'text': MENSAGEM_INICIAL
     }
     try:
-        resp = requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload)
-        print(f'Mensagem inicial enviada para {user_id}: {resp.status_code}')
+        fila_envio.enviar(payload, PRIORIDADE_INFORMATIVA)
+        print(f'Mensagem inicial enfileirada para {user_id}')
     except Exception as e:
         print(f'Erro ao enviar mensagem inicial para {user_id}: {e}')
 
@@ -1,13 +1,16 @@
 # telegram_webhook.py - Controller para integração com o bot do Telegram
 from fastapi import Request, HTTPException
-from backend.models.responses_model import add_response, SessionLocal
+from starlette.concurrency import run_in_threadpool
+from backend.models.responses_model import add_responses, SessionLocal
 from backend.models.alerta_model import Alerta
 from datetime import datetime, timedelta
 from backend.controllers.telegram_scheduler import enviar_pergunta_para_usuario
 import pytz
 import re
-from backend.config import TELEGRAM_API_URL
-import requests
+from backend.services.telegram_envio import PRIORIDADE_CONFIRMACAO
+from backend.services.telegram_saida import saida_telegram
+from backend.services.telegram_fila import fila_webhook
+from backend.services.alerta_previsoes import registrar_previsoes
 import logging
 import json
 import traceback
@@ -16,33 +19,107 @@ import traceback
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Função para processar webhooks do Telegram
+# Previsões aceitas numa mesma mensagem (a confirmação lista todas numa única mensagem do Telegram)
+MAXIMO_PREVISOES_POR_MENSAGEM = 50
+
+_PADRAO_HORARIO = re.compile(r'^(\d{2}):(\d{2})$')
+
+def extrair_horarios(texto: str):
+    """Lista de (texto, hora, minuto) dos horários HH:MM da mensagem, separados por espaço, vírgula,
+    ponto e vírgula ou quebra de linha; None se algum valor não for um horário válido"""
+    valores = [v for v in re.split(r'[\s,;]+', texto.strip()) if v]
+    if not valores or len(valores) > MAXIMO_PREVISOES_POR_MENSAGEM:
+        return None
+    horarios = []
+    for valor in valores:
+        match = _PADRAO_HORARIO.match(valor)
+        if not match:
+            return None
+        hora, minuto = int(match.group(1)), int(match.group(2))
+        if hora > 23 or minuto > 59:
+            return None
+        horarios.append((valor, hora, minuto))
+    return horarios
+
+def calcular_previsao(hora: int, minuto: int, agora: datetime):
+    """Datetime da previsão: hoje no horário informado, ou amanhã se esse horário já passou"""
+    previsao_dt = agora.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    if previsao_dt <= agora:
+        previsao_dt = previsao_dt + timedelta(days=1)
+    return previsao_dt
+
+def responder_sem_pendentes(db, user_id, fila_id=None):
+    """Avisa o líder de que não há alertas aguardando previsão (e conclui o update fila_id no mesmo commit)"""
+    logger.warning('Nenhum alerta pendente encontrado')
+    print('⚠️  Nenhum alerta pendente encontrado')
+    
+    # Verifica se há alertas no sistema
+    total_alertas = db.query(Alerta).count()
+    logger.info(f'Total de alertas no sistema: {total_alertas}')
+    print(f'📊 Total de alertas no sistema: {total_alertas}')
+    
+    # Lista todos os alertas para debug
+    todos_alertas = db.query(Alerta).all()
+    logger.info(f'📋 Todos os alertas: {[(a.id, a.previsao, a.status) for a in todos_alertas]}')
+    print(f'📋 Todos os alertas: {[(a.id, a.previsao, a.status) for a in todos_alertas]}')
+    
+    # Envia mensagem informando que não há alertas pendentes (pelo outbox: com o Telegram fora do ar, sai depois)
+    saida_telegram.registrar_mensagem(
+        db, user_id,
+        f'Não há alertas pendentes aguardando previsão no momento.\n\nTotal de alertas no sistema: {total_alertas}',
+        PRIORIDADE_CONFIRMACAO
+    )
+    fila_webhook.concluir_na_transacao(db, fila_id)
+    db.commit()
+    logger.info(f'Mensagem de "sem alertas" gravada no outbox para {user_id}')
+    print(f'📤 Mensagem de "sem alertas" gravada no outbox')
+    
+    return {"status": "no_pending", "msg": "Nenhum alerta pendente"}
+
+# Função que recebe os webhooks do Telegram: só grava o update na fila e responde
 async def telegram_webhook(request: Request):
-    """Processa webhooks do Telegram"""
-    logger.info("🚀 INICIANDO PROCESSAMENTO DO WEBHOOK")
-    print("🚀 INICIANDO PROCESSAMENTO DO WEBHOOK")
+    """Recebe um webhook do Telegram e o grava na fila durável (telegram_updates)
+
+    A resposta sai assim que o update está gravado, sem esperar banco de alertas nem Telegram;
+    o processamento (processar_update) é feito pelos workers da fila, em ordem por chat.
+    """
+    body = await request.body()
+    try:
+        data = json.loads(body)
+    except Exception as json_error:
+        logger.error(f'❌ Erro ao fazer parse do JSON: {json_error}')
+        return {"status": "error", "msg": f"Erro ao fazer parse do JSON: {json_error}"}
+    
+    if 'message' not in data:
+        logger.warning(f'❌ Webhook não contém mensagem: {list(data.keys())}')
+        return {"status": "ignored", "msg": "Não é uma mensagem"}
     
-    # Log de headers para debug
-    headers = dict(request.headers)
-    logger.info(f"📋 Headers recebidos: {json.dumps(headers, indent=2)}")
-    print(f"📋 Headers recebidos: {json.dumps(headers, indent=2)}")
+    # Reenvio do Telegram já visto: descartado sem tocar no banco
+    update_id = data.get('update_id')
+    if fila_webhook.ja_recebido(update_id):
+        logger.info(f'🔁 Update {update_id} reenviado pelo Telegram, ignorado')
+        return {"status": "duplicate", "update_id": update_id}
+    
+    fila_id = await run_in_threadpool(fila_webhook.enfileirar, data, body)
+    if fila_id is None:
+        logger.info(f'🔁 Update {update_id} reenviado pelo Telegram, ignorado')
+        return {"status": "duplicate", "update_id": update_id}
+    logger.info(f'📥 Update {data.get("update_id")} gravado na fila do webhook (id {fila_id})')
+    return {"status": "queued", "fila_id": fila_id}
+
+# Processa um update do Telegram (executado pelos workers da fila do webhook)
+def processar_update(data: dict, fila_id=None):
+    """Processa um update já gravado na fila: valida o líder, registra a previsão e confirma no Telegram
+
+    O commit que grava o resultado (previsões, confirmação ou aviso no outbox) também marca o update
+    fila_id da fila do webhook como concluído, na mesma transação.
+    """
+    logger.info("🚀 INICIANDO PROCESSAMENTO DO UPDATE")
+    print("🚀 INICIANDO PROCESSAMENTO DO UPDATE")
     
     try:
-        # Log do corpo da requisição
-        body = await request.body()
-        logger.info(f"📦 Body recebido (bytes): {len(body)} bytes")
-        print(f"📦 Body recebido (bytes): {len(body)} bytes")
-        
-        # Tenta fazer parse do JSON
-        try:
-            data = await request.json()
-            logger.info(f'📥 Dados JSON recebidos no webhook: {json.dumps(data, indent=2)}')
-            print(f'📥 Dados JSON recebidos no webhook: {json.dumps(data, indent=2)}')
-        except Exception as json_error:
-            logger.error(f'❌ Erro ao fazer parse do JSON: {json_error}')
-            print(f'❌ Erro ao fazer parse do JSON: {json_error}')
-            print(f'📄 Conteúdo raw: {body.decode("utf-8", errors="ignore")}')
-            return {"status": "error", "msg": f"Erro ao fazer parse do JSON: {json_error}"}
+        logger.info(f'📥 Dados JSON recebidos no webhook: {json.dumps(data, indent=2)}')
+        print(f'📥 Dados JSON recebidos no webhook: {json.dumps(data, indent=2)}')
         
         # Verifica se é uma mensagem válida
         if 'message' not in data:
@@ -89,166 +166,120 @@ async def telegram_webhook(request: Request):
         logger.info(f'✅ Usuário autorizado: {nome_lider} (ID: {user_id})')
         print(f'✅ Usuário autorizado: {nome_lider} (ID: {user_id})')
         
+        # Uma mensagem pode trazer várias previsões ("15:30 16:00 17:45" ou uma por linha),
+        # aplicadas em ordem aos alertas pendentes mais antigos
+        horarios = extrair_horarios(resposta)
+        
+        # Resposta (reply) a uma pergunta enviada pelo bot: identifica o alerta daquela mensagem
+        chat_id = str(message.get('chat', {}).get('id', user_id))
+        mensagem_respondida = (message.get('reply_to_message') or {}).get('message_id')
+        
         db = SessionLocal()
         try:
-            # Busca o alerta mais antigo sem previsão (previsao = null)
-            alerta = db.query(Alerta).filter(
-                Alerta.previsao.is_(None)
-            ).order_by(Alerta.criado_em.asc()).first()
-            
-            if not alerta:
-                logger.warning('Nenhum alerta pendente encontrado')
-                print('⚠️  Nenhum alerta pendente encontrado')
-                
-                # Verifica se há alertas no sistema
-                total_alertas = db.query(Alerta).count()
-                logger.info(f'Total de alertas no sistema: {total_alertas}')
-                print(f'📊 Total de alertas no sistema: {total_alertas}')
+            if not horarios:
+                # Formato inválido: só leitura do alerta a que a resposta se referia, para as instruções
+                alerta = None
+                if mensagem_respondida is not None:
+                    alerta = db.query(Alerta).filter(
+                        Alerta.chat_id == chat_id, Alerta.mensagem_id == mensagem_respondida
+                    ).first()
+                if alerta is None:
+                    alerta = db.query(Alerta).filter(
+                        Alerta.previsao.is_(None)
+                    ).order_by(Alerta.criado_em.asc(), Alerta.id.asc()).first()
+                if not alerta:
+                    return responder_sem_pendentes(db, user_id, fila_id)
                 
-                # Lista todos os alertas para debug
-                todos_alertas = db.query(Alerta).all()
-                logger.info(f'📋 Todos os alertas: {[(a.id, a.previsao, a.status) for a in todos_alertas]}')
-                print(f'📋 Todos os alertas: {[(a.id, a.previsao, a.status) for a in todos_alertas]}')
-                
-                # Envia mensagem informando que não há alertas pendentes
-                payload = {
-                    'chat_id': user_id,
-                    'text': f'Não há alertas pendentes aguardando previsão no momento.\n\nTotal de alertas no sistema: {total_alertas}'
-                }
-                resp_telegram = requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload, timeout=10)
-                if resp_telegram.ok:
-                    logger.info(f'Mensagem de "sem alertas" enviada para {user_id}')
-                    print(f'📤 Mensagem de "sem alertas" enviada')
-                else:
-                    logger.error(f'Erro ao enviar mensagem: {resp_telegram.status_code} - {resp_telegram.text}')
-                    print(f'❌ Erro ao enviar mensagem: {resp_telegram.status_code}')
+                # Verifica quantos alertas pendentes existem no total
+                total_pendentes = db.query(Alerta).filter(
+                    Alerta.previsao.is_(None)
+                ).count()
                 
-                return {"status": "no_pending", "msg": "Nenhum alerta pendente"}
-            
-            # Log de debug: mostra o alerta que será processado
-            logger.info(f'Alerta a ser processado: ID {alerta.id}, Criado: {alerta.criado_em}')
-            print(f'🎯 Alerta a ser processado: ID {alerta.id}')
-            print(f'   Criado em: {alerta.criado_em}')
-            print(f'   Problema: {alerta.problema[:100]}...')
-            print(f'   Status atual: {alerta.status}')
-            print(f'   Previsão atual: {alerta.previsao}')
-            
-            # Verifica quantos alertas pendentes existem no total
-            total_pendentes = db.query(Alerta).filter(
-                Alerta.previsao.is_(None)
-            ).count()
-            
-            print(f'📋 Total de alertas pendentes na fila: {total_pendentes}')
-            
-            # Validação do padrão HH:MM
-            padrao = r'^(\d{2}):(\d{2})$'
-            match = re.match(padrao, resposta)
-            if not match:
                 logger.warning(f'Formato inválido de resposta: {resposta}')
                 print(f'❌ Formato inválido: {resposta}')
                 
                 # Pede novamente com instruções claras
-                payload = {
-                    'chat_id': user_id,
-                    'text': f'Por favor, informe a previsão apenas no formato HH:MM (ex: 15:30).\n\nAlerta ID: {alerta.id}\nProblema: {alerta.problema[:100]}...\n\nAlertas na fila: {total_pendentes}'
-                }
-                resp_telegram = requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload, timeout=10)
-                if resp_telegram.ok:
-                    logger.info(f'Instruções de formato enviadas para {user_id}')
-                    print(f'📤 Instruções de formato enviadas')
-                else:
-                    logger.error(f'Erro ao enviar instruções: {resp_telegram.status_code}')
-                    print(f'❌ Erro ao enviar instruções: {resp_telegram.status_code}')
+                saida_telegram.registrar_mensagem(
+                    db, user_id,
+                    f'Por favor, informe a previsão apenas no formato HH:MM (ex: 15:30).\nPara vários alertas, envie os horários separados por espaço ou um por linha (ex: 15:30 16:00 17:45), até {MAXIMO_PREVISOES_POR_MENSAGEM} por mensagem.\n\nAlerta ID: {alerta.id}\nProblema: {alerta.problema[:100]}...\n\nAlertas na fila: {total_pendentes}',
+                    PRIORIDADE_CONFIRMACAO
+                )
+                fila_webhook.concluir_na_transacao(db, fila_id)
+                db.commit()
+                logger.info(f'Instruções de formato gravadas no outbox para {user_id}')
+                print(f'📤 Instruções de formato gravadas no outbox')
                 
                 return {"status": "invalid_format", "msg": "Formato inválido"}
             
-            # Montar datetime da previsão - CORREÇÃO: Sempre usar horário atual como base
-            hora, minuto = match.groups()
-            
-            # CORREÇÃO: Sempre usar o horário atual de Brasília como base, não a data da mensagem
+            # Sempre usa o horário atual de Brasília como base, não a data da mensagem
             tz_br = pytz.timezone('America/Sao_Paulo')
             now_br = datetime.now(tz_br)
+            previsoes = [(previsao, calcular_previsao(hora, minuto, now_br)) for previsao, hora, minuto in horarios]
             
-            # Cria o datetime da previsão para HOJE com o horário informado
-            previsao_dt = now_br.replace(hour=int(hora), minute=int(minuto), second=0, microsecond=0)
+            # Reserva e atualiza os alertas num único UPDATE ... RETURNING (o respondido via reply e/ou os
+            # pendentes mais antigos), já com a contagem dos que continuam pendentes: respostas processadas
+            # em paralelo nunca ficam com o mesmo alerta
+            alertas, alertas_restantes, resposta_direta, ignorados = registrar_previsoes(
+                db, previsoes, now_br, nome_lider, chat_id=chat_id, mensagem_respondida=mensagem_respondida
+            )
+            if not alertas:
+                return responder_sem_pendentes(db, user_id, fila_id)
+            if mensagem_respondida is not None:
+                if resposta_direta:
+                    logger.info(f'↩️ Resposta à mensagem {mensagem_respondida}: alerta {alertas[0].id}')
+                    print(f'↩️ Resposta à mensagem {mensagem_respondida}: alerta {alertas[0].id}')
+                else:
+                    logger.info(f'↩️ Mensagem {mensagem_respondida} sem alerta aguardando previsão, usando a fila')
+                    print(f'↩️ Mensagem {mensagem_respondida} sem alerta aguardando previsão, usando a fila')
             
-            # CORREÇÃO: Se a previsão está no passado, move para o próximo dia
-            if previsao_dt <= now_br:
-                # Se a previsão está no passado, move para o próximo dia
-                previsao_dt = previsao_dt + timedelta(days=1)
-                logger.info(f'Previsão ajustada para o próximo dia: {resposta} -> {previsao_dt}')
-                print(f'⏰ Previsão ajustada para o próximo dia: {resposta} -> {previsao_dt}')
-            else:
-                logger.info(f'Previsão processada: {resposta} -> {previsao_dt}')
-                print(f'⏰ Previsão processada: {resposta} -> {previsao_dt}')
+            alerta = alertas[0]
             
-            # Atualiza o alerta específico com a previsão
-            logger.info(f'Atualizando alerta {alerta.id} com previsão: {resposta}')
-            print(f'🔄 Atualizando alerta {alerta.id} com previsão: {resposta}')
+            # Cada alerta com a previsão que recebeu; horários além do número de alertas pendentes ficam sem alerta
+            aplicados = [(alerta_pendente, alerta_pendente.previsao) for alerta_pendente in alertas]
             
-            # CORREÇÃO: Usar o horário atual real para respondido_em, não dados fictícios
-            alerta.previsao = resposta
-            alerta.previsao_datetime = previsao_dt
-            alerta.respondido_em = now_br  # Usa o horário atual real
-            alerta.nome_lider = nome_lider
-            alerta.status = 'escalada'  # Muda status para escalada
+            for alerta_pendente, previsao in aplicados:
+                logger.info(f'Alerta {alerta_pendente.id} atualizado com previsão: {previsao} -> {alerta_pendente.previsao_datetime}')
+                print(f'🔄 Alerta {alerta_pendente.id} atualizado com previsão: {previsao} -> {alerta_pendente.previsao_datetime}')
             
-            # Força o commit e verifica se foi salvo
-            db.commit()
-            db.refresh(alerta)  # Recarrega o objeto do banco
+            ids_aplicados = [alerta_pendente.id for alerta_pendente, _ in aplicados]
             
-            # Verifica se a atualização foi bem-sucedida
-            alerta_atualizado = db.query(Alerta).filter(Alerta.id == alerta.id).first()
-            if alerta_atualizado and alerta_atualizado.previsao:
-                logger.info(f'✅ Alerta {alerta.id} atualizado com sucesso - Previsão: {alerta_atualizado.previsao}')
-                print(f'✅ Alerta {alerta.id} atualizado com sucesso - Previsão: {alerta_atualizado.previsao}')
-                print(f'✅ Status alterado para: {alerta_atualizado.status}')
-                print(f'✅ Timestamp de resposta: {alerta_atualizado.respondido_em}')
-                print(f'✅ Previsão datetime: {alerta_atualizado.previsao_datetime}')
+            # Confirmação única para o líder
+            if len(aplicados) == 1 and not ignorados:
+                mensagem_confirmacao = f'✅ Previsão registrada: {aplicados[0][1]}\n\n'
+                mensagem_confirmacao += f'Alerta ID: {alerta.id}\n'
+                mensagem_confirmacao += f'Problema: {alerta.problema[:100]}...'
             else:
-                logger.error(f'❌ Falha ao atualizar alerta {alerta.id}')
-                print(f'❌ Falha ao atualizar alerta {alerta.id}')
-                raise Exception("Falha ao salvar previsão no banco de dados")
+                registradas = 'previsão registrada' if len(aplicados) == 1 else 'previsões registradas'
+                mensagem_confirmacao = f'✅ {len(aplicados)} {registradas}:\n\n'
+                for alerta_pendente, previsao in aplicados:
+                    mensagem_confirmacao += f'{previsao} → Alerta {alerta_pendente.id}: {alerta_pendente.problema[:50]}...\n'
+                if ignorados:
+                    mensagem_confirmacao += f'\n⚠️ Sem alerta pendente para: {" ".join(ignorados)}\n'
+                mensagem_confirmacao += f'\nAlertas na fila: {alertas_restantes}'
             
-            # Verifica quantos alertas ainda estão pendentes
-            alertas_restantes = db.query(Alerta).filter(
-                Alerta.previsao.is_(None)
-            ).count()
-            
-            # Confirmação para o líder
-            mensagem_confirmacao = f'✅ Previsão registrada: {resposta}\n\n'
-            mensagem_confirmacao += f'Alerta ID: {alerta.id}\n'
-            mensagem_confirmacao += f'Problema: {alerta.problema[:100]}...'
+            # Uma única transação para todas as previsões da mensagem e a confirmação no outbox: com o
+            # Telegram fora do ar (disjuntor aberto), a confirmação espera no outbox e sai depois
+            saida_telegram.registrar_mensagem(db, user_id, mensagem_confirmacao, PRIORIDADE_CONFIRMACAO)
+            fila_webhook.concluir_na_transacao(db, fila_id)
+            db.commit()
             
-            payload = {
-                'chat_id': user_id,
-                'text': mensagem_confirmacao
-            }
-            resp_telegram = requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload, timeout=10)
-            if resp_telegram.ok:
-                logger.info(f'Confirmação enviada para {user_id}')
-                print(f'📤 Confirmação enviada')
-            else:
-                logger.error(f'Erro ao enviar confirmação: {resp_telegram.status_code} - {resp_telegram.text}')
-                print(f'❌ Erro ao enviar confirmação: {resp_telegram.status_code}')
+            logger.info(f'✅ {len(aplicados)} previsões registradas nos alertas {ids_aplicados}')
+            print(f'✅ {len(aplicados)} previsões registradas nos alertas {ids_aplicados}')
+            if ignorados:
+                logger.warning(f'⚠️ Horários sem alerta pendente: {ignorados}')
+                print(f'⚠️ Horários sem alerta pendente: {ignorados}')
+            logger.info(f'Confirmação gravada no outbox para {user_id}')
+            print(f'📤 Confirmação gravada no outbox')
             
-            # Armazena também como resposta geral (opcional)
-            if user_id and resposta and msg_utc:
+            # Armazena também como resposta geral (opcional), uma por alerta, numa única gravação
+            if user_id and msg_utc:
                 try:
-                    # Converte a string ISO para objeto datetime
-                    if isinstance(msg_utc, str):
-                        # Se for string, converte para datetime
-                        timestamp_dt = datetime.fromisoformat(msg_utc.replace('Z', '+00:00'))
-                    else:
-                        # Se já for datetime, usa diretamente
-                        timestamp_dt = msg_utc
-                    
-                    add_response({
+                    add_responses([{
                         'user_id': str(user_id),
-                        'pergunta': alerta.problema,
-                        'resposta': resposta,
-                        'timestamp': timestamp_dt
-                    })
+                        'pergunta': alerta_pendente.problema,
+                        'resposta': previsao,
+                        'timestamp': msg_utc
+                    } for alerta_pendente, previsao in aplicados])
                     logger.info(f'Resposta armazenada no histórico')
                     print(f'💾 Resposta armazenada no histórico')
                 except Exception as resp_error:
@@ -258,8 +289,11 @@ async def telegram_webhook(request: Request):
             
             return {
                 "status": "success", 
-                "msg": "Previsão registrada com sucesso", 
+                "msg": "Previsão registrada com sucesso" if len(aplicados) == 1 else f"{len(aplicados)} previsões registradas com sucesso",
                 "alerta_id": alerta.id,
+                "alertas_ids": ids_aplicados,
+                "previsoes_ignoradas": ignorados,
+                "resposta_direta": resposta_direta,
                 "alertas_restantes": alertas_restantes
             }
             
@@ -269,13 +303,14 @@ async def telegram_webhook(request: Request):
             print(f'❌ Erro ao processar alerta: {str(e)}')
             print(f'❌ Traceback: {traceback.format_exc()}')
             
-            # Envia mensagem de erro para o usuário
+            # Envia mensagem de erro para o usuário (as escritas do update são descartadas)
             try:
-                payload = {
-                    'chat_id': user_id,
-                    'text': '❌ Erro interno ao processar sua resposta. Tente novamente.'
-                }
-                requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload, timeout=10)
+                db.rollback()
+                saida_telegram.registrar_mensagem(
+                    db, user_id, '❌ Erro interno ao processar sua resposta. Tente novamente.', PRIORIDADE_CONFIRMACAO
+                )
+                fila_webhook.concluir_na_transacao(db, fila_id, 'erro')
+                db.commit()
             except Exception as send_error:
                 logger.error(f'Erro ao enviar mensagem de erro: {send_error}')
                 print(f'❌ Erro ao enviar mensagem de erro: {send_error}')
@@ -291,5 +326,5 @@ async def telegram_webhook(request: Request):
         print(f'❌ Traceback: {traceback.format_exc()}')
         return {"status": "error", "msg": str(e)}
     finally:
-        logger.info("🏁 FINALIZANDO PROCESSAMENTO DO WEBHOOK")
-        print("🏁 FINALIZANDO PROCESSAMENTO DO WEBHOOK") 
\ No newline at end of file
+        logger.info("🏁 FINALIZANDO PROCESSAMENTO DO UPDATE")
+        print("🏁 FINALIZANDO PROCESSAMENTO DO UPDATE") 
\ No newline at end of file
@@ -11,7 +11,9 @@ import os
 import logging
 from backend.controllers.alerta_controller import router as alerta_router
 from backend.controllers.auto_alert_controller import router as auto_alert_router
+from backend.views.compressao import CompressaoMiddleware
 from sqlalchemy import inspect
+from starlette.concurrency import run_in_threadpool
 import datetime
 
 # Configuração de logging
@@ -29,6 +31,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Comprime (br/gzip) as respostas grandes de JSON/HTML conforme o Accept-Encoding do cliente
+app.add_middleware(CompressaoMiddleware)
+
 # Inclui as rotas da API
 app.include_router(api_router)
 app.include_router(alerta_router)
@@ -84,7 +89,9 @@ def get_frontend(force_reload: bool = False):
                     "X-Frontend-Timestamp": timestamp,
                     "X-Frontend-Path": path,
                     "X-Force-Reload": str(force_reload),
-                    "X-Cache-Control": "no-cache"
+                    "X-Cache-Control": "no-cache",
+                    # Versão do conteúdo: permite reaproveitar a cópia comprimida enquanto o arquivo não muda
+                    "ETag": f'W/"frontend-{os.stat(path).st_mtime_ns}-{len(content)}-{int(force_reload)}"'
                 }
                 
                 # Se force_reload for True, adiciona um script para forçar reload
@@ -177,7 +184,9 @@ def get_frontend(force_reload: bool = False):
 @app.get("/health")
 def health_check():
     """Endpoint de health check"""
-    return {"status": "healthy", "message": "API funcionando corretamente"}
+    from backend.services.telegram_client import telegram
+    # Estado do disjuntor da API do Telegram ('fechado', 'aberto' ou 'meio_aberto'), sem chamar a API
+    return {"status": "healthy", "message": "API funcionando corretamente", "telegram": telegram.disjuntor.estado}
 
 @app.get("/debug")
 def debug_info():
@@ -299,9 +308,19 @@ def recreate_database():
         AutoAlertConfigBase.metadata.drop_all(bind=engine, checkfirst=True)
         AutoAlertConfigBase.metadata.create_all(bind=engine)
         
+        from backend.models.telegram_update_model import Base as TelegramUpdateBase
+        TelegramUpdateBase.metadata.drop_all(bind=engine, checkfirst=True)
+        TelegramUpdateBase.metadata.create_all(bind=engine)
+        
         # Força a inicialização das tabelas
         init_db()
         
+        # As tabelas foram recriadas sem passar pelas sessões: recarrega o estado em memória
+        from backend.services.alerta_estado import alerta_estado
+        from backend.services.alerta_versao import alerta_versao
+        alerta_estado.carregar()
+        alerta_versao.incrementar()
+        
         # Verifica se as tabelas foram criadas
         inspector = inspect(engine)
         tables = inspector.get_table_names()
@@ -468,16 +487,21 @@ def check_frontend_version():
 def webhook_debug():
     """Endpoint para debug completo do webhook"""
     try:
-        import requests
         from backend.config import TELEGRAM_API_URL
+        from backend.services.telegram_client import telegram, TelegramIndisponivel
+        from backend.services.telegram_fila import fila_webhook
+        from backend.services.telegram_envio import fila_envio
+        from backend.services.telegram_saida import saida_telegram
         
-        # Verifica informações do webhook
-        webhook_info_response = requests.get(f'{TELEGRAM_API_URL}/getWebhookInfo', timeout=30)
-        webhook_info = webhook_info_response.json() if webhook_info_response.ok else {"error": webhook_info_response.text}
-        
-        # Verifica informações do bot
-        bot_info_response = requests.get(f'{TELEGRAM_API_URL}/getMe', timeout=30)
-        bot_info = bot_info_response.json() if bot_info_response.ok else {"error": bot_info_response.text}
+        # Verifica informações do webhook e do bot (com o disjuntor aberto, só o estado local é mostrado)
+        try:
+            webhook_info_response = telegram.chamar('getWebhookInfo', timeout=30, verbo='GET')
+            webhook_info = webhook_info_response.json() if webhook_info_response.ok else {"error": webhook_info_response.text}
+            
+            bot_info_response = telegram.chamar('getMe', timeout=30, verbo='GET')
+            bot_info = bot_info_response.json() if bot_info_response.ok else {"error": bot_info_response.text}
+        except TelegramIndisponivel as e:
+            webhook_info = bot_info = {"error": str(e)}
         
         # Informações do ambiente
         render_url = os.getenv('RENDER_EXTERNAL_URL', 'https://decision-tree-automation-1.onrender.com')
@@ -499,7 +523,11 @@ def webhook_debug():
                 "expected_url": webhook_url,
                 "pending_updates": webhook_info.get("result", {}).get("pending_update_count", 0),
                 "last_error": webhook_info.get("result", {}).get("last_error_message")
-            }
+            },
+            "fila_webhook": fila_webhook.estatisticas(),
+            "disjuntor_telegram": telegram.disjuntor.estatisticas(),
+            "fila_envio": fila_envio.estatisticas(),
+            "outbox_telegram": saida_telegram.estatisticas()
         }
     except Exception as e:
         return {
@@ -539,6 +567,10 @@ def inicializar_sistema():
         AutoAlertConfigBase.metadata.drop_all(bind=engine, checkfirst=True)
         AutoAlertConfigBase.metadata.create_all(bind=engine)
         
+        from backend.models.telegram_update_model import Base as TelegramUpdateBase
+        TelegramUpdateBase.metadata.drop_all(bind=engine, checkfirst=True)
+        TelegramUpdateBase.metadata.create_all(bind=engine)
+        
         # Força a inicialização das tabelas
         init_db()
         
@@ -550,6 +582,19 @@ def inicializar_sistema():
         logger.info("✅ Banco de dados inicializado (dados zerados)")
         print("✅ Banco de dados inicializado (dados zerados)")
         
+        # Carrega o estado em memória das categorias de alertas (usado por GET /alertas)
+        from backend.services.alerta_estado import alerta_estado
+        alerta_estado.carregar()
+        
+        # Inicia os workers que processam os updates gravados pelo webhook do Telegram
+        from backend.services.telegram_fila import fila_webhook
+        from backend.controllers.telegram_webhook import processar_update
+        fila_webhook.iniciar(processar_update)
+        
+        # Inicia o despachante do outbox das mensagens ao Telegram (perguntas dos alertas)
+        from backend.services.telegram_saida import saida_telegram
+        saida_telegram.iniciar()
+        
     except Exception as e:
         logger.error(f"❌ Erro ao inicializar banco de dados: {e}")
         print(f"❌ Erro ao inicializar banco de dados: {e}")
@@ -559,8 +604,7 @@ def inicializar_sistema():
         logger.info("🔧 Configurando webhook do Telegram...")
         print("🔧 Configurando webhook do Telegram...")
         
-        import requests
-        from backend.config import TELEGRAM_API_URL
+        from backend.services.telegram_client import telegram
         
         # URL do webhook - usa a URL atual do Render
         render_url = os.getenv('RENDER_EXTERNAL_URL', 'https://decision-tree-automation-1.onrender.com')
@@ -575,7 +619,7 @@ def inicializar_sistema():
             'drop_pending_updates': True
         }
         
-        response = requests.post(f'{TELEGRAM_API_URL}/setWebhook', json=payload, timeout=30)
+        response = telegram.chamar('setWebhook', json=payload, timeout=30)
         
         if response.ok:
             result = response.json()
@@ -639,5 +683,19 @@ def inicializar_sistema():
         logger.error(f"❌ Erro na inicialização: {e}")
         # Continua mesmo se houver erro na inicialização
 
+# Ao encerrar, para os workers da fila do webhook e o despachante do outbox e fecha as conexões mantidas com a API do Telegram
+@app.on_event("shutdown")
+async def encerrar_sistema():
+    from backend.services.telegram_fila import fila_webhook
+    from backend.services.telegram_envio import fila_envio
+    from backend.services.telegram_saida import saida_telegram
+    from backend.services.telegram_client import telegram
+    await run_in_threadpool(fila_webhook.parar)
+    # As mensagens ainda não enviadas continuam no outbox
+    await run_in_threadpool(saida_telegram.parar)
+    await run_in_threadpool(fila_envio.parar)
+    await telegram.fechar_async()
+    telegram.fechar()
+
 # Comentário: O backend segue o padrão MVC, separando models, views e controllers.
 # O envio inicial de perguntas ocorre no evento de startup. 
\ No newline at end of file
@@ -0,0 +1,70 @@
+# alerta_busca_model.py - Índice de busca textual dos alertas (SQLite FTS5 / Postgres tsvector)
+from sqlalchemy import DDL, event, table, column
+from backend.models.alerta_model import Alerta
+
+# Colunas indexadas para a busca textual
+CAMPOS_BUSCA = ('problema', 'justificativa', 'equipamento', 'operacao')
+
+# Tamanhos de prefixo indexados: o último termo digitado com até esse número de letras é buscado como prefixo
+# sem varrer o vocabulário (prefixos mais longos custariam várias vezes o tamanho do índice)
+MAXIMO_PREFIXO = 4
+
+# Tabela virtual FTS5 (SQLite) com conteúdo externo: os textos ficam só em alertas, o índice guarda os tokens
+alertas_fts = table('alertas_fts', column('rowid'))
+
+_CAMPOS = ', '.join(CAMPOS_BUSCA)
+_NOVOS = ', '.join(f'new.{campo}' for campo in CAMPOS_BUSCA)
+_ANTIGOS = ', '.join(f'old.{campo}' for campo in CAMPOS_BUSCA)
+
+# Configuração de busca textual do Postgres: português (radicais) sem acentos, como o remove_diacritics do
+# FTS5; usada no índice e na consulta, "oleo" e "óleo" casam nos dois bancos
+CONFIGURACAO_POSTGRES = 'portuguese_unaccent'
+
+# Peso de cada campo na relevância: o termo no problema vale mais que na justificativa
+PESOS_BUSCA = {'problema': 3, 'justificativa': 1, 'equipamento': 2, 'operacao': 1}
+
+# Classe do tsvector (Postgres) de cada peso; ts_rank recebe o peso de cada classe na ordem D, C, B, A
+_CLASSES_PESO = {3: 'A', 2: 'B', 1: 'C'}
+PESOS_TS_RANK = '{0, 1, 2, 3}'
+
+# Expressão do documento no Postgres, com a classe de peso de cada campo (a mesma usada na consulta,
+# para que o índice GIN seja usado)
+DOCUMENTO_POSTGRES = " || ".join(
+    f"setweight(to_tsvector('{CONFIGURACAO_POSTGRES}', coalesce({campo}, '')), '{_CLASSES_PESO[PESOS_BUSCA[campo]]}')"
+    for campo in CAMPOS_BUSCA
+)
+
+_DDL_SQLITE = (
+    # remove_diacritics: "oleo" encontra "óleo"
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS alertas_fts USING fts5({_CAMPOS}, content='alertas', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2', prefix='{' '.join(str(n) for n in range(2, MAXIMO_PREFIXO + 1))}')",
+    # Triggers mantêm o índice em sincronia com inserções, alterações e exclusões em alertas
+    f"CREATE TRIGGER IF NOT EXISTS alertas_fts_ai AFTER INSERT ON alertas BEGIN "
+    f"INSERT INTO alertas_fts(rowid, {_CAMPOS}) VALUES (new.id, {_NOVOS}); END",
+    f"CREATE TRIGGER IF NOT EXISTS alertas_fts_ad AFTER DELETE ON alertas BEGIN "
+    f"INSERT INTO alertas_fts(alertas_fts, rowid, {_CAMPOS}) VALUES ('delete', old.id, {_ANTIGOS}); END",
+    f"CREATE TRIGGER IF NOT EXISTS alertas_fts_au AFTER UPDATE OF {_CAMPOS} ON alertas BEGIN "
+    f"INSERT INTO alertas_fts(alertas_fts, rowid, {_CAMPOS}) VALUES ('delete', old.id, {_ANTIGOS}); "
+    f"INSERT INTO alertas_fts(rowid, {_CAMPOS}) VALUES (new.id, {_NOVOS}); END",
+)
+
+for comando in _DDL_SQLITE:
+    event.listen(Alerta.__table__, 'after_create', DDL(comando).execute_if(dialect='sqlite'))
+# Os triggers são removidos junto com a tabela alertas; a tabela virtual precisa ser removida à parte
+event.listen(Alerta.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS alertas_fts').execute_if(dialect='sqlite'))
+
+# No Postgres, a configuração sem acentos (extensão unaccent antes do radical em português) e o índice GIN
+# de expressão, atualizado pelo próprio banco em cada INSERT/UPDATE
+_DDL_POSTGRES = (
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    f"DO $$ BEGIN "
+    f"IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{CONFIGURACAO_POSTGRES}') THEN "
+    f"CREATE TEXT SEARCH CONFIGURATION {CONFIGURACAO_POSTGRES} (COPY = portuguese); "
+    f"ALTER TEXT SEARCH CONFIGURATION {CONFIGURACAO_POSTGRES} "
+    f"ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem; "
+    f"END IF; END $$",
+    f"CREATE INDEX IF NOT EXISTS ix_alertas_busca ON alertas USING GIN (({DOCUMENTO_POSTGRES}))",
+)
+
+for comando in _DDL_POSTGRES:
+    event.listen(Alerta.__table__, 'after_create', DDL(comando).execute_if(dialect='postgresql'))
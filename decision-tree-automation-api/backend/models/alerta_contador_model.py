@@ -0,0 +1,20 @@
+# alerta_contador_model.py - Contadores de alertas por categoria (base do endpoint /alertas/summary)
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+from backend.models.alerta_model import Base
+
+# Dimensões em que os contadores são quebrados ('total' tem sempre valor '')
+DIMENSOES_CONTADOR = ('unidade', 'frente', 'equipamento')
+
+class AlertaContador(Base):
+    """Quantidade de alertas de uma categoria com um valor de dimensão (ex.: escaladas na unidade X)
+
+    Atualizado na mesma transação de cada escrita em Alerta (ver services/alerta_contadores.py).
+    """
+    __tablename__ = 'alerta_contadores'
+    __table_args__ = (UniqueConstraint('categoria', 'dimensao', 'valor', name='uq_alerta_contadores'),)
+
+    id = Column(Integer, primary_key=True)
+    categoria = Column(String, nullable=False)
+    dimensao = Column(String, nullable=False)  # 'total', 'unidade', 'frente' ou 'equipamento'
+    valor = Column(String, nullable=False, default='')  # '' quando o alerta não tem a dimensão preenchida
+    quantidade = Column(Integer, nullable=False, default=0)
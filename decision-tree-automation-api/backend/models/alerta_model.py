@@ -1,9 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, case, or_, and_
 from sqlalchemy.sql import func
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import create_engine
 import os
 from dotenv import load_dotenv
+from datetime import datetime, timezone
 from backend.config import DATABASE_URL
 
 Base = declarative_base()
@@ -14,12 +15,15 @@ class Alerta(Base):
     chat_id = Column(String, index=True)
     problema = Column(Text)
     mensagem_id = Column(Integer, nullable=True)
+    mensagem_linha = Column(Integer, nullable=True)  # Linha do alerta na mensagem (1 numa pergunta individual; 1..N num resumo)
     previsao = Column(Text, nullable=True)  # Null inicialmente, preenchido via Telegram
     previsao_datetime = Column(DateTime(timezone=True), nullable=True)
     status = Column(String, default='pendente')  # 'pendente', 'escalada', 'atrasada', 'encerrada'
     status_operacao = Column(String, default='não operando')  # 'operando' ou 'não operando'
     nome_lider = Column(String, nullable=True)
-    criado_em = Column(DateTime(timezone=True), server_default=func.now())
+    # Preenchido também pelo Python (com microssegundos) para que a paginação por (criado_em, id)
+    # compare valores no mesmo formato em que foram gravados
+    criado_em = Column(DateTime(timezone=True), server_default=func.now(), default=lambda: datetime.now(timezone.utc))
     respondido_em = Column(DateTime(timezone=True), nullable=True)
     horario_operando = Column(DateTime(timezone=True), nullable=True)
     origem_encerramento = Column(String, nullable=True)  # 'escalada' ou 'atrasada' - rastreia origem quando encerrado
@@ -36,6 +40,74 @@ class Alerta(Base):
     tempo_abertura = Column(String, nullable=True)
     tipo_arvore = Column(String, nullable=True)
     justificativa = Column(Text, nullable=True)
+    # Categoria sob a qual o alerta está contado em alerta_contadores (mantida pelos hooks de sessão)
+    categoria_contada = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Índice composto com as colunas usadas na categorização (ver categoria_alerta)
+        Index('ix_alertas_categoria', 'previsao', 'status_operacao', 'previsao_datetime'),
+        # Índice para a ordenação da listagem (mais recentes primeiro)
+        Index('ix_alertas_criado_em_id', 'criado_em', 'id'),
+        # Índice para a paginação por categoria (encerradas/escaladas/atrasadas por status)
+        Index('ix_alertas_status_criado_em', 'status_operacao', 'criado_em', 'id'),
+        # Índices dos filtros de GET /alertas, já na ordem da listagem (criado_em, id)
+        Index('ix_alertas_unidade_frente_criado_em', 'unidade', 'frente', 'criado_em', 'id'),
+        Index('ix_alertas_frente_criado_em', 'frente', 'criado_em', 'id'),
+        Index('ix_alertas_equipamento_criado_em', 'equipamento', 'criado_em', 'id'),
+        Index('ix_alertas_codigo_equipamento_criado_em', 'codigo_equipamento', 'criado_em', 'id'),
+        Index('ix_alertas_tipo_operacao_criado_em', 'tipo_operacao', 'criado_em', 'id'),
+        # Índice para encontrar as escaladas cujo prazo venceu desde a última contagem
+        Index('ix_alertas_categoria_contada_previsao', 'categoria_contada', 'previsao_datetime'),
+        # Resposta do líder (reply) à pergunta enviada: leva direto aos alertas daquela mensagem, por linha
+        Index('ux_alertas_chat_mensagem', 'chat_id', 'mensagem_id', 'mensagem_linha', unique=True),
+    )
+
+# Categorias da listagem, na ordem em que são retornadas
+CATEGORIAS = ('pendentes', 'escaladas', 'atrasadas', 'encerradas')
+
+def filtro_categoria(categoria, agora):
+    """Condição SQL que seleciona os alertas de uma categoria (mesma regra de categoria_alerta)"""
+    sem_previsao = or_(Alerta.previsao.is_(None), Alerta.previsao == '')
+    com_previsao = and_(Alerta.previsao.isnot(None), Alerta.previsao != '')
+    nao_operando = or_(Alerta.status_operacao.is_(None), Alerta.status_operacao != 'operando')
+    
+    if categoria == 'pendentes':
+        return sem_previsao
+    if categoria == 'encerradas':
+        return and_(com_previsao, Alerta.status_operacao == 'operando')
+    if categoria == 'escaladas':
+        return and_(com_previsao, nao_operando, or_(Alerta.previsao_datetime.is_(None), Alerta.previsao_datetime >= agora))
+    if categoria == 'atrasadas':
+        return and_(com_previsao, nao_operando, Alerta.previsao_datetime < agora)
+    raise ValueError(f'Categoria inválida: {categoria}')
+
+def categoria_alerta(agora):
+    """Expressão SQL (CASE) que classifica o alerta em pendentes, encerradas, escaladas ou atrasadas
+
+    Mesma regra de negócio da listagem: sem previsão -> pendentes; operando -> encerradas;
+    previsão ainda não excedida (ou sem previsao_datetime) -> escaladas; caso contrário -> atrasadas.
+    """
+    return case(
+        (or_(Alerta.previsao.is_(None), Alerta.previsao == ''), 'pendentes'),
+        (Alerta.status_operacao == 'operando', 'encerradas'),
+        (or_(Alerta.previsao_datetime.is_(None), Alerta.previsao_datetime >= agora), 'escaladas'),
+        else_='atrasadas'
+    )
+
+def classificar_alerta(previsao, status_operacao, previsao_datetime, agora):
+    """Mesma regra de categoria_alerta, em Python, para valores já carregados
+
+    Datas sem fuso são horário de Brasília (como gravadas no banco); agora deve estar no fuso de Brasília.
+    """
+    if previsao is None or previsao == '':
+        return 'pendentes'
+    if status_operacao == 'operando':
+        return 'encerradas'
+    if previsao_datetime is None:
+        return 'escaladas'
+    if previsao_datetime.tzinfo is not None:
+        previsao_datetime = previsao_datetime.astimezone(agora.tzinfo)
+    return 'escaladas' if previsao_datetime.replace(tzinfo=None) >= agora.replace(tzinfo=None) else 'atrasadas'
 
 # Função para inicializar o banco de dados (recriado a cada deploy)
 def init_database():
@@ -0,0 +1,17 @@
+# alerta_mudanca_model.py - Journal de mudanças dos alertas (base do endpoint /alertas/changes)
+from sqlalchemy import Column, Integer, String, DateTime
+from backend.models.alerta_model import Base
+
+class AlertaMudanca(Base):
+    """Uma linha por alerta criado, alterado ou removido; o id é a versão usada em ?since="""
+    __tablename__ = 'alerta_mudancas'
+    # AUTOINCREMENT no SQLite garante que ids (versões) nunca sejam reaproveitados
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    alerta_id = Column(Integer, index=True, nullable=False)
+    tipo = Column(String, nullable=False)  # 'upsert' ou 'delete'
+    # Campos alterados separados por vírgula ('criado_em' na criação; None em exclusões e alterações em massa)
+    campos = Column(String, nullable=True)
+    # Horário de Brasília, comparável com Alerta.previsao_datetime
+    registrado_em = Column(DateTime(timezone=True), nullable=False)
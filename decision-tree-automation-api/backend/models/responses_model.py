@@ -8,6 +8,10 @@ from sqlalchemy.sql import func
 from dotenv import load_dotenv
 from backend.models.alerta_model import Alerta, Base as AlertaBase, force_recreate_alerta_table
 from backend.models.auto_alert_config_model import AutoAlertConfig, Base as AutoAlertConfigBase
+from backend.models.telegram_update_model import Base as TelegramUpdateBase
+from backend.models.alerta_mudanca_model import AlertaMudanca  # Registra a tabela no metadata dos alertas
+from backend.models.alerta_contador_model import AlertaContador  # Registra a tabela no metadata dos alertas
+from backend.models import alerta_busca_model  # Índice de busca textual (FTS5/tsvector) da tabela alertas
 from backend.config import DATABASE_URL
 
 load_dotenv()
@@ -42,6 +46,7 @@ def init_db():
     Base.metadata.create_all(bind=engine)
     AlertaBase.metadata.create_all(bind=engine)
     AutoAlertConfigBase.metadata.create_all(bind=engine)
+    TelegramUpdateBase.metadata.create_all(bind=engine)
 
 def add_response(response_data: dict):
     """Adiciona uma nova resposta ao banco"""
@@ -58,6 +63,18 @@ def add_response(response_data: dict):
     finally:
         db.close()
 
+def add_responses(lista: List[dict]):
+    """Adiciona várias respostas ao banco numa única transação"""
+    db = SessionLocal()
+    try:
+        db.add_all([Response(**response_data) for response_data in lista])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
 def get_responses(user_id: str = None, limit: int = 100):
     """Busca respostas do banco"""
     db = SessionLocal()
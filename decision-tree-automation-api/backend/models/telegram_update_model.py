@@ -0,0 +1,67 @@
+# telegram_update_model.py - Fila durável dos updates recebidos no webhook do Telegram e outbox das mensagens enviadas
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+class AtualizacaoTelegram(Base):
+    """Um update do Telegram gravado como chegou, à espera de processamento pelos workers da fila"""
+    __tablename__ = 'telegram_updates'
+    __table_args__ = (
+        # Próximo update pendente, em ordem de chegada
+        Index('ix_telegram_updates_status_id', 'status', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = Column(Integer, primary_key=True)  # Ordem de chegada
+    update_id = Column(Integer, nullable=True)
+    chat_id = Column(String, nullable=True)  # Updates do mesmo chat são processados em ordem
+    corpo = Column(Text, nullable=False)  # JSON bruto recebido
+    status = Column(String, nullable=False, default='pendente')  # 'pendente', 'processando', 'concluido' ou 'erro'
+    tentativas = Column(Integer, nullable=False, default=0)
+    resultado = Column(Text, nullable=True)
+    recebido_em = Column(DateTime(timezone=True), nullable=False)
+    processado_em = Column(DateTime(timezone=True), nullable=True)
+
+class UpdateRecebido(Base):
+    """update_id já aceito pelo webhook: um reenvio do Telegram com o mesmo update_id é ignorado"""
+    __tablename__ = 'telegram_updates_recebidos'
+
+    update_id = Column(Integer, primary_key=True, autoincrement=False)
+    recebido_em = Column(DateTime(timezone=True), nullable=False, index=True)  # Removido após o TTL
+
+class MensagemSaida(Base):
+    """Outbox: mensagem a enviar ao Telegram, gravada na mesma transação que a originou (ex.: o alerta)"""
+    __tablename__ = 'telegram_saida'
+    __table_args__ = (
+        # Próximas mensagens a enviar, por status e horário da próxima tentativa
+        Index('ix_telegram_saida_status_proxima', 'status', 'proxima_tentativa'),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String, nullable=False)  # 'pergunta' (pergunta de um alerta, pode virar resumo) ou 'mensagem'
+    chat_id = Column(String, nullable=False)
+    alerta_id = Column(Integer, nullable=True)
+    texto = Column(Text, nullable=False)  # Problema do alerta (tipo 'pergunta') ou o texto final (tipo 'mensagem')
+    prioridade = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default='pendente')  # 'pendente' ou 'enviando'
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa = Column(DateTime(timezone=True), nullable=False)
+    ultimo_erro = Column(Text, nullable=True)
+    criado_em = Column(DateTime(timezone=True), nullable=False)
+
+class MensagemFalha(Base):
+    """Dead-letter: mensagem do outbox que esgotou as tentativas ou foi recusada de forma definitiva"""
+    __tablename__ = 'telegram_saida_falhas'
+
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String, nullable=False)
+    chat_id = Column(String, nullable=False)
+    alerta_id = Column(Integer, nullable=True)
+    texto = Column(Text, nullable=False)
+    prioridade = Column(Integer, nullable=False)
+    tentativas = Column(Integer, nullable=False)
+    ultimo_erro = Column(Text, nullable=True)
+    criado_em = Column(DateTime(timezone=True), nullable=False)
+    falhou_em = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,106 @@
+# alerta_busca.py - Busca textual nos alertas (problema, justificativa, equipamento, operação) com ranking
+import re
+import unicodedata
+from datetime import datetime
+from sqlalchemy import Float, and_, cast, func, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+from backend.config import TZ_BR
+from backend.models.alerta_model import Alerta, categoria_alerta
+from backend.models.alerta_busca_model import (
+    alertas_fts, CAMPOS_BUSCA, CONFIGURACAO_POSTGRES, DOCUMENTO_POSTGRES, MAXIMO_PREFIXO, PESOS_BUSCA, PESOS_TS_RANK
+)
+from backend.services.alerta_serializacao import POSICAO, selecionar_alertas
+
+# Termos considerados por busca (o restante do texto é ignorado)
+MAXIMO_TERMOS_BUSCA = 8
+
+_alertas = Alerta.__table__
+
+_TERMO = re.compile(r'\w+', re.UNICODE)
+
+# Letras latinas acentuadas -> letra base (tabela para str.translate, montada uma vez)
+_SEM_ACENTOS = {
+    codigo: unicodedata.normalize('NFKD', chr(codigo))[0]
+    for codigo in range(0xC0, 0x250)
+    if unicodedata.normalize('NFKD', chr(codigo)) != chr(codigo)
+}
+
+def _normalizar(texto: str):
+    """Minúsculas e sem acentos, como o tokenizador do índice (unicode61 remove_diacritics)"""
+    return texto.lower().translate(_SEM_ACENTOS)
+
+def extrair_termos(texto: str):
+    """Palavras do texto digitado pelo operador, normalizadas e sem operadores da sintaxe de busca"""
+    return _TERMO.findall(_normalizar(texto or ''))[:MAXIMO_TERMOS_BUSCA]
+
+def _busca_por_prefixo(termos: list):
+    """O último termo é tratado como palavra incompleta (digitação em andamento) se o índice cobre o prefixo"""
+    return len(termos[-1]) <= MAXIMO_PREFIXO
+
+def _consulta_fts5(termos: list):
+    """Todos os termos, entre aspas (sem interpretar operadores do FTS5)"""
+    partes = [f'"{termo}"' for termo in termos]
+    if _busca_por_prefixo(termos):
+        partes[-1] += '*'
+    return ' '.join(partes)
+
+def _consulta_tsquery(termos: list):
+    partes = list(termos)
+    if _busca_por_prefixo(termos):
+        partes[-1] += ':*'
+    return ' & '.join(partes)
+
+def _ranqueados(db: Session, termos: list):
+    """Subconsulta (id, relevancia) dos alertas que contêm todos os termos, com a relevância calculada pelo
+    próprio banco a partir de PESOS_BUSCA: bm25 do FTS5 (negado: maior = mais relevante) / ts_rank do Postgres
+    """
+    if db.get_bind().dialect.name == 'postgresql':
+        documento = literal_column(DOCUMENTO_POSTGRES)
+        tsquery = func.to_tsquery(CONFIGURACAO_POSTGRES, _consulta_tsquery(termos))
+        # ts_rank devolve real; em double precision o valor do cursor volta ao banco sem arredondar
+        pontos = cast(func.ts_rank(literal_column(f"'{PESOS_TS_RANK}'::float4[]"), documento, tsquery), Float)
+        return select(_alertas.c.id, pontos.label('relevancia')).where(documento.op('@@')(tsquery)).subquery()
+    pesos = ', '.join(str(PESOS_BUSCA[campo]) for campo in CAMPOS_BUSCA)
+    return (
+        select(alertas_fts.c.rowid.label('id'), (-literal_column(f'bm25(alertas_fts, {pesos})')).label('relevancia'))
+        .where(text('alertas_fts MATCH :consulta_fts').bindparams(consulta_fts=_consulta_fts5(termos)))
+        .subquery()
+    )
+
+def buscar_alertas(db: Session, texto: str, limite: int, cursor=None):
+    """Alertas que contêm todos os termos, do mais relevante ao menos relevante (empate: mais recente primeiro)
+
+    Retorna (linhas de selecionar_alertas() com a categoria no final, relevâncias, próxima posição).
+    cursor e próxima posição = (relevancia, id) da última linha da página (paginação keyset pela
+    relevância); None na última página. O banco pontua todos os alertas que casam com a busca e ordena;
+    as linhas completas são lidas só para a página.
+    """
+    termos = extrair_termos(texto)
+    if not termos:
+        return [], [], None
+    ranqueados = _ranqueados(db, termos)
+    consulta = select(ranqueados.c.id, ranqueados.c.relevancia)
+    if cursor is not None:
+        relevancia_cursor, id_cursor = cursor
+        consulta = consulta.where(or_(
+            ranqueados.c.relevancia < relevancia_cursor,
+            and_(ranqueados.c.relevancia == relevancia_cursor, ranqueados.c.id < id_cursor)
+        ))
+    pagina = db.execute(
+        consulta.order_by(ranqueados.c.relevancia.desc(), ranqueados.c.id.desc()).limit(limite + 1)
+    ).all()
+    ha_mais = len(pagina) > limite
+    pagina = pagina[:limite]
+    if not pagina:
+        return [], [], None
+
+    agora = datetime.now(TZ_BR)
+    linhas = {
+        linha[POSICAO['id']]: linha for linha in db.execute(
+            selecionar_alertas(categoria_alerta(agora).label('categoria'))
+            .where(Alerta.id.in_([alerta_id for alerta_id, _ in pagina]))
+        )
+    }
+    proxima = (pagina[-1][1], pagina[-1][0]) if ha_mais else None
+    pagina = [(alerta_id, pontos) for alerta_id, pontos in pagina if alerta_id in linhas]
+    return [linhas[alerta_id] for alerta_id, _ in pagina], [pontos for _, pontos in pagina], proxima
@@ -0,0 +1,196 @@
+# alerta_contadores.py - Contadores de alertas por categoria/unidade/frente/equipamento (GET /alertas/summary)
+import logging
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, func, insert, select, update, delete
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from backend.config import TZ_BR
+from backend.models.alerta_model import Alerta, CATEGORIAS, categoria_alerta, classificar_alerta
+from backend.models.alerta_contador_model import AlertaContador, DIMENSOES_CONTADOR
+from backend.models.responses_model import SessionLocal
+from backend.services.alerta_mudancas import registrar_mudancas
+
+logger = logging.getLogger(__name__)
+
+_contadores = AlertaContador.__table__
+_alertas = Alerta.__table__
+
+def _chaves(categoria, unidade, frente, equipamento):
+    """Linhas de contador (categoria, dimensão, valor) em que um alerta é contado"""
+    valores = {'unidade': unidade, 'frente': frente, 'equipamento': equipamento}
+    chaves = [(categoria, 'total', '')]
+    chaves.extend((categoria, dimensao, valores[dimensao] or '') for dimensao in DIMENSOES_CONTADOR)
+    return chaves
+
+def _aplicar_deltas(conexao, deltas: dict):
+    """Soma os deltas nas linhas de contador, criando as que ainda não existem"""
+    for (categoria, dimensao, valor), delta in deltas.items():
+        if delta == 0:
+            continue
+        resultado = conexao.execute(
+            update(_contadores)
+            .where(_contadores.c.categoria == categoria, _contadores.c.dimensao == dimensao, _contadores.c.valor == valor)
+            .values(quantidade=_contadores.c.quantidade + delta)
+        )
+        if resultado.rowcount == 0:
+            conexao.execute(insert(_contadores).values(categoria=categoria, dimensao=dimensao, valor=valor, quantidade=delta))
+
+def contar_transicoes(conexao, transicoes):
+    """Ajusta os contadores de alertas que mudaram de categoria numa escrita feita com Core (fora do flush)
+
+    transicoes: [(categoria anterior, categoria nova, unidade, frente, equipamento), ...]
+    """
+    deltas = defaultdict(int)
+    for anterior, nova, unidade, frente, equipamento in transicoes:
+        for chave in _chaves(anterior, unidade, frente, equipamento):
+            deltas[chave] -= 1
+        for chave in _chaves(nova, unidade, frente, equipamento):
+            deltas[chave] += 1
+    _aplicar_deltas(conexao, deltas)
+
+def _valor_anterior(obj, campo):
+    """Valor do atributo antes das mudanças pendentes na sessão"""
+    historico = get_history(obj, campo)
+    if historico.deleted:
+        return historico.deleted[0]
+    if historico.unchanged:
+        return historico.unchanged[0]
+    return None
+
+# Hooks de sessão: cada escrita em Alerta ajusta os contadores na mesma transação
+
+@event.listens_for(SessionLocal, 'before_flush')
+def _atualizar_contadores(session, flush_context, instances):
+    agora = datetime.now(TZ_BR)
+    deltas = defaultdict(int)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Alerta):
+            continue
+        if obj not in session.new:
+            # Retira a contribuição anterior (categoria em que estava contado e dimensões antigas)
+            categoria_anterior = _valor_anterior(obj, 'categoria_contada')
+            if categoria_anterior:
+                for chave in _chaves(categoria_anterior, _valor_anterior(obj, 'unidade'),
+                                     _valor_anterior(obj, 'frente'), _valor_anterior(obj, 'equipamento')):
+                    deltas[chave] -= 1
+        if obj in session.deleted:
+            continue
+        categoria = classificar_alerta(obj.previsao, obj.status_operacao, obj.previsao_datetime, agora)
+        obj.categoria_contada = categoria
+        for chave in _chaves(categoria, obj.unidade, obj.frente, obj.equipamento):
+            deltas[chave] += 1
+    if deltas:
+        _aplicar_deltas(session.connection(), deltas)
+
+@event.listens_for(SessionLocal, 'do_orm_execute')
+def _contar_escrita_em_massa(orm_execute_state):
+    """query(Alerta).delete() desconta os alertas afetados antes da execução; update() em massa, que
+    não passa pelo flush, faz os contadores serem recalculados antes do commit"""
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    if not any(mapper.class_ is Alerta for mapper in orm_execute_state.all_mappers):
+        return
+    if orm_execute_state.is_update:
+        orm_execute_state.session.info['recalcular_contadores'] = True
+        return
+    afetados = select(
+        _alertas.c.categoria_contada, _alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento, func.count()
+    ).where(_alertas.c.categoria_contada.isnot(None)).group_by(
+        _alertas.c.categoria_contada, _alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento
+    )
+    if orm_execute_state.statement.whereclause is not None:
+        afetados = afetados.where(orm_execute_state.statement.whereclause)
+    conexao = orm_execute_state.session.connection()
+    deltas = defaultdict(int)
+    for categoria, unidade, frente, equipamento, quantidade in conexao.execute(afetados):
+        for chave in _chaves(categoria, unidade, frente, equipamento):
+            deltas[chave] -= quantidade
+    _aplicar_deltas(conexao, deltas)
+
+@event.listens_for(SessionLocal, 'before_commit')
+def _recalcular_apos_update_em_massa(session):
+    if session.info.pop('recalcular_contadores', False):
+        recalcular_contadores(session.connection())
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def _descartar_recalculo(session):
+    session.info.pop('recalcular_contadores', None)
+
+def recalcular_contadores(conexao):
+    """Reclassifica todos os alertas e reconstrói os contadores do zero (O(n), só para casos excepcionais)"""
+    agora = datetime.now(TZ_BR)
+    conexao.execute(update(_alertas).values(categoria_contada=categoria_alerta(agora)))
+    conexao.execute(delete(_contadores))
+    deltas = defaultdict(int)
+    agrupados = select(
+        _alertas.c.categoria_contada, _alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento, func.count()
+    ).group_by(_alertas.c.categoria_contada, _alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento)
+    for categoria, unidade, frente, equipamento, quantidade in conexao.execute(agrupados):
+        for chave in _chaves(categoria, unidade, frente, equipamento):
+            deltas[chave] += quantidade
+    _aplicar_deltas(conexao, deltas)
+    logger.info("Contadores de alertas recalculados")
+
+def aplicar_vencimentos(db: Session):
+    """Move para atrasadas os alertas contados como escaladas cujo prazo já venceu
+
+    Vencer a previsão muda a categoria sem nenhuma escrita no alerta; esta função aplica essas
+    transições (consulta indexada por categoria_contada/previsao_datetime, só as novas), ajusta os
+    contadores e grava cada passagem uma única vez no journal, tudo na mesma transação. Usa Core (sem
+    ORM), então não passa pelos hooks de sessão. Chamada pela thread de prazos do estado (alerta_estado).
+    """
+    agora = datetime.now(TZ_BR)
+    vencidos = db.execute(
+        select(_alertas.c.id, _alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento).where(
+            _alertas.c.categoria_contada == 'escaladas',
+            _alertas.c.previsao_datetime < agora
+        )
+    ).all()
+    if not vencidos:
+        return 0
+    ids = [linha[0] for linha in vencidos]
+    db.execute(update(_alertas).where(_alertas.c.id.in_(ids)).values(categoria_contada='atrasadas'))
+    contar_transicoes(db.connection(), [
+        ('escaladas', 'atrasadas', unidade, frente, equipamento) for _, unidade, frente, equipamento in vencidos
+    ])
+    registrar_mudancas(db, ids, 'categoria')
+    db.commit()
+    return len(vencidos)
+
+def resumo_contadores(db: Session):
+    """Contagens por categoria no total e por unidade, frente e equipamento, lidas das linhas de contador
+
+    Somente leitura: as escaladas cujo prazo venceu e que a varredura de vencimentos ainda não gravou
+    (aplicar_vencimentos) são contadas como atrasadas aqui, sem escrita no banco.
+    """
+    quantidades = defaultdict(int)
+    for categoria, dimensao, valor, quantidade in db.execute(
+        select(_contadores.c.categoria, _contadores.c.dimensao, _contadores.c.valor, _contadores.c.quantidade)
+        .where(_contadores.c.quantidade != 0)
+    ):
+        quantidades[(categoria, dimensao, valor)] = quantidade
+    vencidos = db.execute(
+        select(_alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento, func.count()).where(
+            _alertas.c.categoria_contada == 'escaladas',
+            _alertas.c.previsao_datetime < datetime.now(TZ_BR)
+        ).group_by(_alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento)
+    )
+    for unidade, frente, equipamento, quantidade in vencidos:
+        for chave in _chaves('escaladas', unidade, frente, equipamento):
+            quantidades[chave] -= quantidade
+        for chave in _chaves('atrasadas', unidade, frente, equipamento):
+            quantidades[chave] += quantidade
+
+    resumo = {'total': {categoria: 0 for categoria in CATEGORIAS}}
+    for dimensao in DIMENSOES_CONTADOR:
+        resumo[f'por_{dimensao}'] = {}
+    for (categoria, dimensao, valor), quantidade in quantidades.items():
+        if quantidade == 0:
+            continue
+        if dimensao == 'total':
+            resumo['total'][categoria] = quantidade
+            continue
+        grupo = resumo[f'por_{dimensao}'].setdefault(valor or 'não informado', {c: 0 for c in CATEGORIAS})
+        grupo[categoria] = quantidade
+    return resumo
@@ -0,0 +1,337 @@
+# alerta_estado.py - Estado em memória das categorias dos alertas (listagem sem ida ao banco)
+import bisect
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import event
+from backend.config import TZ_BR
+from backend.models.alerta_model import Alerta, CATEGORIAS, categoria_alerta
+from backend.models.alerta_mudanca_model import AlertaMudanca
+from backend.models.responses_model import SessionLocal
+from backend.services.alerta_versao import alerta_versao
+from backend.services.alerta_contadores import aplicar_vencimentos
+from backend.services.alerta_mudancas import JOURNAL_ALTERADO, podar_mudancas
+from backend.services.alerta_serializacao import (
+    POSICAO, selecionar_alertas, iterar_linhas, serializar_linha, linha_para_dict
+)
+from backend.services.alerta_eventos import (
+    alerta_eventos, EVENTO_CRIADO, EVENTO_STATUS, EVENTO_PREVISAO, EVENTO_ATRASADO, EVENTO_ATUALIZADO,
+    EVENTO_REMOVIDO, EVENTO_RECARREGAR
+)
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (segundos) entre podas do journal de mudanças, feitas pela thread de prazos
+INTERVALO_PODA_JOURNAL = 3600
+
+# Espera (segundos) antes de repetir uma varredura de vencimentos que falhou
+ESPERA_NOVA_VARREDURA = 5
+
+# Ids do journal relidos abaixo da última versão aplicada a cada sincronização: com escritas concorrentes
+# (Postgres), um id menor pode ser confirmado depois de um maior e não pode ser pulado
+JANELA_SOBREPOSICAO_JOURNAL = 256
+
+_STATUS = POSICAO['status_operacao']
+_PREVISAO = POSICAO['previsao']
+_PREVISAO_DATETIME = POSICAO['previsao_datetime']
+
+def _chave_ordem(criado_em, alerta_id):
+    """Chave (criado_em, id) da ordenação da listagem, com criado_em normalizado para UTC sem fuso"""
+    if criado_em is None:
+        criado_em = datetime.min
+    elif criado_em.tzinfo is not None:
+        criado_em = criado_em.astimezone(timezone.utc).replace(tzinfo=None)
+    return (criado_em, alerta_id)
+
+def _timestamp_prazo(previsao_datetime):
+    """Instante (timestamp) em que a previsão vence; datas sem fuso são horário de Brasília"""
+    if previsao_datetime.tzinfo is None:
+        previsao_datetime = TZ_BR.localize(previsao_datetime)
+    return previsao_datetime.timestamp()
+
+class AlertaEstadoEngine:
+    """Mantém em memória os alertas de cada categoria, na ordem da listagem
+
+    Carregado uma vez na inicialização e sincronizado a partir do journal (alerta_mudancas) após cada
+    commit que altera alertas. Um min-heap com os prazos das escaladas acorda a thread de prazos no
+    instante em que uma previsão vence; ela roda a varredura de vencimentos (aplicar_vencimentos), que
+    grava a passagem para atrasadas no banco, nos contadores e no journal, e o estado acompanha pela
+    sincronização, como qualquer outra mudança. A mesma thread poda o journal periodicamente.
+    Cada transição é publicada em alerta_eventos para os dashboards conectados ao stream.
+
+    O estado é local ao processo: vale para o deploy atual, com um único processo do uvicorn.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condicao = threading.Condition(self._lock)
+        self._sincronizacao = threading.Lock()
+        self._alertas = {}  # id -> {'linha', 'categoria', 'criado_em', 'chave', 'prazo'}
+        self._ordem = {categoria: [] for categoria in CATEGORIAS}  # chaves (criado_em, id) em ordem crescente
+        self._prazos = []  # min-heap (timestamp do prazo, id) das escaladas
+        self.versao_mudancas = 0
+        self._aplicadas = set()  # ids do journal já aplicados dentro da janela de sobreposição
+        self.carregado = False
+        self._thread = None
+        self._parar = threading.Event()
+
+    # --- Carga e sincronização -------------------------------------------------
+
+    def carregar(self):
+        """(Re)carrega todos os alertas do banco e inicia a thread de prazos"""
+        db = SessionLocal()
+        try:
+            # Previsões vencidas enquanto o estado não estava carregado passam para atrasadas antes da carga
+            aplicar_vencimentos(db)
+            agora = datetime.now(TZ_BR)
+            versao = db.query(AlertaMudanca.id).order_by(AlertaMudanca.id.desc()).limit(1).scalar() or 0
+            alertas = {}
+            ordem = {categoria: [] for categoria in CATEGORIAS}
+            prazos = []
+            for linha in iterar_linhas(db, selecionar_alertas(categoria_alerta(agora).label('categoria'))):
+                self._inserir(linha, alertas, ordem, prazos)
+        finally:
+            db.close()
+
+        with self._condicao:
+            self._alertas = alertas
+            self._ordem = ordem
+            self._prazos = prazos
+            self.versao_mudancas = versao
+            self._aplicadas = set()
+            self.carregado = True
+            self._condicao.notify()
+        alerta_eventos.publicar(EVENTO_RECARREGAR, versao=versao)
+        logger.info(f"Estado de alertas carregado: {self._contar()} (versão {versao})")
+        self._iniciar_thread()
+
+    def sincronizar(self):
+        """Aplica as mudanças registradas no journal desde a última versão conhecida
+
+        Relê também os últimos JANELA_SOBREPOSICAO_JOURNAL ids abaixo dela, ignorando os já aplicados:
+        um id confirmado fora de ordem por outra transação ainda é aplicado.
+        """
+        if not self.carregado:
+            return
+        with self._sincronizacao:
+            db = SessionLocal()
+            try:
+                inicio_janela = self.versao_mudancas - JANELA_SOBREPOSICAO_JOURNAL
+                mudancas = [
+                    (mudanca_id, alerta_id) for mudanca_id, alerta_id in db.query(AlertaMudanca.id, AlertaMudanca.alerta_id).filter(
+                        AlertaMudanca.id > inicio_janela
+                    )
+                    if mudanca_id not in self._aplicadas
+                ]
+                if not mudancas:
+                    return
+                ids = {alerta_id for _, alerta_id in mudancas}
+                agora = datetime.now(TZ_BR)
+                linhas = db.execute(
+                    selecionar_alertas(categoria_alerta(agora).label('categoria')).where(Alerta.id.in_(ids))
+                ).all()
+            finally:
+                db.close()
+
+            versao = max(self.versao_mudancas, max(mudanca_id for mudanca_id, _ in mudancas))
+            with self._condicao:
+                self._aplicadas.update(mudanca_id for mudanca_id, _ in mudancas)
+                self._aplicadas = {mudanca_id for mudanca_id in self._aplicadas if mudanca_id > versao - JANELA_SOBREPOSICAO_JOURNAL}
+                anteriores = {alerta_id: self._alertas.get(alerta_id) for alerta_id in ids}
+                for alerta_id in ids:
+                    self._remover(alerta_id)
+                for linha in linhas:
+                    self._inserir(linha, self._alertas, self._ordem, self._prazos)
+                self.versao_mudancas = versao
+                self._condicao.notify()
+                self._publicar_mudancas(anteriores, versao)
+
+    def _publicar_mudancas(self, anteriores: dict, versao: int):
+        """Publica um evento por alerta alterado, com o tipo decidido pela comparação com o estado anterior"""
+        for alerta_id, anterior in anteriores.items():
+            atual = self._alertas.get(alerta_id)
+            if atual is None:
+                if anterior is not None:
+                    alerta_eventos.publicar(EVENTO_REMOVIDO, self._com_categoria(anterior), versao)
+                continue
+            if anterior is None:
+                tipo = EVENTO_CRIADO
+            elif atual['linha'][_STATUS] != anterior['linha'][_STATUS]:
+                tipo = EVENTO_STATUS
+            elif (atual['linha'][_PREVISAO], atual['linha'][_PREVISAO_DATETIME]) != \
+                    (anterior['linha'][_PREVISAO], anterior['linha'][_PREVISAO_DATETIME]):
+                tipo = EVENTO_PREVISAO
+            elif atual['categoria'] == 'atrasadas' and anterior['categoria'] == 'escaladas':
+                tipo = EVENTO_ATRASADO
+            else:
+                tipo = EVENTO_ATUALIZADO
+            alerta_eventos.publicar(tipo, self._com_categoria(atual), versao)
+
+    @staticmethod
+    def _com_categoria(entrada):
+        return linha_para_dict(entrada['linha'], entrada['categoria'])
+
+    @staticmethod
+    def _inserir(linha, alertas, ordem, prazos):
+        """Insere uma linha de selecionar_alertas(categoria) nas estruturas informadas"""
+        alerta_id = linha[POSICAO['id']]
+        criado_em = linha[POSICAO['criado_em']]
+        previsao_datetime = linha[POSICAO['previsao_datetime']]
+        categoria = linha[-1]
+        prazo = None
+        if categoria == 'escaladas' and previsao_datetime is not None:
+            prazo = _timestamp_prazo(previsao_datetime)
+            heapq.heappush(prazos, (prazo, alerta_id))
+        chave = _chave_ordem(criado_em, alerta_id)
+        alertas[alerta_id] = {
+            'linha': serializar_linha(linha),
+            'categoria': categoria,
+            'criado_em': criado_em,
+            'chave': chave,
+            'prazo': prazo
+        }
+        bisect.insort(ordem[categoria], chave)
+
+    def _remover(self, alerta_id):
+        # O heap de prazos não é alterado: entradas de alertas removidos são descartadas ao vencer
+        entrada = self._alertas.pop(alerta_id, None)
+        if entrada:
+            self._retirar_da_ordem(entrada)
+
+    def _retirar_da_ordem(self, entrada):
+        ordem = self._ordem[entrada['categoria']]
+        posicao = bisect.bisect_left(ordem, entrada['chave'])
+        if posicao < len(ordem) and ordem[posicao] == entrada['chave']:
+            del ordem[posicao]
+
+    # --- Prazos ------------------------------------------------------------------
+
+    def _retirar_vencidos(self):
+        """Retira do heap os prazos já vencidos; retorna os (prazo, id) de escaladas que ainda dependem deles"""
+        agora = datetime.now(TZ_BR).timestamp()
+        vencidos = []
+        while self._prazos and self._prazos[0][0] < agora:
+            prazo, alerta_id = heapq.heappop(self._prazos)
+            entrada = self._alertas.get(alerta_id)
+            if not entrada or entrada['categoria'] != 'escaladas' or entrada['prazo'] != prazo:
+                continue  # Entrada obsoleta (alerta removido, encerrado ou com nova previsão)
+            vencidos.append((prazo, alerta_id))
+        return vencidos
+
+    def _aplicar_vencimentos(self, vencidos):
+        """Grava a passagem para atrasadas (varredura no banco) e sincroniza o estado com o journal"""
+        db = SessionLocal()
+        try:
+            movidos = aplicar_vencimentos(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erro ao aplicar vencimentos de previsões: {str(e)}")
+            with self._condicao:
+                for prazo in vencidos:
+                    heapq.heappush(self._prazos, prazo)
+            self._parar.wait(ESPERA_NOVA_VARREDURA)
+            return
+        finally:
+            db.close()
+        if movidos:
+            # O commit da varredura (journal) já sincronizou o estado e subiu a versão
+            logger.info(f"{movidos} alerta(s) com previsão vencida movido(s) para atrasadas")
+
+    def _podar_journal(self):
+        db = SessionLocal()
+        try:
+            apagados = podar_mudancas(db)
+            if apagados:
+                logger.info(f"Journal de mudanças podado: {apagados} registro(s) apagado(s)")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erro ao podar o journal de mudanças: {str(e)}")
+        finally:
+            db.close()
+
+    def _iniciar_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar_prazos, daemon=True)
+        self._thread.start()
+
+    def _executar_prazos(self):
+        """Dorme até o próximo prazo, a próxima poda ou uma mudança notificada, e aplica os vencimentos"""
+        proxima_poda = time.monotonic() + INTERVALO_PODA_JOURNAL
+        while not self._parar.is_set():
+            with self._condicao:
+                vencidos = self._retirar_vencidos()
+                if not vencidos:
+                    espera = max(0.0, proxima_poda - time.monotonic())
+                    if self._prazos:
+                        espera = min(espera, max(0.0, self._prazos[0][0] - datetime.now(TZ_BR).timestamp()))
+                    self._condicao.wait(timeout=espera)
+            # Fora do lock: o commit da varredura sincroniza o estado, que precisa dele
+            if vencidos:
+                self._aplicar_vencimentos(vencidos)
+            if time.monotonic() >= proxima_poda:
+                self._podar_journal()
+                proxima_poda = time.monotonic() + INTERVALO_PODA_JOURNAL
+
+    def parar(self):
+        """Para a thread de prazos"""
+        self._parar.set()
+        with self._condicao:
+            self._condicao.notify()
+
+    # --- Leitura -------------------------------------------------------------------
+
+    def _contar(self):
+        return {categoria: len(self._ordem[categoria]) for categoria in CATEGORIAS}
+
+    def contagens(self):
+        """Quantidade de alertas em cada categoria, em O(1)"""
+        with self._condicao:
+            return self._contar()
+
+    def listar(self, limites: dict, cursores: dict):
+        """Lista as categorias como GET /alertas (mais recentes primeiro)
+
+        limites: categoria -> tamanho da página (None = todos); cursores: categoria -> (criado_em, id)
+        já decodificado ou None. Retorna (categorias, próximos cursores, versão do journal), com as
+        categorias como listas de linhas serializadas; a projeção (projetar_categoria) fica com quem
+        chama, fora do lock.
+        """
+        categorias = {}
+        proximos_cursores = {}
+        with self._condicao:
+            for categoria in CATEGORIAS:
+                limite = limites.get(categoria)
+                proximos_cursores[categoria] = None
+                ordem = self._ordem[categoria]
+                fim = len(ordem)
+                if cursores.get(categoria):
+                    fim = bisect.bisect_left(ordem, _chave_ordem(*cursores[categoria]))
+                inicio = 0 if limite is None else max(0, fim - limite)
+
+                chaves = ordem[inicio:fim]
+                chaves.reverse()
+                categorias[categoria] = [self._alertas[chave[1]]['linha'] for chave in chaves]
+                if inicio > 0 and chaves:
+                    ultimo = self._alertas[chaves[-1][1]]
+                    proximos_cursores[categoria] = (ultimo['criado_em'], chaves[-1][1])
+            return categorias, proximos_cursores, self.versao_mudancas
+
+# Instância global do estado
+alerta_estado = AlertaEstadoEngine()
+
+# Hook de sessão: após cada commit que gravou no journal (ver alerta_mudancas), o estado é sincronizado e
+# só então a versão dos alertas sobe, uma vez: uma listagem com o ETag novo já vê o conteúdo novo
+
+@event.listens_for(SessionLocal, 'after_commit')
+def _sincronizar_estado(session):
+    if session.info.pop(JOURNAL_ALTERADO, False):
+        try:
+            alerta_estado.sincronizar()
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar estado dos alertas: {str(e)}")
+        versao = alerta_versao.incrementar()
+        logger.debug(f"Versão dos alertas incrementada para {versao}")
@@ -0,0 +1,101 @@
+# alerta_eventos.py - Distribuição de eventos de alertas para os dashboards conectados (GET /alertas/stream)
+import asyncio
+import json
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Tipos de evento enviados no stream
+EVENTO_CRIADO = 'alerta_criado'
+EVENTO_STATUS = 'status_alterado'
+EVENTO_PREVISAO = 'previsao_registrada'
+EVENTO_ATRASADO = 'alerta_atrasado'
+EVENTO_ATUALIZADO = 'alerta_atualizado'
+EVENTO_REMOVIDO = 'alerta_removido'
+EVENTO_RECARREGAR = 'recarregar'
+
+# Eventos acumulados por conexão antes de ela ser considerada lenta (o cliente é mandado recarregar)
+TAMANHO_FILA_ASSINANTE = 1000
+
+class AssinaturaEventos:
+    """Uma conexão do stream: fila asyncio do seu event loop e filtros opcionais de unidade/frente"""
+
+    def __init__(self, loop, unidade: Optional[str] = None, frente: Optional[str] = None):
+        self.loop = loop
+        self.fila = asyncio.Queue(maxsize=TAMANHO_FILA_ASSINANTE)
+        self.unidade = unidade
+        self.frente = frente
+
+    def aceita(self, alerta: Optional[dict]):
+        if alerta is None:
+            return True
+        if self.unidade and alerta.get('unidade') != self.unidade:
+            return False
+        if self.frente and alerta.get('frente') != self.frente:
+            return False
+        return True
+
+    def _entregar(self, mensagem: str):
+        # Executado no event loop da conexão
+        try:
+            self.fila.put_nowait(mensagem)
+        except asyncio.QueueFull:
+            # Conexão lenta: descarta o acumulado e pede ao cliente que recarregue a listagem
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(formatar_evento(EVENTO_RECARREGAR, {}))
+
+class AlertaEventosBroker:
+    """Publica eventos de alertas para todas as conexões abertas
+
+    publicar() pode ser chamado de qualquer thread (hooks de sessão, thread de prazos do estado);
+    cada evento é entregue no event loop da conexão com call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinaturas = set()
+
+    def assinar(self, loop, unidade: Optional[str] = None, frente: Optional[str] = None):
+        assinatura = AssinaturaEventos(loop, unidade, frente)
+        with self._lock:
+            self._assinaturas.add(assinatura)
+        logger.info(f"📡 Conexão de eventos aberta ({self.total_conexoes()} ativas)")
+        return assinatura
+
+    def cancelar(self, assinatura: AssinaturaEventos):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+        logger.info(f"📡 Conexão de eventos encerrada ({self.total_conexoes()} ativas)")
+
+    def total_conexoes(self):
+        with self._lock:
+            return len(self._assinaturas)
+
+    def publicar(self, tipo: str, alerta: Optional[dict] = None, versao: Optional[int] = None):
+        """Envia o evento às conexões cujos filtros aceitam o alerta (eventos sem alerta vão para todas)"""
+        with self._lock:
+            assinaturas = [assinatura for assinatura in self._assinaturas if assinatura.aceita(alerta)]
+        if not assinaturas:
+            return
+        mensagem = formatar_evento(tipo, {'alerta': alerta, 'versao_mudancas': versao}, versao)
+        for assinatura in assinaturas:
+            try:
+                assinatura.loop.call_soon_threadsafe(assinatura._entregar, mensagem)
+            except RuntimeError:
+                # Event loop da conexão já foi fechado
+                self.cancelar(assinatura)
+
+def formatar_evento(tipo: str, dados: dict, evento_id: Optional[int] = None):
+    """Mensagem no formato text/event-stream"""
+    linhas = []
+    if evento_id is not None:
+        linhas.append(f'id: {evento_id}')
+    linhas.append(f'event: {tipo}')
+    linhas.append(f'data: {json.dumps(dados, ensure_ascii=False)}')
+    return '\n'.join(linhas) + '\n\n'
+
+# Instância global do broker
+alerta_eventos = AlertaEventosBroker()
@@ -0,0 +1,140 @@
+# alerta_mudancas.py - Registro das mudanças de alertas no journal (alerta_mudancas) e consulta de deltas
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, insert, inspect, select, literal, delete
+from sqlalchemy.orm import Session
+from backend.config import TZ_BR, ALERTA_MUDANCAS_RETENCAO_HORAS
+from backend.models.alerta_model import Alerta, categoria_alerta
+from backend.models.alerta_mudanca_model import AlertaMudanca
+from backend.models.responses_model import SessionLocal
+from backend.services.alerta_serializacao import selecionar_alertas
+
+logger = logging.getLogger(__name__)
+
+# Hooks de sessão: toda escrita em Alerta grava, na mesma transação, uma linha no journal.
+# A sessão fica marcada com JOURNAL_ALTERADO até o commit, quando o estado em memória é sincronizado e a
+# versão dos alertas sobe (ver alerta_estado).
+
+JOURNAL_ALTERADO = 'journal_alterado'
+
+# Colunas de controle interno, fora do registro de campos alterados
+_CAMPOS_INTERNOS = {'categoria_contada'}
+
+def _campos_alterados(obj):
+    """Colunas com mudança pendente no objeto, separadas por vírgula"""
+    estado = inspect(obj)
+    return ','.join(
+        atributo.key for atributo in estado.mapper.column_attrs
+        if atributo.key not in _CAMPOS_INTERNOS and estado.attrs[atributo.key].history.has_changes()
+    ) or None
+
+@event.listens_for(SessionLocal, 'after_flush')
+def _registrar_mudancas(session, flush_context):
+    agora = datetime.now(TZ_BR)
+    linhas = []
+    for obj in session.new:
+        if isinstance(obj, Alerta) and obj.id is not None:
+            linhas.append({'alerta_id': obj.id, 'tipo': 'upsert', 'campos': 'criado_em', 'registrado_em': agora})
+    for obj in session.dirty:
+        if isinstance(obj, Alerta) and obj.id is not None and session.is_modified(obj):
+            linhas.append({'alerta_id': obj.id, 'tipo': 'upsert', 'campos': _campos_alterados(obj), 'registrado_em': agora})
+    for obj in session.deleted:
+        if isinstance(obj, Alerta):
+            linhas.append({'alerta_id': obj.id, 'tipo': 'delete', 'campos': None, 'registrado_em': agora})
+    if linhas:
+        session.connection().execute(insert(AlertaMudanca.__table__), linhas)
+        session.info[JOURNAL_ALTERADO] = True
+
+@event.listens_for(SessionLocal, 'do_orm_execute')
+def _registrar_mudancas_em_massa(orm_execute_state):
+    """Para query(Alerta).delete()/update(), registra os ids afetados antes da execução"""
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    if not any(mapper.class_ is Alerta for mapper in orm_execute_state.all_mappers):
+        return
+
+    tipo = 'delete' if orm_execute_state.is_delete else 'upsert'
+    afetados = select(Alerta.id, literal(tipo), literal(datetime.now(TZ_BR), AlertaMudanca.registrado_em.type))
+    if orm_execute_state.statement.whereclause is not None:
+        afetados = afetados.where(orm_execute_state.statement.whereclause)
+    orm_execute_state.session.connection().execute(
+        insert(AlertaMudanca.__table__).from_select(['alerta_id', 'tipo', 'registrado_em'], afetados)
+    )
+    orm_execute_state.session.info[JOURNAL_ALTERADO] = True
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def _descartar_marca(session):
+    session.info.pop(JOURNAL_ALTERADO, None)
+
+def registrar_mudancas(db: Session, ids, campos: str = None):
+    """Grava no journal uma mudança 'upsert' por alerta, para escritas feitas com Core (fora dos hooks de sessão)"""
+    if not ids:
+        return
+    agora = datetime.now(TZ_BR)
+    db.connection().execute(insert(AlertaMudanca.__table__), [
+        {'alerta_id': alerta_id, 'tipo': 'upsert', 'campos': campos, 'registrado_em': agora} for alerta_id in ids
+    ])
+    db.info[JOURNAL_ALTERADO] = True
+
+def versao_atual(db: Session):
+    """Última versão do journal (0 se nada foi registrado)"""
+    return db.query(func.coalesce(func.max(AlertaMudanca.id), 0)).scalar()
+
+def ultima_mudanca(db: Session):
+    """Registro mais recente do journal (None se nada foi registrado)
+
+    Leitura pelo fim da chave primária: o custo não depende do número de alertas nem de mudanças.
+    """
+    return db.query(
+        AlertaMudanca.id, AlertaMudanca.alerta_id, AlertaMudanca.tipo, AlertaMudanca.campos, AlertaMudanca.registrado_em
+    ).order_by(AlertaMudanca.id.desc()).limit(1).first()
+
+def podar_mudancas(db: Session, retencao_horas: int = ALERTA_MUDANCAS_RETENCAO_HORAS):
+    """Apaga os registros do journal mais antigos que a retenção e retorna quantos foram apagados
+
+    O registro mais recente é sempre mantido, para que a versão atual não volte a 0. Um cliente com
+    since anterior ao trecho apagado recebe recarregar em listar_mudancas.
+    """
+    limite = datetime.now(TZ_BR) - timedelta(hours=retencao_horas)
+    resultado = db.execute(
+        delete(AlertaMudanca).where(AlertaMudanca.registrado_em < limite, AlertaMudanca.id < versao_atual(db))
+    )
+    db.commit()
+    return resultado.rowcount
+
+def listar_mudancas(db: Session, since: int):
+    """Retorna (versao, alterados, removidos, recarregar) para as mudanças posteriores à versão since
+
+    alterados: linhas de selecionar_alertas(categoria) criados/alterados depois de since, incluindo os que
+    passaram de escaladas para atrasadas (a varredura de vencimentos grava essa passagem no journal).
+    removidos: ids apagados depois de since.
+    recarregar: True quando since não pertence a este journal (ex.: banco recriado) ou é anterior aos
+    registros já podados, e o cliente deve buscar a listagem completa.
+
+    A versão é o maior id do journal: no SQLite as escritas são serializadas e os ids ficam visíveis em
+    ordem. Num banco com escritas concorrentes (Postgres), um id menor pode ficar visível depois de um maior
+    e ser pulado por um cliente que já avançou since; o estado em memória cobre isso com uma janela de
+    sobreposição (ver AlertaEstadoEngine.sincronizar), e o stream de eventos entrega essas mudanças.
+    """
+    versao = versao_atual(db)
+    if since < 0 or since > versao:
+        return versao, [], [], True
+    primeira = db.query(func.min(AlertaMudanca.id)).scalar()
+    if primeira is not None and since < primeira - 1:
+        return versao, [], [], True
+
+    # Último registro de cada alerta após since decide se ele foi alterado ou removido
+    ultimos = select(func.max(AlertaMudanca.id)).where(AlertaMudanca.id > since).group_by(AlertaMudanca.alerta_id)
+    ultimas_mudancas = db.query(AlertaMudanca.alerta_id, AlertaMudanca.tipo).filter(AlertaMudanca.id.in_(ultimos)).all()
+    ids_alterados = [alerta_id for alerta_id, tipo in ultimas_mudancas if tipo == 'upsert']
+    removidos = [alerta_id for alerta_id, tipo in ultimas_mudancas if tipo == 'delete']
+
+    alterados = []
+    if ids_alterados:
+        alterados = db.execute(
+            selecionar_alertas(categoria_alerta(datetime.now(TZ_BR)).label('categoria')).where(
+                Alerta.id.in_(ids_alterados)
+            ).order_by(Alerta.criado_em.desc(), Alerta.id.desc())
+        ).all()
+
+    return versao, alterados, removidos, False
@@ -0,0 +1,135 @@
+# alerta_previsoes.py - Registro atômico das previsões do líder: reserva e atualiza os alertas num único UPDATE
+from datetime import datetime
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+from backend.models.alerta_model import Alerta, classificar_alerta
+from backend.services.alerta_contadores import contar_transicoes
+from backend.services.alerta_mudancas import registrar_mudancas
+
+_alertas = Alerta.__table__
+
+# Colunas gravadas pelo UPDATE de reserva (registradas no journal)
+CAMPOS_PREVISAO = ('previsao', 'previsao_datetime', 'respondido_em', 'nome_lider', 'status')
+
+# Colunas devolvidas pelo RETURNING: as usadas na confirmação ao líder e as dimensões dos contadores
+_RETORNO = (
+    _alertas.c.id, _alertas.c.problema, _alertas.c.previsao, _alertas.c.previsao_datetime,
+    _alertas.c.categoria_contada, _alertas.c.unidade, _alertas.c.frente, _alertas.c.equipamento
+)
+
+def _valores(previsoes, posicao, agora: datetime, nome_lider: str):
+    """Valores do SET: a previsão de cada alerta é escolhida pela sua posição (1, 2, ...) na reserva
+
+    categoria_contada já sai com a nova categoria (encerradas, se o alerta estiver operando; senão
+    escaladas ou atrasadas, pelo prazo), como o flush faria.
+    """
+    return {
+        'previsao': case({i: texto for i, (texto, _) in enumerate(previsoes, 1)}, value=posicao),
+        'previsao_datetime': case({i: prazo for i, (_, prazo) in enumerate(previsoes, 1)}, value=posicao),
+        'respondido_em': agora,
+        'nome_lider': nome_lider,
+        'status': 'escalada',
+        'categoria_contada': case(
+            (_alertas.c.status_operacao == 'operando', 'encerradas'),
+            else_=case({
+                i: classificar_alerta(texto, None, prazo, agora) for i, (texto, prazo) in enumerate(previsoes, 1)
+            }, value=posicao)
+        )
+    }
+
+def _reservar_respondido(db: Session, previsoes, chat_id: str, mensagem_id: int, agora: datetime, nome_lider: str):
+    """UPDATE ... RETURNING dos alertas da mensagem respondida (índice único chat_id + mensagem_id + linha)
+
+    A previsão i vai para a linha i da mensagem: uma pergunta individual tem só a linha 1; um resumo, uma
+    linha por alerta. Linhas que já têm previsão não são alteradas (uma segunda resposta não sobrescreve).
+    """
+    # Subconsultas sem correlação com a tabela atualizada (o SQLite não qualifica as colunas no RETURNING)
+    respondidos = _alertas.alias('respondidos')
+    pendentes = _alertas.alias('pendentes')
+    restantes = select(func.count()).select_from(pendentes).where(
+        pendentes.c.previsao.is_(None),
+        pendentes.c.id.not_in(
+            select(respondidos.c.id).where(
+                respondidos.c.chat_id == chat_id, respondidos.c.mensagem_id == mensagem_id,
+                respondidos.c.mensagem_linha <= len(previsoes), respondidos.c.previsao.is_(None)
+            )
+        )
+    ).scalar_subquery()
+    return db.connection().execute(
+        update(_alertas)
+        .where(_alertas.c.chat_id == chat_id, _alertas.c.mensagem_id == mensagem_id,
+               _alertas.c.mensagem_linha <= len(previsoes), _alertas.c.previsao.is_(None))
+        .values(_valores(previsoes, _alertas.c.mensagem_linha, agora, nome_lider))
+        .returning(*_RETORNO, _alertas.c.mensagem_linha, restantes.label('restantes'))
+    ).all()
+
+def _reservar_fila(db: Session, previsoes, agora: datetime, nome_lider: str):
+    """UPDATE ... RETURNING dos alertas pendentes mais antigos, um por previsão, em ordem de criação
+
+    A seleção dos candidatos e a atualização são o mesmo comando: duas respostas simultâneas nunca
+    reservam o mesmo alerta (no Postgres, FOR UPDATE SKIP LOCKED faz a segunda pular as linhas já
+    travadas pela primeira; no SQLite o comando inteiro roda sob a trava de escrita).
+    """
+    candidatos = select(_alertas.c.id, _alertas.c.criado_em).where(
+        _alertas.c.previsao.is_(None)
+    ).order_by(_alertas.c.criado_em, _alertas.c.id).limit(len(previsoes))
+    if db.get_bind().dialect.name == 'postgresql':
+        candidatos = candidatos.with_for_update(skip_locked=True)
+    # MATERIALIZED: os candidatos são avaliados uma única vez, antes da atualização
+    candidatos = candidatos.cte('candidatos').prefix_with('MATERIALIZED')
+    fila = select(
+        candidatos.c.id,
+        func.row_number().over(order_by=(candidatos.c.criado_em, candidatos.c.id)).label('posicao')
+    ).cte('fila')
+    pendentes = _alertas.alias('pendentes')
+    restantes = select(func.count()).select_from(pendentes).where(
+        pendentes.c.previsao.is_(None), pendentes.c.id.not_in(select(fila.c.id))
+    ).scalar_subquery()
+    return db.connection().execute(
+        update(_alertas)
+        .where(_alertas.c.id == fila.c.id, _alertas.c.previsao.is_(None))
+        .values(_valores(previsoes, fila.c.posicao, agora, nome_lider))
+        .returning(*_RETORNO, _alertas.c.criado_em, restantes.label('restantes'))
+    ).all()
+
+def registrar_previsoes(db: Session, previsoes, agora: datetime, nome_lider: str,
+                        chat_id: str = None, mensagem_respondida: int = None):
+    """Grava as previsões [(texto HH:MM, datetime), ...] nos alertas e retorna (alertas, restantes, resposta_direta, sem_alerta)
+
+    Com mensagem_respondida (reply do líder), os alertas ainda sem previsão daquela mensagem recebem as
+    previsões das suas linhas (a pergunta individual tem uma linha; o resumo, uma por alerta); as demais
+    vão, em ordem, para os alertas pendentes mais antigos. Cada grupo é reservado e atualizado por um
+    único UPDATE ... RETURNING, que também devolve quantos alertas continuam pendentes. Journal e
+    contadores são gravados a partir do RETURNING, na mesma transação, sem recarregar os alertas.
+
+    alertas: linhas do RETURNING (id, problema, previsao, previsao_datetime, ...), na ordem em que as
+    previsões foram aplicadas.
+    restantes: pendentes após a reserva (None se nenhum alerta foi reservado).
+    sem_alerta: textos das previsões que ficaram sem alerta pendente.
+    O commit fica com quem chama.
+    """
+    alertas, restantes, resposta_direta = [], None, False
+    if mensagem_respondida is not None and previsoes:
+        linhas = sorted(_reservar_respondido(db, previsoes, chat_id, mensagem_respondida, agora, nome_lider),
+                        key=lambda linha: linha.mensagem_linha)
+        if linhas:
+            alertas += linhas
+            restantes = linhas[0].restantes
+            resposta_direta = True
+            respondidas = {linha.mensagem_linha for linha in linhas}
+            previsoes = [previsao for i, previsao in enumerate(previsoes, 1) if i not in respondidas]
+    if previsoes:
+        # O RETURNING só enxerga a tabela atualizada: a posição é refeita pela ordem (criado_em, id)
+        linhas = sorted(_reservar_fila(db, previsoes, agora, nome_lider), key=lambda linha: (linha.criado_em, linha.id))
+        if linhas:
+            alertas += linhas
+            restantes = linhas[0].restantes
+        previsoes = previsoes[len(linhas):]
+    if alertas:
+        # Só alertas sem previsão (pendentes) são reservados
+        contar_transicoes(db.connection(), [
+            ('pendentes', alerta.categoria_contada, alerta.unidade, alerta.frente, alerta.equipamento)
+            for alerta in alertas
+        ])
+        registrar_mudancas(db, [alerta.id for alerta in alertas], ','.join(CAMPOS_PREVISAO))
+    return alertas, restantes, resposta_direta, [texto for texto, _ in previsoes]
@@ -0,0 +1,106 @@
+# alerta_serializacao.py - Projeção e conversão de alertas para as respostas da API (sem hidratar objetos ORM)
+from functools import lru_cache
+from operator import itemgetter
+from sqlalchemy import select, null, DateTime
+from backend.models.alerta_model import Alerta
+
+# Todos os campos de um alerta, na ordem usada nas respostas
+CAMPOS_ALERTA = (
+    'id', 'chat_id', 'problema', 'criado_em', 'previsao', 'previsao_datetime', 'respondido_em',
+    'nome_lider', 'status_operacao', 'horario_operando', 'origem_encerramento', 'codigo', 'unidade',
+    'frente', 'equipamento', 'codigo_equipamento', 'tipo_operacao', 'operacao', 'nome_operador',
+    'data_operacao', 'tempo_abertura', 'tipo_arvore', 'justificativa'
+)
+
+# Campos comuns ao final de todas as categorias
+_CAMPOS_OPERACAO = (
+    'codigo', 'unidade', 'frente', 'equipamento', 'codigo_equipamento', 'tipo_operacao', 'operacao',
+    'nome_operador', 'data_operacao', 'tempo_abertura', 'tipo_arvore', 'justificativa'
+)
+
+# Campos retornados em cada categoria de GET /alertas
+CAMPOS_POR_CATEGORIA = {
+    'pendentes': ('id', 'chat_id', 'problema', 'criado_em', 'nome_lider', 'status_operacao', 'previsao') + _CAMPOS_OPERACAO,
+    'escaladas': ('id', 'chat_id', 'problema', 'previsao', 'previsao_datetime', 'respondido_em', 'nome_lider',
+                  'status_operacao') + _CAMPOS_OPERACAO,
+    'atrasadas': ('id', 'chat_id', 'problema', 'previsao', 'previsao_datetime', 'respondido_em', 'nome_lider',
+                  'status_operacao') + _CAMPOS_OPERACAO,
+    'encerradas': ('id', 'chat_id', 'problema', 'previsao', 'previsao_datetime', 'respondido_em', 'nome_lider',
+                   'status_operacao', 'horario_operando', 'origem_encerramento') + _CAMPOS_OPERACAO,
+}
+
+# Linhas lidas por vez do cursor do banco nas consultas grandes
+TAMANHO_LOTE = 500
+
+# Mapeamentos pré-calculados (uma vez, na importação) entre colunas, posições na linha e chaves do JSON
+COLUNAS_ALERTA = tuple(getattr(Alerta, campo) for campo in CAMPOS_ALERTA)
+POSICAO = {campo: posicao for posicao, campo in enumerate(CAMPOS_ALERTA)}
+_POSICOES_DATA = tuple(
+    POSICAO[campo] for campo, coluna in zip(CAMPOS_ALERTA, COLUNAS_ALERTA) if isinstance(coluna.type, DateTime)
+)
+
+@lru_cache(maxsize=128)
+def _extrator(campos: tuple):
+    """Função que extrai de uma linha os valores dos campos informados, sempre como tupla"""
+    if len(campos) == 1:
+        posicao = POSICAO[campos[0]]
+        return lambda linha: (linha[posicao],)
+    return itemgetter(*(POSICAO[campo] for campo in campos))
+
+_EXTRATORES_CATEGORIA = {categoria: _extrator(campos) for categoria, campos in CAMPOS_POR_CATEGORIA.items()}
+
+def selecionar_alertas(*extras, campos=None):
+    """SELECT das colunas serializadas (na ordem de CAMPOS_ALERTA), seguidas das colunas extras
+
+    Com campos, só essas colunas são lidas do banco; as demais posições da linha vêm como NULL,
+    mantendo as posições de POSICAO.
+    """
+    if campos is None:
+        return select(*COLUNAS_ALERTA, *extras)
+    return select(*(
+        coluna if campo in campos else null().label(campo) for campo, coluna in zip(CAMPOS_ALERTA, COLUNAS_ALERTA)
+    ), *extras)
+
+def iterar_linhas(db, consulta, lote: int = TAMANHO_LOTE):
+    """Executa a consulta e entrega as linhas (tuplas do Core) em lotes, sem carregar o resultado todo"""
+    return db.execute(consulta.execution_options(yield_per=lote))
+
+def serializar_linha(linha):
+    """Tupla compacta com os valores de CAMPOS_ALERTA prontos para o JSON (datas em ISO 8601)
+
+    Aceita a linha de selecionar_alertas() (as colunas extras no final são ignoradas).
+    """
+    valores = list(linha[:len(CAMPOS_ALERTA)])
+    for posicao in _POSICOES_DATA:
+        if valores[posicao] is not None:
+            valores[posicao] = valores[posicao].isoformat()
+    return tuple(valores)
+
+def linha_para_dict(linha: tuple, categoria=None):
+    """Dicionário com todos os campos de uma linha serializada e, se informada, a categoria"""
+    dados = dict(zip(CAMPOS_ALERTA, linha))
+    if categoria is not None:
+        dados['categoria'] = categoria
+    return dados
+
+def projetar_categoria(linha: tuple, categoria: str, campos: tuple = None):
+    """Recorta uma linha serializada nos campos informados ou, por padrão, nos exibidos na categoria
+
+    Pendentes nunca têm previsão.
+    """
+    if campos is None:
+        projetado = dict(zip(CAMPOS_POR_CATEGORIA[categoria], _EXTRATORES_CATEGORIA[categoria](linha)))
+    else:
+        projetado = dict(zip(campos, _extrator(campos)(linha)))
+    if categoria == 'pendentes' and 'previsao' in projetado:
+        projetado['previsao'] = None
+    return projetado
+
+def projetar_colunas(linhas: list, categoria: str, campos: tuple = None):
+    """Formato colunar: um array por campo (mesma ordem das linhas) em vez de um objeto por alerta"""
+    campos = campos or CAMPOS_POR_CATEGORIA[categoria]
+    valores = list(zip(*map(_extrator(campos), linhas))) if linhas else [()] * len(campos)
+    colunas = {campo: list(coluna) for campo, coluna in zip(campos, valores)}
+    if categoria == 'pendentes' and 'previsao' in colunas:
+        colunas['previsao'] = [None] * len(linhas)
+    return colunas
@@ -0,0 +1,39 @@
+# alerta_versao.py - Versão global de mudanças dos alertas (base do ETag de GET /alertas)
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class AlertaVersao:
+    """Contador monotônico de mudanças nos alertas, mantido em memória
+
+    Sobe uma vez a cada commit que grava no journal de mudanças (criação, mudança de status, previsão via
+    Telegram, scheduler, exclusão e também a passagem de escaladas para atrasadas, gravada pela varredura
+    de vencimentos). O incremento é feito pelo hook de after_commit de alerta_estado, depois de o estado
+    em memória ser sincronizado: um ETag novo nunca sai com o conteúdo antigo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = 0
+        # Identifica o processo para que um ETag de antes de um reinício nunca seja reaproveitado
+        self.instancia = uuid.uuid4().hex[:8]
+
+    def incrementar(self):
+        """Registra uma nova mudança e retorna a nova versão"""
+        with self._lock:
+            self._versao += 1
+            return self._versao
+
+    def atual(self):
+        """Retorna a versão atual"""
+        with self._lock:
+            return self._versao
+
+    def etag(self):
+        """ETag (fraco) que identifica o estado atual da listagem de alertas"""
+        return f'W/"{self.instancia}-{self.atual()}"'
+
+# Instância global da versão
+alerta_versao = AlertaVersao()
@@ -127,8 +127,7 @@ class AutoAlertScheduler:
         """Cria alerta diretamente no banco para evitar importação circular"""
         try:
             from backend.models.alerta_model import Alerta
-            import requests
-            from backend.config import TELEGRAM_API_URL
+            from backend.services.telegram_saida import saida_telegram
             
             # Usar Rafael Cabral como líder fixo
             nome_lider = "Rafael Cabral"
@@ -155,28 +154,10 @@ class AutoAlertScheduler:
                 justificativa=alert_data.get('justificativa')
             )
             db.add(novo_alerta)
+            saida_telegram.registrar_pergunta(db, novo_alerta)
             db.commit()
             db.refresh(novo_alerta)
             
-            # Envia mensagem ao líder no Telegram
-            try:
-                mensagem = f"Qual o prazo para resolução do problema?\n\n{novo_alerta.problema}\n\n(Responda apenas o horário no formato HH:MM)"
-                payload = {
-                    'chat_id': novo_alerta.chat_id,
-                    'text': mensagem
-                }
-                resp = requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload, timeout=10)
-                if resp.ok:
-                    mensagem_id = resp.json().get('result', {}).get('message_id')
-                    novo_alerta.mensagem_id = mensagem_id
-                    db.commit()
-                    logger.info(f"Mensagem enviada ao Telegram para chat_id {novo_alerta.chat_id}")
-                else:
-                    logger.warning(f'Erro ao enviar mensagem ao Telegram: {resp.status_code} - {resp.text}')
-            except Exception as e:
-                logger.error(f'Erro ao enviar mensagem ao Telegram: {str(e)}')
-                # Continua mesmo se falhar o envio da mensagem
-            
             logger.info(f"Alerta automático criado: ID {novo_alerta.id}")
             return novo_alerta
             
@@ -0,0 +1,247 @@
+# telegram_client.py - Cliente único da API do Telegram, com pools de conexões keep-alive (sync e async) e disjuntor
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from backend.config import (
+    TELEGRAM_API_URL, TELEGRAM_POOL_CONEXOES, TELEGRAM_DISJUNTOR_TAXA, TELEGRAM_DISJUNTOR_LENTIDAO,
+    TELEGRAM_DISJUNTOR_MINIMO, TELEGRAM_DISJUNTOR_ABERTO
+)
+
+logger = logging.getLogger(__name__)
+
+# Timeout padrão (segundos) das chamadas à API do Telegram
+TIMEOUT_TELEGRAM = 10
+
+# Por quanto tempo (segundos) uma conexão ociosa fica aberta para ser reaproveitada
+KEEPALIVE_TELEGRAM = 60
+
+# Chamadas recentes consideradas pelo disjuntor: as últimas JANELA_DISJUNTOR, dos últimos JANELA_DISJUNTOR_SEGUNDOS
+JANELA_DISJUNTOR = 50
+JANELA_DISJUNTOR_SEGUNDOS = 60
+
+class TelegramIndisponivel(Exception):
+    """Chamada recusada pelo disjuntor aberto, sem ir à API; tentar_em: segundos até ele aceitar uma sondagem"""
+
+    def __init__(self, tentar_em: float):
+        super().__init__(f"API do Telegram indisponível (disjuntor aberto); nova tentativa em {tentar_em:.1f}s")
+        self.tentar_em = tentar_em
+
+class Disjuntor:
+    """Circuit breaker das chamadas à API do Telegram
+
+    Fechado, registra o resultado das chamadas recentes; quando, com pelo menos minimo_chamadas, a fração
+    de falhas (erro de rede, timeout ou resposta 5xx) ou de chamadas lentas (acima de lentidao segundos)
+    chega a taxa, abre. Aberto, recusa as chamadas na hora com TelegramIndisponivel, em vez de prender
+    uma thread até o timeout. Após tempo_aberto segundos fica meio aberto: deixa passar uma chamada de
+    sondagem por vez; se ela for bem-sucedida e rápida, fecha, senão volta a abrir.
+
+    Respostas 4xx (inclusive 429) não contam como falha: a API respondeu.
+    """
+
+    FECHADO = 'fechado'
+    ABERTO = 'aberto'
+    MEIO_ABERTO = 'meio_aberto'
+
+    def __init__(self, taxa: float = TELEGRAM_DISJUNTOR_TAXA, lentidao: float = TELEGRAM_DISJUNTOR_LENTIDAO,
+                 minimo_chamadas: int = TELEGRAM_DISJUNTOR_MINIMO, tempo_aberto: float = TELEGRAM_DISJUNTOR_ABERTO):
+        self.taxa = taxa
+        self.lentidao = lentidao
+        self.minimo_chamadas = minimo_chamadas
+        self.tempo_aberto = tempo_aberto
+        self._lock = threading.Lock()
+        self.estado = self.FECHADO
+        # (instante, falhou, lenta) das chamadas recentes, enquanto fechado
+        self._chamadas = deque(maxlen=JANELA_DISJUNTOR)
+        self._aberto_ate = 0.0
+        self._sondando = False
+        self.aberturas = 0
+        self.recusadas = 0
+
+    def antes(self) -> bool:
+        """Autoriza uma chamada (retorna True se ela é a sondagem) ou levanta TelegramIndisponivel"""
+        with self._lock:
+            if self.estado == self.FECHADO:
+                return False
+            agora = time.monotonic()
+            if self.estado == self.ABERTO:
+                if agora < self._aberto_ate:
+                    self.recusadas += 1
+                    raise TelegramIndisponivel(self._aberto_ate - agora)
+                self.estado = self.MEIO_ABERTO
+                logger.info("🔌 Disjuntor do Telegram meio aberto: sondando a API")
+            if self._sondando:
+                # Uma sondagem por vez; as demais chamadas esperam o resultado dela
+                self.recusadas += 1
+                raise TelegramIndisponivel(1)
+            self._sondando = True
+            return True
+
+    def depois(self, sondagem: bool, duracao: float, falhou: bool):
+        """Registra o resultado de uma chamada autorizada por antes()"""
+        lenta = duracao >= self.lentidao
+        with self._lock:
+            agora = time.monotonic()
+            if sondagem:
+                self._sondando = False
+                if falhou or lenta:
+                    self._abrir(agora, 'sondagem falhou' if falhou else f'sondagem lenta ({duracao:.1f}s)')
+                else:
+                    self.estado = self.FECHADO
+                    self._chamadas.clear()
+                    logger.info("✅ Disjuntor do Telegram fechado: API respondendo")
+                return
+            if self.estado != self.FECHADO:
+                # Chamada iniciada antes da abertura: não muda a decisão já tomada
+                return
+            self._chamadas.append((agora, falhou, lenta))
+            self._descartar_antigas(agora)
+            total = len(self._chamadas)
+            if total < self.minimo_chamadas:
+                return
+            falhas = sum(1 for _, falha, _ in self._chamadas if falha)
+            lentas = sum(1 for _, _, lentidao in self._chamadas if lentidao)
+            if falhas / total >= self.taxa:
+                self._abrir(agora, f'{falhas} falhas em {total} chamadas')
+            elif lentas / total >= self.taxa:
+                self._abrir(agora, f'{lentas} chamadas lentas em {total}')
+
+    def _descartar_antigas(self, agora: float):
+        while self._chamadas and agora - self._chamadas[0][0] > JANELA_DISJUNTOR_SEGUNDOS:
+            self._chamadas.popleft()
+
+    def _abrir(self, agora: float, motivo: str):
+        self.estado = self.ABERTO
+        self._aberto_ate = agora + self.tempo_aberto
+        self._chamadas.clear()
+        self.aberturas += 1
+        logger.warning(f"⚠️ Disjuntor do Telegram aberto por {self.tempo_aberto:.0f}s: {motivo}")
+
+    def espera(self) -> float:
+        """Segundos até o disjuntor aceitar chamadas (0 se fechado ou meio aberto)"""
+        with self._lock:
+            if self.estado != self.ABERTO:
+                return 0.0
+            return max(self._aberto_ate - time.monotonic(), 0.0)
+
+    def estatisticas(self):
+        with self._lock:
+            agora = time.monotonic()
+            self._descartar_antigas(agora)
+            total = len(self._chamadas)
+            falhas = sum(1 for _, falha, _ in self._chamadas if falha)
+            lentas = sum(1 for _, _, lentidao in self._chamadas if lentidao)
+            return {
+                'estado': self.estado,
+                'chamadas_recentes': total,
+                'taxa_falhas': round(falhas / total, 3) if total else 0.0,
+                'taxa_lentas': round(lentas / total, 3) if total else 0.0,
+                'reabre_em_segundos': round(max(self._aberto_ate - agora, 0.0), 1) if self.estado == self.ABERTO else 0.0,
+                'aberturas': self.aberturas,
+                'chamadas_recusadas': self.recusadas,
+                'limites': {
+                    'taxa': self.taxa,
+                    'lentidao_segundos': self.lentidao,
+                    'minimo_chamadas': self.minimo_chamadas,
+                    'aberto_segundos': self.tempo_aberto
+                }
+            }
+
+class TelegramClient:
+    """Cliente da API do Telegram compartilhado por todos os envios
+
+    As conexões TLS com api.telegram.org ficam abertas e são reaproveitadas entre chamadas: a fachada
+    síncrona (chamar) usa uma requests.Session com pool, para as threads (controllers síncronos,
+    schedulers); a API assíncrona (chamar_async) usa httpx.AsyncClient e não bloqueia o event loop,
+    para os handlers async (webhook).
+
+    As duas passam pelo disjuntor: com a API fora do ar ou lenta, as chamadas falham na hora com
+    TelegramIndisponivel.
+    """
+
+    def __init__(self, base_url: str = TELEGRAM_API_URL, tamanho_pool: int = TELEGRAM_POOL_CONEXOES,
+                 disjuntor: Disjuntor = None):
+        self.base_url = base_url
+        self.tamanho_pool = tamanho_pool
+        self.disjuntor = disjuntor or Disjuntor()
+        self._lock = threading.Lock()
+        self._sessao = None
+        # O AsyncClient fica preso ao event loop em que foi criado: um por loop
+        self._loop_async = None
+        self._cliente_async = None
+
+    # Fachada síncrona
+
+    def _sessao_sync(self):
+        if self._sessao is None:
+            with self._lock:
+                if self._sessao is None:
+                    sessao = requests.Session()
+                    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.tamanho_pool)
+                    sessao.mount('https://', adaptador)
+                    sessao.mount('http://', adaptador)
+                    self._sessao = sessao
+        return self._sessao
+
+    def chamar(self, metodo: str, data: dict = None, json: dict = None, timeout: float = TIMEOUT_TELEGRAM,
+               verbo: str = 'POST') -> requests.Response:
+        """Chama um método da API (sendMessage, setWebhook, getWebhookInfo...) e devolve a resposta HTTP"""
+        sondagem = self.disjuntor.antes()
+        inicio, falhou = time.monotonic(), True
+        try:
+            resposta = self._sessao_sync().request(verbo, f'{self.base_url}/{metodo}', data=data, json=json,
+                                                   timeout=timeout)
+            falhou = resposta.status_code >= 500
+            return resposta
+        finally:
+            self.disjuntor.depois(sondagem, time.monotonic() - inicio, falhou)
+
+    # API assíncrona
+
+    def _cliente(self):
+        loop = asyncio.get_running_loop()
+        if self._cliente_async is None or self._loop_async is not loop:
+            self._cliente_async = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.tamanho_pool,
+                    max_keepalive_connections=self.tamanho_pool,
+                    keepalive_expiry=KEEPALIVE_TELEGRAM
+                )
+            )
+            self._loop_async = loop
+        return self._cliente_async
+
+    async def chamar_async(self, metodo: str, data: dict = None, json: dict = None, timeout: float = TIMEOUT_TELEGRAM,
+                           verbo: str = 'POST') -> httpx.Response:
+        """Como chamar(), sem bloquear o event loop (resposta httpx: use is_success em vez de ok)"""
+        sondagem = self.disjuntor.antes()
+        inicio, falhou = time.monotonic(), True
+        try:
+            resposta = await self._cliente().request(verbo, f'{self.base_url}/{metodo}', data=data, json=json,
+                                                     timeout=timeout)
+            falhou = resposta.status_code >= 500
+            return resposta
+        finally:
+            self.disjuntor.depois(sondagem, time.monotonic() - inicio, falhou)
+
+    # Encerramento
+
+    async def fechar_async(self):
+        """Fecha o pool assíncrono (chamado no shutdown da aplicação, dentro do event loop)"""
+        if self._cliente_async is not None and self._loop_async is asyncio.get_running_loop():
+            await self._cliente_async.aclose()
+        self._cliente_async = None
+        self._loop_async = None
+
+    def fechar(self):
+        with self._lock:
+            if self._sessao is not None:
+                self._sessao.close()
+                self._sessao = None
+
+# Instância global do cliente
+telegram = TelegramClient()
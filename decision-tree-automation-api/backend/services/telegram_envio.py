@@ -0,0 +1,270 @@
+# telegram_envio.py - Fila de saída das mensagens do Telegram: prioridades e limite de envio (global e por chat)
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from backend.config import TELEGRAM_LIMITE_GLOBAL, TELEGRAM_LIMITE_POR_CHAT, TELEGRAM_POOL_CONEXOES
+from backend.services.telegram_client import telegram, TelegramIndisponivel
+
+logger = logging.getLogger(__name__)
+
+# Prioridades (menor sai primeiro): confirmações ao líder, perguntas de alertas novos, mensagens informativas
+PRIORIDADE_CONFIRMACAO = 0
+PRIORIDADE_PERGUNTA = 1
+PRIORIDADE_INFORMATIVA = 2
+
+# Reenvios de uma mensagem recusada com 429 (Too Many Requests) antes de desistir
+MAXIMO_TENTATIVAS_429 = 5
+
+# Envios considerados nas estatísticas de espera (os mais recentes)
+AMOSTRAS_ESPERA = 1000
+
+# Intervalo (segundos) entre as limpezas dos baldes de chats ociosos
+INTERVALO_LIMPEZA_BALDES = 60
+
+class BaldeTokens:
+    """Token bucket: taxa tokens por segundo, acumulando no máximo capacidade"""
+
+    def __init__(self, taxa: float, capacidade: float):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.atualizado = time.monotonic()
+        # retry_after do Telegram: nenhum envio antes deste instante
+        self.bloqueado_ate = 0.0
+
+    def _repor(self, agora: float):
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def disponivel_em(self, agora: float) -> float:
+        """Instante (time.monotonic) em que haverá um token"""
+        self._repor(agora)
+        pronto = agora if self.tokens >= 1 else agora + (1 - self.tokens) / self.taxa
+        return max(pronto, self.bloqueado_ate)
+
+    def consumir(self, agora: float):
+        self._repor(agora)
+        self.tokens -= 1
+
+    def bloquear(self, ate: float):
+        self.bloqueado_ate = max(self.bloqueado_ate, ate)
+
+    def ocioso(self, agora: float) -> bool:
+        """Cheio e sem bloqueio: igual a um balde novo, pode ser descartado"""
+        return agora >= self.bloqueado_ate and agora - self.atualizado >= (self.capacidade - self.tokens) / self.taxa
+
+class _Envio:
+    __slots__ = ('prioridade', 'sequencia', 'chat_id', 'metodo', 'data', 'json', 'ao_enviar', 'futuro',
+                 'enfileirado_em', 'tentativas')
+
+    def __lt__(self, outro):
+        return (self.prioridade, self.sequencia) < (outro.prioridade, outro.sequencia)
+
+class FilaEnvio:
+    """Fila de saída compartilhada por todos os envios de mensagens ao Telegram
+
+    O Telegram aceita cerca de 30 mensagens/s no total e 1/s por chat; acima disso responde 429 e a
+    mensagem se perde. Cada envio entra numa fila por chat, ordenada por prioridade e chegada; um
+    despachante libera o próximo envio quando há token no balde global e no balde do chat (um chat
+    limitado não segura os outros) e o entrega a um pool de threads que faz a chamada HTTP. Um 429
+    bloqueia o chat pelo retry_after informado e a mensagem volta para a frente da fila; um retry_after
+    maior que o intervalo por chat (1 / limite_por_chat) indica o limite global e pausa todos os envios
+    por esse tempo. O balde de um
+    chat sem envios na fila é descartado quando volta a ficar cheio (recriado no próximo envio).
+
+    enviar() retorna um Future com a resposta (requests.Response); ao_enviar(resposta), se informado,
+    é chamado após um envio bem-sucedido, na thread do pool.
+    """
+
+    def __init__(self, cliente=telegram, limite_global: float = TELEGRAM_LIMITE_GLOBAL,
+                 limite_por_chat: float = TELEGRAM_LIMITE_POR_CHAT, threads: int = TELEGRAM_POOL_CONEXOES):
+        self.cliente = cliente
+        self.limite_por_chat = limite_por_chat
+        self.threads = threads
+        self._global = BaldeTokens(limite_global, limite_global)
+        self._baldes_chat = {}
+        self._filas_chat = {}
+        self._sequencia = itertools.count()
+        self._condicao = threading.Condition()
+        self._despachante = None
+        self._executor = None
+        self._parar = False
+        self._esperas = deque(maxlen=AMOSTRAS_ESPERA)
+        self._ultima_limpeza_baldes = time.monotonic()
+        self.enviados = 0
+        self.erros = 0
+        self.limitados = 0
+        self.pausas_globais = 0
+        self.recusados_disjuntor = 0
+
+    def enviar(self, data: dict = None, prioridade: int = PRIORIDADE_INFORMATIVA, metodo: str = 'sendMessage',
+               json: dict = None, ao_enviar=None) -> Future:
+        """Enfileira uma chamada (sendMessage por padrão) para o chat de data/json['chat_id']"""
+        envio = _Envio()
+        envio.prioridade = prioridade
+        envio.sequencia = next(self._sequencia)
+        envio.chat_id = str((data or json or {}).get('chat_id'))
+        envio.metodo = metodo
+        envio.data = data
+        envio.json = json
+        envio.ao_enviar = ao_enviar
+        envio.futuro = Future()
+        envio.enfileirado_em = time.monotonic()
+        envio.tentativas = 0
+        with self._condicao:
+            self._iniciar()
+            heapq.heappush(self._filas_chat.setdefault(envio.chat_id, []), envio)
+            self._condicao.notify()
+        return envio.futuro
+
+    def _iniciar(self):
+        if self._despachante is None:
+            self._parar = False
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='telegram-envio')
+            self._despachante = threading.Thread(target=self._despachar, name='telegram-despachante', daemon=True)
+            self._despachante.start()
+
+    def parar(self):
+        with self._condicao:
+            despachante, self._despachante = self._despachante, None
+            self._parar = True
+            self._condicao.notify_all()
+        if despachante is not None:
+            despachante.join(timeout=5)
+            self._executor.shutdown(wait=False)
+
+    def _balde(self, chat_id):
+        balde = self._baldes_chat.get(chat_id)
+        if balde is None:
+            balde = self._baldes_chat[chat_id] = BaldeTokens(self.limite_por_chat, 1)
+        return balde
+
+    def _descartar_baldes_ociosos(self, agora: float):
+        """Remove os baldes dos chats sem envios na fila que já estão cheios (chamado com a condição adquirida)"""
+        if agora - self._ultima_limpeza_baldes < INTERVALO_LIMPEZA_BALDES:
+            return
+        self._ultima_limpeza_baldes = agora
+        ociosos = [chat_id for chat_id, balde in self._baldes_chat.items()
+                   if chat_id not in self._filas_chat and balde.ocioso(agora)]
+        for chat_id in ociosos:
+            del self._baldes_chat[chat_id]
+
+    def _proximo(self, agora: float):
+        """Retira o envio liberado de maior prioridade, ou retorna (None, instante do próximo token)"""
+        global_pronto = self._global.disponivel_em(agora)
+        escolhido, proximo_em = None, None
+        for chat_id, fila in self._filas_chat.items():
+            pronto = max(global_pronto, self._balde(chat_id).disponivel_em(agora))
+            if pronto <= agora:
+                if escolhido is None or fila[0] < self._filas_chat[escolhido][0]:
+                    escolhido = chat_id
+            elif proximo_em is None or pronto < proximo_em:
+                proximo_em = pronto
+        if escolhido is None:
+            return None, proximo_em
+        fila = self._filas_chat[escolhido]
+        envio = heapq.heappop(fila)
+        if not fila:
+            del self._filas_chat[escolhido]
+        self._global.consumir(agora)
+        self._balde(escolhido).consumir(agora)
+        return envio, None
+
+    def _despachar(self):
+        while True:
+            with self._condicao:
+                while True:
+                    if self._parar:
+                        return
+                    agora = time.monotonic()
+                    self._descartar_baldes_ociosos(agora)
+                    envio, proximo_em = self._proximo(agora)
+                    if envio is not None:
+                        break
+                    self._condicao.wait(timeout=None if proximo_em is None else proximo_em - agora)
+                self._esperas.append(agora - envio.enfileirado_em)
+            self._executor.submit(self._executar, envio)
+
+    def _executar(self, envio: _Envio):
+        envio.tentativas += 1
+        try:
+            resposta = self.cliente.chamar(envio.metodo, data=envio.data, json=envio.json)
+        except TelegramIndisponivel as e:
+            # Disjuntor aberto: falha na hora; as mensagens do outbox são reagendadas por ele
+            self.recusados_disjuntor += 1
+            logger.warning(f"⚡ {envio.metodo} para o chat {envio.chat_id} recusado: {e}")
+            envio.futuro.set_exception(e)
+            return
+        except Exception as e:
+            self.erros += 1
+            logger.error(f"❌ Erro ao enviar {envio.metodo} para o chat {envio.chat_id}: {e}")
+            envio.futuro.set_exception(e)
+            return
+
+        if resposta.status_code == 429 and envio.tentativas < MAXIMO_TENTATIVAS_429:
+            try:
+                retry_after = resposta.json().get('parameters', {}).get('retry_after', 1)
+            except ValueError:
+                retry_after = 1
+            logger.warning(f"⏳ Telegram limitou o chat {envio.chat_id}: nova tentativa em {retry_after}s")
+            with self._condicao:
+                self.limitados += 1
+                bloqueio = time.monotonic() + retry_after
+                self._balde(envio.chat_id).bloquear(bloqueio)
+                if retry_after > 1 / self.limite_por_chat:
+                    # Espera maior que a de um chat: o limite atingido é o global, todos os chats esperam
+                    self.pausas_globais += 1
+                    self._global.bloquear(bloqueio)
+                    logger.warning(f"⏸️ Envios ao Telegram pausados por {retry_after}s (limite global)")
+                # Mesma prioridade e sequência: volta para a frente da fila do chat
+                heapq.heappush(self._filas_chat.setdefault(envio.chat_id, []), envio)
+                self._condicao.notify()
+            return
+
+        if resposta.ok:
+            self.enviados += 1
+            if envio.ao_enviar is not None:
+                try:
+                    envio.ao_enviar(resposta)
+                except Exception as e:
+                    logger.error(f"❌ Erro após o envio para o chat {envio.chat_id}: {e}")
+        else:
+            self.erros += 1
+            logger.error(f"❌ Telegram recusou {envio.metodo} para o chat {envio.chat_id}: "
+                         f"{resposta.status_code} - {resposta.text}")
+        envio.futuro.set_result(resposta)
+
+    def estatisticas(self):
+        with self._condicao:
+            por_prioridade = {'confirmacao': 0, 'pergunta': 0, 'informativa': 0}
+            nomes = {PRIORIDADE_CONFIRMACAO: 'confirmacao', PRIORIDADE_PERGUNTA: 'pergunta',
+                     PRIORIDADE_INFORMATIVA: 'informativa'}
+            agora = time.monotonic()
+            espera_mais_antigo = 0.0
+            for fila in self._filas_chat.values():
+                for envio in fila:
+                    por_prioridade[nomes.get(envio.prioridade, 'informativa')] += 1
+                    espera_mais_antigo = max(espera_mais_antigo, agora - envio.enfileirado_em)
+            esperas = sorted(self._esperas)
+        return {
+            'profundidade': sum(por_prioridade.values()),
+            'por_prioridade': por_prioridade,
+            'chats_na_fila': len(self._filas_chat),
+            'baldes_chat': len(self._baldes_chat),
+            'espera_mais_antigo_ms': round(espera_mais_antigo * 1000),
+            'espera_media_ms': round(sum(esperas) / len(esperas) * 1000) if esperas else 0,
+            'espera_p95_ms': round(esperas[int(len(esperas) * 0.95)] * 1000) if esperas else 0,
+            'espera_maxima_ms': round(esperas[-1] * 1000) if esperas else 0,
+            'enviados': self.enviados,
+            'erros': self.erros,
+            'limitados_429': self.limitados,
+            'pausas_globais_429': self.pausas_globais,
+            'recusados_disjuntor': self.recusados_disjuntor
+        }
+
+# Instância global da fila de saída
+fila_envio = FilaEnvio()
@@ -0,0 +1,285 @@
+# telegram_fila.py - Fila durável do webhook do Telegram: gravação imediata e processamento por um pool de workers
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from backend.config import TZ_BR, TELEGRAM_WEBHOOK_WORKERS, TELEGRAM_DEDUP_CACHE, TELEGRAM_DEDUP_TTL_HORAS
+from backend.models.responses_model import engine
+from backend.models.telegram_update_model import AtualizacaoTelegram, UpdateRecebido
+
+logger = logging.getLogger(__name__)
+
+_updates = AtualizacaoTelegram.__table__
+_recebidos = UpdateRecebido.__table__
+
+# Updates pendentes examinados por vez ao procurar um chat livre
+LOTE_RESERVA = 100
+
+# Espera máxima (segundos) de um worker ocioso antes de olhar a fila de novo
+INTERVALO_OCIOSO = 1
+
+# Updates concluídos ficam na tabela por este tempo (para consulta) e depois são removidos
+RETENCAO_CONCLUIDOS = timedelta(hours=1)
+# Updates com erro ficam mais tempo (para investigação) e também são removidos; não voltam para a fila
+RETENCAO_ERROS = timedelta(hours=24)
+INTERVALO_LIMPEZA = timedelta(minutes=5)
+
+# Vezes que um update é processado quando o processador levanta exceção (ex.: "database is locked")
+# antes de ficar com erro
+MAXIMO_TENTATIVAS = 5
+# Por quanto tempo um update_id aceito é lembrado para descartar reenvios
+TTL_DEDUP = timedelta(hours=TELEGRAM_DEDUP_TTL_HORAS)
+
+def chat_do_update(dados: dict):
+    """Chat de origem do update (define a ordem de processamento); None se não houver"""
+    mensagem = dados.get('message') or {}
+    chat_id = (mensagem.get('chat') or {}).get('id') or (mensagem.get('from') or {}).get('id')
+    return str(chat_id) if chat_id is not None else None
+
+class FilaWebhook:
+    """Fila dos updates do webhook, persistida na tabela telegram_updates
+
+    O endpoint só grava o update (enfileirar) e responde; um pool de workers (threads) processa os
+    pendentes em ordem de chegada, nunca dois updates do mesmo chat ao mesmo tempo, de modo que as
+    mensagens de cada chat são tratadas na ordem em que foram enviadas.
+
+    O processador recebe o id do update na fila e o marca como concluído no seu próprio commit
+    (concluir_na_transacao): as previsões e a confirmação gravadas e o update concluído entram juntos.
+    Por isso um update ainda 'processando' quando o serviço parou não gravou nada e volta para a fila ao
+    iniciar, sem risco de aplicar as previsões duas vezes. Se o processador levanta exceção, o update
+    volta para a fila, até MAXIMO_TENTATIVAS vezes; só o resultado {"status": "error"} devolvido pelo
+    processador (que já avisou o líder) é definitivo. Updates com erro são removidos após RETENCAO_ERROS.
+
+    Reenvios do Telegram (mesmo update_id) são descartados: primeiro por um LRU em memória com os
+    update_ids recentes, depois pela tabela telegram_updates_recebidos, gravada na mesma transação
+    que o update e limpa após TTL_DEDUP.
+    """
+
+    def __init__(self, workers: int = TELEGRAM_WEBHOOK_WORKERS, tamanho_dedup: int = TELEGRAM_DEDUP_CACHE):
+        self.workers = workers
+        self.tamanho_dedup = tamanho_dedup
+        # update_id -> instante (time.monotonic) em que foi aceito, do mais antigo ao mais recente
+        self._recentes = OrderedDict()
+        self._lock_recentes = threading.Lock()
+        self._processador = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._condicao = threading.Condition()
+        self._parar = threading.Event()
+        self._chats_ocupados = set()
+        # Incrementado a cada novo update ou chat liberado: um worker só dorme se nada mudou desde a última busca
+        self._sinais = 0
+        self._ultima_limpeza = datetime.now(TZ_BR)
+        self.processados = 0
+        self.erros = 0
+        self.duplicados = 0
+
+    def ja_recebido(self, update_id) -> bool:
+        """True se o update_id está no LRU de updates aceitos (reenvio); não consulta o banco"""
+        if update_id is None:
+            return False
+        with self._lock_recentes:
+            aceito_em = self._recentes.get(update_id)
+            if aceito_em is None:
+                return False
+            if time.monotonic() - aceito_em > TTL_DEDUP.total_seconds():
+                del self._recentes[update_id]
+                return False
+            self._recentes.move_to_end(update_id)
+            self.duplicados += 1
+            return True
+
+    def _lembrar(self, update_id):
+        with self._lock_recentes:
+            self._recentes[update_id] = time.monotonic()
+            self._recentes.move_to_end(update_id)
+            while len(self._recentes) > self.tamanho_dedup:
+                self._recentes.popitem(last=False)
+
+    def enfileirar(self, dados: dict, corpo: bytes):
+        """Grava o update bruto como pendente e acorda um worker; retorna o id na fila ou None se for reenvio"""
+        update_id = dados.get('update_id')
+        if self.ja_recebido(update_id):
+            return None
+        agora = datetime.now(TZ_BR)
+        try:
+            with engine.begin() as conexao:
+                if update_id is not None:
+                    # Falha com IntegrityError se o update_id já foi aceito (reenvio fora do LRU)
+                    conexao.execute(insert(_recebidos).values(update_id=update_id, recebido_em=agora))
+                resultado = conexao.execute(insert(_updates).values(
+                    update_id=update_id,
+                    chat_id=chat_do_update(dados),
+                    corpo=corpo.decode('utf-8', errors='replace'),
+                    status='pendente',
+                    tentativas=0,
+                    recebido_em=agora
+                ))
+                fila_id = resultado.inserted_primary_key[0]
+        except IntegrityError:
+            self._lembrar(update_id)
+            with self._lock_recentes:
+                self.duplicados += 1
+            return None
+        if update_id is not None:
+            self._lembrar(update_id)
+        self._sinalizar()
+        return fila_id
+
+    def _sinalizar(self):
+        with self._condicao:
+            self._sinais += 1
+            self._condicao.notify_all()
+
+    def iniciar(self, processador):
+        """Inicia os workers; processador(dados, fila_id) trata um update e retorna um dict com o resultado
+
+        Os updates que ficaram em processamento (serviço parado antes do commit do processador) voltam
+        para a fila.
+        """
+        if self._threads:
+            return
+        self._processador = processador
+        self._parar.clear()
+        with engine.begin() as conexao:
+            recuperados = conexao.execute(
+                update(_updates).where(_updates.c.status == 'processando').values(status='pendente')
+            ).rowcount
+        if recuperados:
+            logger.info(f"♻️ {recuperados} updates do Telegram interrompidos voltaram para a fila")
+        for numero in range(self.workers):
+            thread = threading.Thread(target=self._executar, name=f'webhook-worker-{numero}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"✅ Fila do webhook iniciada com {self.workers} workers")
+
+    def parar(self):
+        self._parar.set()
+        self._sinalizar()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _reservar(self):
+        """Marca como em processamento o update pendente mais antigo de um chat que não está ocupado"""
+        with self._lock:
+            with engine.begin() as conexao:
+                pendentes = conexao.execute(
+                    select(_updates.c.id, _updates.c.chat_id)
+                    .where(_updates.c.status == 'pendente').order_by(_updates.c.id).limit(LOTE_RESERVA)
+                ).all()
+                for fila_id, chat_id in pendentes:
+                    if chat_id in self._chats_ocupados:
+                        continue
+                    corpo, tentativas = conexao.execute(
+                        update(_updates).where(_updates.c.id == fila_id)
+                        .values(status='processando', tentativas=_updates.c.tentativas + 1)
+                        .returning(_updates.c.corpo, _updates.c.tentativas)
+                    ).one()
+                    self._chats_ocupados.add(chat_id)
+                    return fila_id, chat_id, corpo, tentativas
+        return None
+
+    def concluir_na_transacao(self, db, fila_id, status: str = 'concluido'):
+        """Marca o update fila_id com o status final na transação de db (a do commit do processador)
+
+        Nada a fazer sem fila_id (update processado fora da fila).
+        """
+        if fila_id is None:
+            return
+        db.execute(update(_updates).where(_updates.c.id == fila_id, _updates.c.status == 'processando').values(
+            status=status, processado_em=datetime.now(TZ_BR)
+        ))
+
+    def _concluir(self, fila_id, chat_id, status: str, resultado: dict):
+        try:
+            with engine.begin() as conexao:
+                if status == 'pendente':
+                    # De volta à fila, salvo se o processador já concluiu o update no seu commit
+                    conexao.execute(update(_updates).where(
+                        _updates.c.id == fila_id, _updates.c.status == 'processando'
+                    ).values(status='pendente', resultado=json.dumps(resultado, ensure_ascii=False, default=str)))
+                else:
+                    conexao.execute(update(_updates).where(_updates.c.id == fila_id).values(
+                        status=status,
+                        resultado=json.dumps(resultado, ensure_ascii=False, default=str),
+                        processado_em=datetime.now(TZ_BR)
+                    ))
+        finally:
+            with self._lock:
+                self._chats_ocupados.discard(chat_id)
+            # Próximos updates do mesmo chat podem ter sido pulados por outros workers
+            self._sinalizar()
+
+    def _limpar_concluidos(self):
+        agora = datetime.now(TZ_BR)
+        with self._lock:
+            if agora - self._ultima_limpeza < INTERVALO_LIMPEZA:
+                return
+            self._ultima_limpeza = agora
+        with engine.begin() as conexao:
+            conexao.execute(delete(_updates).where(
+                _updates.c.status == 'concluido', _updates.c.processado_em < agora - RETENCAO_CONCLUIDOS
+            ))
+            conexao.execute(delete(_updates).where(
+                _updates.c.status == 'erro', _updates.c.processado_em < agora - RETENCAO_ERROS
+            ))
+            conexao.execute(delete(_recebidos).where(_recebidos.c.recebido_em < agora - TTL_DEDUP))
+
+    def _executar(self):
+        while not self._parar.is_set():
+            with self._condicao:
+                sinais = self._sinais
+            try:
+                reservado = self._reservar()
+            except Exception as e:
+                logger.error(f"❌ Erro ao ler a fila do webhook: {e}")
+                reservado = None
+            if reservado is None:
+                try:
+                    self._limpar_concluidos()
+                except Exception as e:
+                    logger.error(f"❌ Erro ao limpar a fila do webhook: {e}")
+                with self._condicao:
+                    if self._sinais == sinais and not self._parar.is_set():
+                        self._condicao.wait(timeout=INTERVALO_OCIOSO)
+                continue
+
+            fila_id, chat_id, corpo, tentativas = reservado
+            try:
+                resultado = self._processador(json.loads(corpo), fila_id)
+                status = 'erro' if resultado.get('status') == 'error' else 'concluido'
+            except Exception as e:
+                resultado = {"status": "error", "msg": str(e)}
+                if tentativas < MAXIMO_TENTATIVAS:
+                    logger.warning(f"⚠️ Erro ao processar update {fila_id} da fila do webhook (tentativa {tentativas}), volta para a fila: {e}")
+                    status = 'pendente'
+                else:
+                    logger.error(f"❌ Erro ao processar update {fila_id} da fila do webhook após {tentativas} tentativas: {e}")
+                    status = 'erro'
+            if status == 'erro':
+                self.erros += 1
+            elif status == 'concluido':
+                self.processados += 1
+            self._concluir(fila_id, chat_id, status, resultado)
+
+    def estatisticas(self):
+        with engine.connect() as conexao:
+            pendentes = conexao.execute(select(func.count()).where(_updates.c.status == 'pendente')).scalar()
+        with self._lock:
+            ocupados = len(self._chats_ocupados)
+        return {
+            'workers': len(self._threads),
+            'em_processamento': ocupados,
+            'pendentes': pendentes,
+            'processados': self.processados,
+            'erros': self.erros,
+            'duplicados': self.duplicados
+        }
+
+# Instância global da fila
+fila_webhook = FilaWebhook()
@@ -0,0 +1,391 @@
+# telegram_saida.py - Outbox das mensagens ao Telegram: gravação na transação de origem, novas tentativas e dead-letter
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, insert, literal, select, update, delete
+from sqlalchemy.orm import Session
+from backend.config import (TZ_BR, TELEGRAM_JANELA_RESUMO, TELEGRAM_SAIDA_TENTATIVAS, TELEGRAM_SAIDA_ESPERA_MAXIMA,
+                            TELEGRAM_SAIDA_PRAZO_ENVIO)
+from backend.models.alerta_model import Alerta
+from backend.models.responses_model import engine, SessionLocal
+from backend.models.telegram_update_model import MensagemSaida, MensagemFalha
+from backend.services.telegram_client import TelegramIndisponivel
+from backend.services.telegram_envio import FilaEnvio, fila_envio, PRIORIDADE_PERGUNTA, PRIORIDADE_INFORMATIVA
+
+logger = logging.getLogger(__name__)
+
+_saida = MensagemSaida.__table__
+_falhas = MensagemFalha.__table__
+
+# Alertas por mensagem de resumo (o texto precisa caber no limite de 4096 caracteres do Telegram)
+MAXIMO_LINHAS_RESUMO = 20
+
+# Mensagens pendentes examinadas por vez pelo despachante
+LOTE_DESPACHO = 500
+
+# Espera máxima (segundos) do despachante ocioso antes de olhar o outbox de novo
+INTERVALO_OCIOSO = 5
+
+# Espera (segundos) antes da segunda tentativa; dobra a cada falha, até TELEGRAM_SAIDA_ESPERA_MAXIMA
+ESPERA_INICIAL = 2
+
+# Colunas copiadas entre o outbox e a tabela de falhas
+_CAMPOS_MENSAGEM = ('tipo', 'chat_id', 'alerta_id', 'texto', 'prioridade', 'tentativas', 'ultimo_erro', 'criado_em')
+
+def _com_fuso(valor: datetime) -> datetime:
+    """O SQLite devolve as datas sem fuso: são horários de Brasília"""
+    return TZ_BR.localize(valor) if valor.tzinfo is None else valor
+
+def texto_pergunta(problemas) -> str:
+    """Pergunta de um alerta ou, com vários, resumo numerado (uma linha por alerta)"""
+    if len(problemas) == 1:
+        return f"Qual o prazo para resolução do problema?\n\n{problemas[0]}\n\n(Responda apenas o horário no formato HH:MM)"
+    linhas = '\n'.join(f"{numero}. {problema[:150]}" for numero, problema in enumerate(problemas, 1))
+    return (f"🔔 {len(problemas)} novos alertas. Qual o prazo para resolução de cada problema?\n\n{linhas}\n\n"
+            f"(Responda a esta mensagem com os horários na ordem das linhas, no formato HH:MM, "
+            f"ex: {' '.join(['15:30', '16:00', '17:45'][:len(problemas)])})")
+
+class SaidaTelegram:
+    """Outbox das mensagens ao Telegram, persistido na tabela telegram_saida
+
+    Quem cria um alerta grava a pergunta no outbox (registrar_pergunta) na mesma transação do alerta:
+    se o commit acontece, a pergunta será enviada, mesmo que o Telegram esteja fora do ar ou o serviço
+    reinicie, e a requisição HTTP não espera o Telegram; as respostas do webhook ao líder (confirmações e
+    instruções) também são gravadas no outbox (registrar_mensagem), na transação das previsões. Um
+    despachante (thread) entrega as mensagens pendentes à fila de saída (limite de envio); no sucesso
+    grava o message_id e a linha nos alertas e remove a mensagem do outbox. Uma falha reagenda a
+    mensagem com espera exponencial e jitter; após TELEGRAM_SAIDA_TENTATIVAS tentativas, ou numa recusa
+    definitiva do Telegram (4xx, exceto 429), a mensagem vai para a tabela telegram_saida_falhas, de
+    onde pode ser reenviada (reenviar_falhas).
+    Com o disjuntor do cliente aberto (API fora do ar), as mensagens esperam no outbox sem gastar tentativas.
+
+    Com janela > 0, as perguntas pendentes de um mesmo chat esperam janela segundos (contados a partir
+    da primeira) e saem numa única mensagem de resumo numerada, de até MAXIMO_LINHAS_RESUMO alertas;
+    cada alerta guarda a linha em que aparece, e a resposta (reply) ao resumo com os horários na ordem
+    das linhas preenche os alertas correspondentes. Com janela 0, cada alerta tem sua própria mensagem.
+
+    A entrega é "pelo menos uma vez": uma mensagem em envio quando o serviço parou volta para o outbox,
+    e uma reservada há mais de prazo_envio segundos sem resultado (envio perdido) é retomada pelo despachante.
+    """
+
+    def __init__(self, fila: FilaEnvio = fila_envio, janela: float = TELEGRAM_JANELA_RESUMO,
+                 tentativas: int = TELEGRAM_SAIDA_TENTATIVAS, espera_maxima: float = TELEGRAM_SAIDA_ESPERA_MAXIMA,
+                 prazo_envio: float = TELEGRAM_SAIDA_PRAZO_ENVIO):
+        self.fila = fila
+        self.janela = janela
+        self.tentativas = tentativas
+        self.espera_maxima = espera_maxima
+        self.prazo_envio = prazo_envio
+        self._thread = None
+        self._condicao = threading.Condition()
+        self._parar = threading.Event()
+        # Incrementado a cada mensagem nova ou envio concluído: o despachante só dorme se nada mudou
+        self._sinais = 0
+        self.enviadas = 0
+        self.reagendadas = 0
+        self.adiadas = 0
+        self.falhas = 0
+        self.resumos = 0
+        self.alertas_agrupados = 0
+        self.retomadas = 0
+
+    # Gravação no outbox (na transação de quem chama; o commit fica com quem chama)
+
+    def registrar_pergunta(self, db: Session, alerta: Alerta):
+        """Grava no outbox a pergunta "Qual o prazo..." do alerta
+
+        A pergunta entra na mesma transação do alerta (o commit é de quem chama); o envio (com novas
+        tentativas) é feito em segundo plano, e o message_id e a linha são gravados no alerta após o envio.
+        """
+        if alerta.id is None:
+            db.flush()
+        self._registrar(db, 'pergunta', alerta.chat_id, alerta.problema, PRIORIDADE_PERGUNTA, alerta.id)
+        logger.info(f"Pergunta do alerta {alerta.id} gravada no outbox para o chat_id {alerta.chat_id}")
+
+    def registrar_mensagem(self, db: Session, chat_id: str, texto: str, prioridade: int = PRIORIDADE_INFORMATIVA):
+        """Grava no outbox uma mensagem de texto pronta"""
+        self._registrar(db, 'mensagem', chat_id, texto, prioridade)
+
+    def _registrar(self, db: Session, tipo: str, chat_id, texto: str, prioridade: int, alerta_id: int = None):
+        agora = datetime.now(TZ_BR)
+        db.add(MensagemSaida(
+            tipo=tipo,
+            chat_id=str(chat_id),
+            alerta_id=alerta_id,
+            texto=texto,
+            prioridade=prioridade,
+            status='pendente',
+            tentativas=0,
+            proxima_tentativa=agora,
+            criado_em=agora
+        ))
+        # Acorda o despachante após o commit (ver _acordar_despachante)
+        db.info['saida_telegram'] = True
+
+    # Despachante
+
+    def sinalizar(self):
+        with self._condicao:
+            self._sinais += 1
+            self._condicao.notify_all()
+
+    def iniciar(self):
+        if self._thread is not None:
+            return
+        self._parar.clear()
+        with engine.begin() as conexao:
+            recuperadas = conexao.execute(
+                update(_saida).where(_saida.c.status == 'enviando')
+                .values(status='pendente', proxima_tentativa=datetime.now(TZ_BR))
+            ).rowcount
+        if recuperadas:
+            logger.info(f"♻️ {recuperadas} mensagens do Telegram interrompidas voltaram para o outbox")
+        self._thread = threading.Thread(target=self._executar, name='telegram-saida', daemon=True)
+        self._thread.start()
+        logger.info("✅ Outbox do Telegram iniciado")
+
+    def parar(self):
+        """Para o despachante; as mensagens pendentes continuam no outbox"""
+        self._parar.set()
+        self.sinalizar()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _executar(self):
+        while not self._parar.is_set():
+            with self._condicao:
+                sinais = self._sinais
+            try:
+                espera = self._despachar()
+            except Exception as e:
+                logger.error(f"❌ Erro no despachante do outbox do Telegram: {e}")
+                espera = INTERVALO_OCIOSO
+            with self._condicao:
+                if self._sinais == sinais and not self._parar.is_set():
+                    self._condicao.wait(timeout=min(espera, INTERVALO_OCIOSO))
+
+    def _despachar(self) -> float:
+        """Envia as mensagens pendentes já vencidas; retorna os segundos até a próxima a vencer"""
+        bloqueado = self.fila.cliente.disjuntor.espera()
+        if bloqueado > 0:
+            # API do Telegram indisponível: nada sai do outbox até o disjuntor aceitar uma sondagem
+            return bloqueado
+        agora = datetime.now(TZ_BR)
+        with engine.begin() as conexao:
+            # Envio reservado sem resultado dentro do prazo (proxima_tentativa guarda o prazo): volta ao outbox
+            retomadas = conexao.execute(
+                update(_saida).where(_saida.c.status == 'enviando', _saida.c.proxima_tentativa <= agora)
+                .values(status='pendente')
+            ).rowcount
+            pendentes = conexao.execute(
+                select(_saida).where(_saida.c.status == 'pendente', _saida.c.proxima_tentativa <= agora)
+                .order_by(_saida.c.id).limit(LOTE_DESPACHO)
+            ).all()
+            proxima = conexao.execute(
+                select(func.min(_saida.c.proxima_tentativa))
+                .where(_saida.c.status.in_(('pendente', 'enviando')), _saida.c.proxima_tentativa > agora)
+            ).scalar()
+        if retomadas:
+            self.retomadas += retomadas
+            logger.warning(f"♻️ {retomadas} mensagens do Telegram sem resultado após {self.prazo_envio:.0f}s "
+                           f"voltaram para o outbox")
+        lotes, acordar_em = self._agrupar(pendentes, agora)
+        for lote in lotes:
+            self._enviar(lote)
+        if lotes:
+            # Prazo dos envios que acabaram de ser reservados
+            prazo = agora + timedelta(seconds=self.prazo_envio)
+            acordar_em = prazo if acordar_em is None else min(acordar_em, prazo)
+        if proxima is not None:
+            proxima = _com_fuso(proxima)
+            acordar_em = proxima if acordar_em is None else min(acordar_em, proxima)
+        return INTERVALO_OCIOSO if acordar_em is None else max((acordar_em - agora).total_seconds(), 0.01)
+
+    def _agrupar(self, pendentes, agora: datetime):
+        """Separa as mensagens em envios: perguntas de um chat em resumos (respeitando a janela), o resto uma a uma"""
+        lotes, perguntas, acordar_em = [], {}, None
+        for mensagem in pendentes:
+            if mensagem.tipo == 'pergunta':
+                perguntas.setdefault(mensagem.chat_id, []).append(mensagem)
+            else:
+                lotes.append([mensagem])
+        passo = MAXIMO_LINHAS_RESUMO if self.janela > 0 else 1
+        for mensagens in perguntas.values():
+            for inicio in range(0, len(mensagens), passo):
+                lote = mensagens[inicio:inicio + passo]
+                if len(lote) < passo:
+                    fim_janela = _com_fuso(lote[0].criado_em) + timedelta(seconds=self.janela)
+                    if fim_janela > agora:
+                        acordar_em = fim_janela if acordar_em is None else min(acordar_em, fim_janela)
+                        continue
+                lotes.append(lote)
+        return lotes, acordar_em
+
+    def _enviar(self, lote):
+        ids = [mensagem.id for mensagem in lote]
+        with engine.begin() as conexao:
+            reservadas = set(conexao.execute(
+                update(_saida).where(_saida.c.id.in_(ids), _saida.c.status == 'pendente')
+                .values(status='enviando', tentativas=_saida.c.tentativas + 1,
+                        proxima_tentativa=datetime.now(TZ_BR) + timedelta(seconds=self.prazo_envio))
+                .returning(_saida.c.id)
+            ).scalars())
+        lote = [mensagem for mensagem in lote if mensagem.id in reservadas]
+        if not lote:
+            return
+        if lote[0].tipo == 'pergunta':
+            texto = texto_pergunta([mensagem.texto for mensagem in lote])
+        else:
+            texto = lote[0].texto
+        futuro = self.fila.enviar({'chat_id': lote[0].chat_id, 'text': texto}, lote[0].prioridade)
+        futuro.add_done_callback(lambda futuro: self._apos_envio(lote, futuro))
+
+    def _apos_envio(self, lote, futuro):
+        try:
+            try:
+                resposta = futuro.result()
+            except TelegramIndisponivel as e:
+                self._adiar(lote, e.tentar_em)
+                return
+            except Exception as e:
+                self._falhou(lote, str(e), definitiva=False)
+                return
+            if resposta.ok:
+                self._concluir(lote, resposta)
+            else:
+                definitiva = 400 <= resposta.status_code < 500 and resposta.status_code != 429
+                self._falhou(lote, f"{resposta.status_code} - {resposta.text[:500]}", definitiva)
+        except Exception as e:
+            logger.error(f"❌ Erro ao registrar o envio das mensagens {[m.id for m in lote]} do outbox: {e}")
+        finally:
+            self.sinalizar()
+
+    def _concluir(self, lote, resposta):
+        """Grava o message_id e a linha de cada alerta da mensagem e a remove do outbox, numa só transação"""
+        mensagem_id = resposta.json().get('result', {}).get('message_id')
+        linhas = {mensagem.alerta_id: linha for linha, mensagem in enumerate(lote, 1) if mensagem.alerta_id is not None}
+        db = SessionLocal()
+        try:
+            if linhas:
+                for alerta in db.query(Alerta).filter(Alerta.id.in_(linhas)):
+                    alerta.mensagem_id = mensagem_id
+                    alerta.mensagem_linha = linhas[alerta.id]
+            db.execute(delete(_saida).where(_saida.c.id.in_([mensagem.id for mensagem in lote])))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.enviadas += 1
+        if len(lote) > 1:
+            self.resumos += 1
+            self.alertas_agrupados += len(lote)
+        if linhas:
+            logger.info(f"Pergunta dos alertas {list(linhas)} enviada (mensagem {mensagem_id})")
+
+    def _adiar(self, lote, segundos: float):
+        """Recusa do disjuntor: a mensagem volta ao outbox sem contar a tentativa"""
+        with engine.begin() as conexao:
+            conexao.execute(update(_saida).where(_saida.c.id.in_([mensagem.id for mensagem in lote])).values(
+                status='pendente', tentativas=_saida.c.tentativas - 1,
+                proxima_tentativa=datetime.now(TZ_BR) + timedelta(seconds=segundos)
+            ))
+        self.adiadas += 1
+
+    def _espera(self, tentativas: int) -> float:
+        """Espera exponencial com jitter: metade fixa, metade aleatória (evita que as novas tentativas
+        de muitas mensagens caiam todas no mesmo instante)"""
+        teto = min(self.espera_maxima, ESPERA_INICIAL * 2 ** (tentativas - 1))
+        return teto / 2 + random.uniform(0, teto / 2)
+
+    def _falhou(self, lote, erro: str, definitiva: bool):
+        ids = [mensagem.id for mensagem in lote]
+        tentativas = max(mensagem.tentativas for mensagem in lote) + 1
+        agora = datetime.now(TZ_BR)
+        with engine.begin() as conexao:
+            if definitiva or tentativas >= self.tentativas:
+                conexao.execute(update(_saida).where(_saida.c.id.in_(ids)).values(ultimo_erro=erro))
+                conexao.execute(insert(_falhas).from_select(
+                    [*_CAMPOS_MENSAGEM, 'falhou_em'],
+                    select(*(_saida.c[campo] for campo in _CAMPOS_MENSAGEM),
+                           literal(agora, _falhas.c.falhou_em.type))
+                    .where(_saida.c.id.in_(ids)).order_by(_saida.c.id)
+                ))
+                conexao.execute(delete(_saida).where(_saida.c.id.in_(ids)))
+                self.falhas += 1
+                logger.error(f"❌ Mensagens {ids} do outbox movidas para as falhas após {tentativas} tentativas: {erro}")
+                return
+            espera = self._espera(tentativas)
+            conexao.execute(update(_saida).where(_saida.c.id.in_(ids)).values(
+                status='pendente', proxima_tentativa=agora + timedelta(seconds=espera), ultimo_erro=erro
+            ))
+        self.reagendadas += 1
+        logger.warning(f"⏳ Falha ao enviar as mensagens {ids} do outbox (tentativa {tentativas}): {erro}; "
+                       f"nova tentativa em {espera:.1f}s")
+
+    # Dead-letter
+
+    def listar_falhas(self, limite: int = 100):
+        with engine.connect() as conexao:
+            falhas = conexao.execute(select(_falhas).order_by(_falhas.c.id.desc()).limit(limite)).mappings().all()
+        return [dict(falha) for falha in falhas]
+
+    def reenviar_falhas(self, ids=None) -> int:
+        """Devolve ao outbox as mensagens da tabela de falhas (todas ou as dos ids), com as tentativas zeradas"""
+        agora = datetime.now(TZ_BR)
+        with engine.begin() as conexao:
+            consulta = select(_falhas.c.id)
+            if ids is not None:
+                consulta = consulta.where(_falhas.c.id.in_(ids))
+            selecionadas = conexao.execute(consulta).scalars().all()
+            if not selecionadas:
+                return 0
+            conexao.execute(insert(_saida).from_select(
+                ['tipo', 'chat_id', 'alerta_id', 'texto', 'prioridade', 'ultimo_erro', 'criado_em',
+                 'status', 'tentativas', 'proxima_tentativa'],
+                select(_falhas.c.tipo, _falhas.c.chat_id, _falhas.c.alerta_id, _falhas.c.texto,
+                       _falhas.c.prioridade, _falhas.c.ultimo_erro, _falhas.c.criado_em,
+                       literal('pendente'), literal(0), literal(agora, _saida.c.proxima_tentativa.type))
+                .where(_falhas.c.id.in_(selecionadas)).order_by(_falhas.c.id)
+            ))
+            conexao.execute(delete(_falhas).where(_falhas.c.id.in_(selecionadas)))
+        logger.info(f"🔁 {len(selecionadas)} mensagens da tabela de falhas devolvidas ao outbox do Telegram")
+        self.sinalizar()
+        return len(selecionadas)
+
+    def estatisticas(self):
+        with engine.connect() as conexao:
+            por_status = dict(conexao.execute(
+                select(_saida.c.status, func.count()).group_by(_saida.c.status)
+            ).all())
+            mais_antiga = conexao.execute(select(func.min(_saida.c.criado_em))).scalar()
+            falhas = conexao.execute(select(func.count()).select_from(_falhas)).scalar()
+        return {
+            'pendentes': por_status.get('pendente', 0),
+            'enviando': por_status.get('enviando', 0),
+            'mais_antiga': _com_fuso(mais_antiga).isoformat() if mais_antiga else None,
+            'falhas': falhas,
+            'enviadas': self.enviadas,
+            'reagendadas': self.reagendadas,
+            'adiadas_disjuntor': self.adiadas,
+            'retomadas_prazo': self.retomadas,
+            'movidas_para_falhas': self.falhas,
+            'janela_resumo_segundos': self.janela,
+            'resumos_enviados': self.resumos,
+            'alertas_em_resumos': self.alertas_agrupados
+        }
+
+# Instância global do outbox
+saida_telegram = SaidaTelegram()
+
+@event.listens_for(SessionLocal, 'after_commit')
+def _acordar_despachante(session):
+    if session.info.pop('saida_telegram', False):
+        saida_telegram.sinalizar()
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def _descartar_sinal(session):
+    session.info.pop('saida_telegram', None)
@@ -1,10 +1,14 @@
 # api_router.py - Define as rotas da API (View)
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, HTTPException
 from backend.controllers import telegram_webhook
 from backend.models.responses_model import add_response, get_responses
+from backend.views.json_rapido import RespostaJSONRapida
+from backend.services.telegram_client import telegram
+from backend.services.telegram_envio import fila_envio, PRIORIDADE_INFORMATIVA
+from backend.services.telegram_saida import saida_telegram
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import logging
-import requests
-from backend.config import TELEGRAM_API_URL
 from datetime import datetime
 
 api_router = APIRouter()
@@ -21,16 +25,17 @@ async def receive_response(request: Request):
 @api_router.get('/respostas')
 def list_responses():
     responses = get_responses()
-    return [
+    # O timestamp (datetime) é serializado direto pelo orjson
+    return RespostaJSONRapida([
         {
             "id": response.id,
             "user_id": response.user_id,
             "pergunta": response.pergunta,
             "resposta": response.resposta,
-            "timestamp": response.timestamp.isoformat() if response.timestamp else None
+            "timestamp": response.timestamp
         }
         for response in responses
-    ]
+    ])
 
 # Rota para receber webhooks do Telegram
 @api_router.post('/telegram-webhook')
@@ -61,12 +66,12 @@ async def set_telegram_webhook():
         logger.info(f"📤 Payload do webhook: {payload}")
         print(f"📤 Payload do webhook: {payload}")
         
-        response = requests.post(f'{TELEGRAM_API_URL}/setWebhook', json=payload, timeout=30)
+        response = await telegram.chamar_async('setWebhook', json=payload, timeout=30)
         
         logger.info(f"📥 Resposta do Telegram: {response.status_code} - {response.text}")
         print(f"📥 Resposta do Telegram: {response.status_code} - {response.text}")
         
-        if response.ok:
+        if response.is_success:
             result = response.json()
             logger.info(f"✅ Webhook configurado com sucesso: {result}")
             print(f"✅ Webhook configurado com sucesso: {result}")
@@ -101,12 +106,12 @@ async def get_webhook_info():
         logger.info("🔍 Verificando informações do webhook")
         print("🔍 Verificando informações do webhook")
         
-        response = requests.get(f'{TELEGRAM_API_URL}/getWebhookInfo', timeout=30)
+        response = await telegram.chamar_async('getWebhookInfo', timeout=30, verbo='GET')
         
         logger.info(f"📥 Resposta do Telegram: {response.status_code} - {response.text}")
         print(f"📥 Resposta do Telegram: {response.status_code} - {response.text}")
         
-        if response.ok:
+        if response.is_success:
             result = response.json()
             logger.info(f"✅ Informações do webhook: {result}")
             print(f"✅ Informações do webhook: {result}")
@@ -174,25 +179,9 @@ async def test_telegram_webhook():
         logger.info(f"📋 Dados de teste: {test_data}")
         print(f"📋 Dados de teste: {test_data}")
         
-        # Simula o processamento do webhook
-        from backend.controllers.telegram_webhook import telegram_webhook
-        from fastapi import Request
-        import json
-        
-        # Cria um request simulado
-        class MockRequest:
-            def __init__(self, data):
-                self.data = data
-                self.headers = {"content-type": "application/json"}
-            
-            async def json(self):
-                return self.data
-            
-            async def body(self):
-                return json.dumps(self.data).encode('utf-8')
-        
-        mock_request = MockRequest(test_data)
-        result = await telegram_webhook(mock_request)
+        # Processa o update simulado diretamente (sem passar pela fila), para devolver o resultado
+        from backend.controllers.telegram_webhook import processar_update
+        result = await run_in_threadpool(processar_update, test_data)
         
         logger.info(f"✅ Teste do webhook concluído: {result}")
         print(f"✅ Teste do webhook concluído: {result}")
@@ -235,7 +224,8 @@ async def send_test_message():
                 'text': test_message
             }
             
-            response = requests.post(f'{TELEGRAM_API_URL}/sendMessage', data=payload, timeout=10)
+            # Passa pela fila de saída (limite de envio) e aguarda a resposta sem bloquear o event loop
+            response = await asyncio.wrap_future(fila_envio.enviar(payload, PRIORIDADE_INFORMATIVA))
             
             if response.ok:
                 result = response.json()
@@ -286,8 +276,8 @@ async def force_webhook_setup():
         logger.info("🗑️ Removendo webhook atual...")
         print("🗑️ Removendo webhook atual...")
         
-        delete_response = requests.post(f'{TELEGRAM_API_URL}/deleteWebhook', timeout=30)
-        if delete_response.ok:
+        delete_response = await telegram.chamar_async('deleteWebhook', timeout=30)
+        if delete_response.is_success:
             logger.info("✅ Webhook atual removido")
             print("✅ Webhook atual removido")
         else:
@@ -295,8 +285,7 @@ async def force_webhook_setup():
             print(f"⚠️ Erro ao remover webhook: {delete_response.status_code}")
         
         # Aguarda um pouco
-        import time
-        time.sleep(2)
+        await asyncio.sleep(2)
         
         # Configura o novo webhook
         payload = {
@@ -308,19 +297,19 @@ async def force_webhook_setup():
         logger.info(f"📤 Configurando novo webhook: {payload}")
         print(f"📤 Configurando novo webhook: {payload}")
         
-        response = requests.post(f'{TELEGRAM_API_URL}/setWebhook', json=payload, timeout=30)
+        response = await telegram.chamar_async('setWebhook', json=payload, timeout=30)
         
         logger.info(f"📥 Resposta do Telegram: {response.status_code} - {response.text}")
         print(f"📥 Resposta do Telegram: {response.status_code} - {response.text}")
         
-        if response.ok:
+        if response.is_success:
             result = response.json()
             logger.info(f"✅ Webhook configurado com sucesso: {result}")
             print(f"✅ Webhook configurado com sucesso: {result}")
             
             # Verifica se foi configurado corretamente
-            verify_response = requests.get(f'{TELEGRAM_API_URL}/getWebhookInfo', timeout=30)
-            if verify_response.ok:
+            verify_response = await telegram.chamar_async('getWebhookInfo', timeout=30, verbo='GET')
+            if verify_response.is_success:
                 verify_result = verify_response.json()
                 current_url = verify_result.get('result', {}).get('url')
                 is_correct = current_url == webhook_url
@@ -359,4 +348,44 @@ async def force_webhook_setup():
             "success": False,
             "message": f"Erro ao forçar configuração do webhook: {str(e)}",
             "traceback": traceback.format_exc()
-        } 
\ No newline at end of file
+        }
+
+# Estado do disjuntor da API do Telegram (não chama a API)
+@api_router.get('/telegram-disjuntor')
+def telegram_circuit_breaker():
+    return telegram.disjuntor.estatisticas()
+
+# Rotas da tabela de falhas (dead-letter) do outbox do Telegram
+@api_router.get('/telegram-saida-falhas')
+async def list_telegram_failures(limite: int = 100):
+    """Lista as mensagens que esgotaram as tentativas de envio ao Telegram (mais recentes primeiro)"""
+    try:
+        falhas = await run_in_threadpool(saida_telegram.listar_falhas, limite)
+        return {"falhas": falhas, "total": len(falhas)}
+    except Exception as e:
+        logger.error(f"Erro ao listar falhas do outbox: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+@api_router.post('/telegram-saida-falhas/reenviar')
+async def replay_telegram_failures(request: Request):
+    """Devolve ao outbox as mensagens da tabela de falhas: todas, ou as de {"ids": [...]}"""
+    try:
+        body = await request.body()
+        ids = (await request.json()).get('ids') if body else None
+        reenviadas = await run_in_threadpool(saida_telegram.reenviar_falhas, ids)
+        return {"success": True, "reenviadas": reenviadas}
+    except Exception as e:
+        logger.error(f"Erro ao reenviar falhas do outbox: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+@api_router.post('/telegram-saida-falhas/{falha_id}/reenviar')
+async def replay_telegram_failure(falha_id: int):
+    """Devolve ao outbox uma mensagem da tabela de falhas"""
+    try:
+        reenviadas = await run_in_threadpool(saida_telegram.reenviar_falhas, [falha_id])
+    except Exception as e:
+        logger.error(f"Erro ao reenviar a falha {falha_id} do outbox: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    if not reenviadas:
+        raise HTTPException(status_code=404, detail="Falha não encontrada")
+    return {"success": True, "reenviadas": reenviadas}
@@ -0,0 +1,210 @@
+# compressao.py - Compressão gzip/brotli das respostas, com cache das versões já comprimidas
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele, só gzip é oferecido
+    brotli = None
+
+# Respostas menores que isso (bytes) não compensam a compressão
+TAMANHO_MINIMO_COMPRESSAO = 1024
+
+# Limites do cache de corpos comprimidos
+MAXIMO_ITENS_CACHE = 64
+MAXIMO_BYTES_CACHE = 32 * 1024 * 1024
+
+_TIPOS_COMPRIMIVEIS = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+def escolher_codificacao(accept_encoding: str):
+    """Escolhe br ou gzip a partir do Accept-Encoding do cliente (None se nenhum for aceito)"""
+    aceitas = set()
+    for parte in accept_encoding.lower().split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        if parametros.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        aceitas.add(nome.strip())
+    if brotli is not None and ('br' in aceitas or '*' in aceitas):
+        return 'br'
+    if 'gzip' in aceitas or '*' in aceitas:
+        return 'gzip'
+    return None
+
+def comprimir(corpo: bytes, codificacao: str) -> bytes:
+    if codificacao == 'br':
+        return brotli.compress(corpo, quality=5)
+    return gzip.compress(corpo, compresslevel=6)
+
+class _CompressorIncremental:
+    """Compressão em streaming: cada bloco é comprimido e liberado imediatamente (flush)"""
+
+    def __init__(self, codificacao: str):
+        self.codificacao = codificacao
+        if codificacao == 'br':
+            self._compressor = brotli.Compressor(quality=5)
+        else:
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def comprimir(self, bloco: bytes) -> bytes:
+        if self.codificacao == 'br':
+            return self._compressor.process(bloco) + self._compressor.flush()
+        return self._compressor.compress(bloco) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self) -> bytes:
+        if self.codificacao == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+class CacheCompressao:
+    """LRU de corpos comprimidos, indexado por (caminho com a query string, ETag, codificação)
+
+    Usado só para respostas com ETag (frontend, snapshots de /alertas): enquanto o ETag da URL
+    não muda, cada poll reaproveita os mesmos bytes comprimidos, sem ler o corpo para montar a chave.
+    """
+
+    def __init__(self, maximo_itens: int = MAXIMO_ITENS_CACHE, maximo_bytes: int = MAXIMO_BYTES_CACHE):
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self.maximo_itens = maximo_itens
+        self.maximo_bytes = maximo_bytes
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, alvo: bytes, etag: bytes, corpo: bytes, codificacao: str) -> bytes:
+        chave = (alvo, etag, codificacao)
+        with self._lock:
+            comprimido = self._itens.get(chave)
+            if comprimido is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return comprimido
+            self.falhas += 1
+
+        comprimido = comprimir(corpo, codificacao)
+        if len(comprimido) > self.maximo_bytes:
+            return comprimido
+        with self._lock:
+            if chave not in self._itens:
+                self._itens[chave] = comprimido
+                self._bytes += len(comprimido)
+                while len(self._itens) > self.maximo_itens or self._bytes > self.maximo_bytes:
+                    _, removido = self._itens.popitem(last=False)
+                    self._bytes -= len(removido)
+        return comprimido
+
+    def estatisticas(self):
+        with self._lock:
+            return {'itens': len(self._itens), 'bytes': self._bytes, 'acertos': self.acertos, 'falhas': self.falhas}
+
+# Instância global do cache
+cache_compressao = CacheCompressao()
+
+class CompressaoMiddleware:
+    """Middleware ASGI que comprime (br/gzip) as respostas de texto/JSON acima de TAMANHO_MINIMO_COMPRESSAO
+
+    Respostas inteiras com ETag passam pelo cache_compressao; respostas em streaming são comprimidas
+    bloco a bloco. O stream de eventos (text/event-stream) nunca é comprimido.
+    """
+
+    def __init__(self, app, tamanho_minimo: int = TAMANHO_MINIMO_COMPRESSAO):
+        self.app = app
+        self.tamanho_minimo = tamanho_minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ''
+        for nome, valor in scope['headers']:
+            if nome == b'accept-encoding':
+                accept_encoding = valor.decode('latin-1')
+                break
+        codificacao = escolher_codificacao(accept_encoding) if accept_encoding else None
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+        alvo = scope.get('raw_path') or scope['path'].encode('utf-8')
+        if scope.get('query_string'):
+            alvo += b'?' + scope['query_string']
+        await _RespostaComprimida(codificacao, self.tamanho_minimo, send, alvo).executar(self.app, scope, receive)
+
+class _RespostaComprimida:
+    """Intercepta as mensagens ASGI de uma resposta e decide, no primeiro bloco do corpo, se comprime"""
+
+    def __init__(self, codificacao: str, tamanho_minimo: int, send, alvo: bytes):
+        self.codificacao = codificacao
+        self.alvo = alvo
+        self.tamanho_minimo = tamanho_minimo
+        self.send = send
+        self.inicio = None
+        self.compressor = None
+        self.repassar = False
+
+    async def executar(self, app, scope, receive):
+        await app(scope, receive, self.enviar)
+
+    def _comprimivel(self, cabecalhos: dict):
+        tipo = cabecalhos.get(b'content-type', b'').decode('latin-1')
+        return (
+            self.inicio['status'] == 200
+            and b'content-encoding' not in cabecalhos
+            and tipo.startswith(_TIPOS_COMPRIMIVEIS)
+        )
+
+    def _cabecalhos_comprimidos(self, tamanho=None):
+        cabecalhos = [
+            (nome, valor) for nome, valor in self.inicio['headers']
+            if nome.lower() not in (b'content-length', b'etag')
+        ]
+        for nome, valor in self.inicio['headers']:
+            if nome.lower() == b'etag':
+                # A representação comprimida não é idêntica byte a byte: o ETag passa a ser fraco
+                etag = valor if valor.startswith(b'W/') else b'W/' + valor
+                cabecalhos.append((b'etag', etag))
+        cabecalhos.append((b'content-encoding', self.codificacao.encode('latin-1')))
+        cabecalhos.append((b'vary', b'Accept-Encoding'))
+        if tamanho is not None:
+            cabecalhos.append((b'content-length', str(tamanho).encode('latin-1')))
+        return cabecalhos
+
+    async def enviar(self, mensagem):
+        if mensagem['type'] == 'http.response.start':
+            self.inicio = mensagem
+            return
+        if mensagem['type'] != 'http.response.body' or self.repassar:
+            await self.send(mensagem)
+            return
+
+        if self.compressor is not None:
+            corpo = self.compressor.comprimir(mensagem.get('body', b''))
+            if not mensagem.get('more_body', False):
+                corpo += self.compressor.finalizar()
+            await self.send({'type': 'http.response.body', 'body': corpo, 'more_body': mensagem.get('more_body', False)})
+            return
+
+        # Primeiro bloco do corpo: decide se comprime
+        cabecalhos = {nome.lower(): valor for nome, valor in self.inicio['headers']}
+        corpo = mensagem.get('body', b'')
+        mais = mensagem.get('more_body', False)
+
+        if not self._comprimivel(cabecalhos) or (not mais and len(corpo) < self.tamanho_minimo):
+            self.repassar = True
+            await self.send(self.inicio)
+            await self.send(mensagem)
+            return
+
+        if not mais:
+            if b'etag' in cabecalhos:
+                comprimido = cache_compressao.obter(self.alvo, cabecalhos[b'etag'], corpo, self.codificacao)
+            else:
+                comprimido = comprimir(corpo, self.codificacao)
+            await self.send({**self.inicio, 'headers': self._cabecalhos_comprimidos(len(comprimido))})
+            await self.send({'type': 'http.response.body', 'body': comprimido, 'more_body': False})
+            return
+
+        self.compressor = _CompressorIncremental(self.codificacao)
+        await self.send({**self.inicio, 'headers': self._cabecalhos_comprimidos()})
+        await self.send({'type': 'http.response.body', 'body': self.compressor.comprimir(corpo), 'more_body': True})
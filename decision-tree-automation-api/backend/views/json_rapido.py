@@ -0,0 +1,67 @@
+# json_rapido.py - Respostas JSON rápidas (orjson) e em streaming para as listas grandes
+import json
+from collections.abc import Iterator
+from datetime import date, datetime
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem ele, usa o json da biblioteca padrão
+    orjson = None
+
+# Tamanho (bytes) dos blocos enviados pelas respostas em streaming
+TAMANHO_BLOCO_STREAM = 64 * 1024
+
+def _padrao_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f'Tipo não serializável em JSON: {type(valor).__name__}')
+
+def serializar_json(conteudo) -> bytes:
+    """Serializa em JSON (UTF-8), com datas em ISO 8601 sem passar pelo jsonable_encoder"""
+    if orjson is not None:
+        return orjson.dumps(conteudo, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(conteudo, ensure_ascii=False, separators=(',', ':'), default=_padrao_json).encode('utf-8')
+
+class RespostaJSONRapida(JSONResponse):
+    """JSONResponse serializada com orjson
+
+    Deve ser retornada diretamente pela rota (return RespostaJSONRapida(...)): se a rota retornar
+    um dict, o FastAPI aplica o jsonable_encoder antes, que é justamente o custo evitado aqui.
+    """
+
+    def render(self, content) -> bytes:
+        return serializar_json(content)
+
+def gerar_json_objeto(campos: dict):
+    """Gera um objeto JSON em blocos de bytes
+
+    Valores que são listas ou iteradores viram arrays serializados item a item (um gerador nunca é
+    materializado); os demais valores são serializados inteiros.
+    """
+    bloco = bytearray(b'{')
+    for posicao, (chave, valor) in enumerate(campos.items()):
+        if posicao:
+            bloco += b','
+        bloco += serializar_json(chave) + b':'
+        if isinstance(valor, (list, tuple, Iterator)):
+            bloco += b'['
+            for indice, item in enumerate(valor):
+                if indice:
+                    bloco += b','
+                bloco += serializar_json(item)
+                if len(bloco) >= TAMANHO_BLOCO_STREAM:
+                    yield bytes(bloco)
+                    bloco.clear()
+            bloco += b']'
+        else:
+            bloco += serializar_json(valor)
+    bloco += b'}'
+    yield bytes(bloco)
+
+class RespostaJSONStream(StreamingResponse):
+    """Objeto JSON enviado em streaming (ver gerar_json_objeto), sem montar o documento inteiro em memória"""
+
+    def __init__(self, campos: dict, status_code: int = 200, headers: dict = None):
+        super().__init__(gerar_json_objeto(campos), status_code=status_code, headers=headers,
+                         media_type='application/json')
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark da busca textual (GET /alertas/busca)
+Cria um banco SQLite temporário com N alertas sintéticos (índice FTS5 mantido pelos triggers) e mede
+o tempo de buscar_alertas() para termos raros, comuns, com várias palavras e por prefixo.
+
+Uso: python benchmark_busca.py [quantidade]   (padrão: 1.000.000 alertas)
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Adiciona o diretório do backend ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from backend.models.alerta_model import Alerta, Base
+from backend.models import alerta_busca_model  # Registra o índice FTS5 na criação da tabela
+from backend.services.alerta_busca import buscar_alertas
+
+QUANTIDADE_PADRAO = 1_000_000
+TAMANHO_LOTE = 20_000
+REPETICOES = 20
+
+PROBLEMAS = (
+    'Vazamento de óleo no motor', 'Pneu furado', 'Motor superaquecendo', 'Quebra da esteira',
+    'Falha elétrica no painel', 'Mangueira hidráulica rompida', 'Aguardando peça'
+)
+EQUIPAMENTOS = ('Colheitadeira JD9870', 'Trator MF7180', 'Caminhão Scania', 'Pulverizador', 'Plantadeira')
+JUSTIFICATIVAS = ('', 'Mangueira rompida', 'Sem peça em estoque', 'Operador ausente')
+BUSCAS = ('12345', 'esteira', 'mangueira', 'vazamento de óleo', 'Colheitadeira JD9870', 'colh')
+
+def popular(engine, quantidade: int):
+    random.seed(1)
+    with engine.begin() as conexao:
+        for inicio in range(0, quantidade, TAMANHO_LOTE):
+            conexao.execute(insert(Alerta.__table__), [
+                {
+                    'chat_id': '6435800936', 'problema': f'{random.choice(PROBLEMAS)} {i}',
+                    'equipamento': random.choice(EQUIPAMENTOS), 'operacao': 'Colheita',
+                    'justificativa': random.choice(JUSTIFICATIVAS)
+                }
+                for i in range(inicio, min(inicio + TAMANHO_LOTE, quantidade))
+            ])
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else QUANTIDADE_PADRAO
+    with tempfile.TemporaryDirectory() as diretorio:
+        engine = create_engine(f"sqlite:///{os.path.join(diretorio, 'busca.db')}")
+        Base.metadata.create_all(bind=engine)
+
+        inicio = time.perf_counter()
+        popular(engine, quantidade)
+        print(f"📥 {quantidade} alertas inseridos (com indexação) em {time.perf_counter() - inicio:.1f} s")
+
+        db = sessionmaker(bind=engine)()
+        for texto in BUSCAS:
+            buscar_alertas(db, texto, 20)
+            inicio = time.perf_counter()
+            for _ in range(REPETICOES):
+                linhas, _, proxima = buscar_alertas(db, texto, 20)
+            tempo = (time.perf_counter() - inicio) * 1000 / REPETICOES
+            print(f"   {texto!r:<26} {tempo:7.2f} ms   {len(linhas)} resultados{' (+ mais páginas)' if proxima else ''}")
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
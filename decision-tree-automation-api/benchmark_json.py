@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark da serialização de GET /alertas
+Compara o caminho padrão do FastAPI (jsonable_encoder + json.dumps) com a resposta orjson
+(RespostaJSONRapida) e com a resposta em streaming (RespostaJSONStream), para 1k/10k/100k alertas.
+
+Uso: python benchmark_json.py [quantidade ...]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Adiciona o diretório do backend ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from backend.models.alerta_model import CATEGORIAS
+from backend.services.alerta_serializacao import serializar_linha, projetar_categoria
+from backend.views import json_rapido
+from backend.views.json_rapido import RespostaJSONRapida, gerar_json_objeto
+
+QUANTIDADES_PADRAO = (1_000, 10_000, 100_000)
+REPETICOES = 3
+
+def gerar_linhas(quantidade: int):
+    """Linhas serializadas (como as do estado em memória) distribuídas entre as categorias"""
+    base = datetime(2025, 7, 29, 8, 0, 0)
+    linhas = {categoria: [] for categoria in CATEGORIAS}
+    for i in range(quantidade):
+        criado_em = base + timedelta(seconds=i)
+        linha = (
+            i + 1, '6435800936', f'Problema {i} - equipamento parado aguardando manutenção', criado_em,
+            '10:30', criado_em + timedelta(hours=2), criado_em + timedelta(minutes=5), 'Rafael Cabral',
+            'não operando', None, None, f'COD{i}', 'Unidade Norte', f'Frente {i % 7}', 'Colhedora',
+            f'EQ{i % 50}', 'Mecanizada', 'Colheita', 'Operador Teste', criado_em, '00:15', 'Mecânica',
+            'Justificativa de teste'
+        )
+        linhas[CATEGORIAS[i % len(CATEGORIAS)]].append(serializar_linha(linha))
+    return linhas
+
+def _conteudo(linhas: dict):
+    return {
+        **{categoria: [projetar_categoria(linha, categoria) for linha in lista] for categoria, lista in linhas.items()},
+        'cursores': {categoria: None for categoria in CATEGORIAS},
+        'versao_mudancas': 0
+    }
+
+def _projetar(lista, categoria):
+    for linha in lista:
+        yield projetar_categoria(linha, categoria)
+
+def caminho_padrao(linhas: dict):
+    """Como antes: dicts montados e depois jsonable_encoder + JSONResponse (json.dumps)"""
+    return len(JSONResponse(jsonable_encoder(_conteudo(linhas))).body)
+
+def caminho_orjson(linhas: dict):
+    return len(RespostaJSONRapida(_conteudo(linhas)).body)
+
+def caminho_stream(linhas: dict):
+    campos = {
+        **{categoria: _projetar(lista, categoria) for categoria, lista in linhas.items()},
+        'cursores': {categoria: None for categoria in CATEGORIAS},
+        'versao_mudancas': 0
+    }
+    return sum(len(bloco) for bloco in gerar_json_objeto(campos))
+
+CAMINHOS = (
+    ('padrão (jsonable_encoder + json)', caminho_padrao),
+    ('orjson (RespostaJSONRapida)', caminho_orjson),
+    ('streaming (RespostaJSONStream)', caminho_stream),
+)
+
+def medir(funcao, linhas: dict):
+    """Retorna (melhor tempo em ms, pico de memória em MB, bytes gerados)"""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        tamanho = funcao(linhas)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    funcao(linhas)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tempos), pico / (1024 * 1024), tamanho
+
+def main():
+    quantidades = [int(valor) for valor in sys.argv[1:]] or QUANTIDADES_PADRAO
+    if json_rapido.orjson is None:
+        print("⚠️  orjson não instalado: RespostaJSONRapida usa o json da biblioteca padrão")
+
+    for quantidade in quantidades:
+        linhas = gerar_linhas(quantidade)
+        print(f"\n📊 {quantidade} alertas")
+        for nome, funcao in CAMINHOS:
+            tempo, pico, tamanho = medir(funcao, linhas)
+            print(f"   {nome:<34} {tempo:9.1f} ms   pico {pico:8.1f} MB   {tamanho / (1024 * 1024):7.1f} MB de JSON")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Servidor falso da API de bots do Telegram, para testes de integração e de carga sem rede
+Implementa sendMessage, setWebhook, getWebhookInfo, getMe, deleteWebhook e getUpdates (em /bot<token>/<método>,
+como a API real), com latência, taxa de erros 5xx e de respostas 429 configuráveis, e envia updates sintéticos
+de volta ao webhook da aplicação. Com --responder, responde sozinho (reply) a cada pergunta de alerta recebida,
+fechando o ciclo alerta → pergunta → resposta → webhook → banco → confirmação.
+
+Uso:
+    python fake_telegram.py [--porta 8081] [--latencia 50] [--variacao 20] [--taxa-erro 0.01] [--taxa-429 0.05]
+                            [--retry-after 1] [--limite-por-chat 1] [--responder 15:30] [--atraso-resposta 500]
+
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 RENDER_EXTERNAL_URL=http://127.0.0.1:8000 \\
+        uvicorn backend.main:app --port 8000
+
+    A aplicação registra o webhook ao iniciar (setWebhook). Rotas de controle do servidor falso:
+    POST /_fake/updates      {"texto": "15:30", "reply_to_message_id": 101}  → envia um update ao webhook
+    POST /_fake/carga        {"quantidade": 500, "por_segundo": 50, "texto": "15:30"}  → carga no webhook
+    GET  /_fake/mensagens    mensagens enviadas pela aplicação (?chat_id=&limite=)
+    GET  /_fake/estatisticas chamadas por método, erros injetados e latência do ciclo webhook → confirmação
+    POST /_fake/config       altera a configuração em execução (mesmos nomes dos parâmetros, com _)
+    POST /_fake/reiniciar    limpa mensagens, updates e estatísticas
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import time
+import urllib.parse
+from collections import Counter, deque
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Líder autorizado pelo webhook da aplicação (remetente padrão dos updates sintéticos)
+LIDER_ID = 6435800936
+LIDER_NOME = ('Rafael', 'Cabral')
+
+# Mensagens enviadas e latências guardadas para consulta (as mais recentes)
+MAXIMO_MENSAGENS = 10_000
+AMOSTRAS_LATENCIA = 10_000
+
+# Tempo máximo (segundos) de espera do webhook da aplicação
+TIMEOUT_WEBHOOK = 10
+
+# Texto das perguntas de alertas enviadas pela aplicação (individual ou resumo com N linhas)
+_PERGUNTA = re.compile(r'Qual o prazo para resolução')
+_LINHAS_RESUMO = re.compile(r'(\d+) novos alertas')
+
+app = FastAPI(title="Telegram Bot API (falso)")
+
+class EstadoFalso:
+    """Configuração e estado em memória do servidor falso"""
+
+    def __init__(self):
+        self.latencia_ms = 0.0
+        self.variacao_ms = 0.0
+        self.taxa_erro = 0.0
+        self.taxa_429 = 0.0
+        self.retry_after = 1
+        self.limite_por_chat = 0.0
+        self.responder = None
+        self.atraso_resposta_ms = 0.0
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.webhook_url = None
+        self.webhook_segredo = None
+        self.ultimo_erro_webhook = None
+        self.ultimo_erro_em = None
+        self.ids_update = itertools.count(1)
+        self.ids_mensagem = itertools.count(101)
+        self.mensagens = deque(maxlen=MAXIMO_MENSAGENS)
+        self.updates_pendentes = []
+        self.novo_update = asyncio.Event()
+        self.ultimo_envio_chat = {}
+        self.chamadas = Counter()
+        self.erros_injetados = 0
+        self.limitados_injetados = 0
+        self.updates_entregues = 0
+        self.updates_falhos = 0
+        self.respostas_automaticas = 0
+        # chat_id -> instantes em que um update foi entregue e ainda não teve confirmação
+        self.aguardando_confirmacao = {}
+        self.latencias_ciclo = deque(maxlen=AMOSTRAS_LATENCIA)
+        self.latencias_webhook = deque(maxlen=AMOSTRAS_LATENCIA)
+
+estado = EstadoFalso()
+_cliente = None
+
+def _cliente_http():
+    global _cliente
+    if _cliente is None:
+        _cliente = httpx.AsyncClient(timeout=TIMEOUT_WEBHOOK)
+    return _cliente
+
+def _resposta(resultado, status: int = 200, **extra):
+    if status == 200:
+        return JSONResponse({'ok': True, 'result': resultado, **extra})
+    return JSONResponse({'ok': False, 'error_code': status, 'description': resultado, **extra}, status_code=status)
+
+def _resumo_ms(amostras):
+    valores = sorted(amostras)
+    if not valores:
+        return {'amostras': 0}
+    return {
+        'amostras': len(valores),
+        'media_ms': round(sum(valores) / len(valores) * 1000, 1),
+        'p50_ms': round(valores[len(valores) // 2] * 1000, 1),
+        'p95_ms': round(valores[int(len(valores) * 0.95)] * 1000, 1),
+        'maxima_ms': round(valores[-1] * 1000, 1)
+    }
+
+def _id_chat(valor):
+    """chat_id como a API devolve: número se for numérico"""
+    texto = str(valor)
+    return int(texto) if texto.lstrip('-').isdigit() else texto
+
+async def _parametros(request: Request) -> dict:
+    """Parâmetros do método: query string, JSON ou formulário urlencoded (como a API real aceita)"""
+    parametros = dict(request.query_params)
+    corpo = await request.body()
+    if not corpo:
+        return parametros
+    if 'application/json' in request.headers.get('content-type', ''):
+        parametros.update(json.loads(corpo))
+    else:
+        parametros.update(urllib.parse.parse_qsl(corpo.decode('utf-8')))
+    return parametros
+
+# Updates sintéticos
+
+def montar_update(texto: str, chat_id=LIDER_ID, reply_to_message_id: int = None,
+                  first_name: str = LIDER_NOME[0], last_name: str = LIDER_NOME[1]) -> dict:
+    mensagem = {
+        'message_id': next(estado.ids_mensagem),
+        'from': {'id': _id_chat(chat_id), 'is_bot': False, 'first_name': first_name, 'last_name': last_name},
+        'chat': {'id': _id_chat(chat_id), 'type': 'private', 'first_name': first_name, 'last_name': last_name},
+        'date': int(time.time()),
+        'text': texto
+    }
+    if reply_to_message_id is not None:
+        mensagem['reply_to_message'] = {'message_id': int(reply_to_message_id), 'chat': mensagem['chat']}
+    return {'update_id': next(estado.ids_update), 'message': mensagem}
+
+async def entregar(update: dict) -> bool:
+    """Envia o update ao webhook registrado (ou o guarda para getUpdates); True se a aplicação aceitou"""
+    if not estado.webhook_url:
+        estado.updates_pendentes.append(update)
+        estado.novo_update.set()
+        return True
+    chat_id = update['message']['chat']['id']
+    cabecalhos = {'X-Telegram-Bot-Api-Secret-Token': estado.webhook_segredo} if estado.webhook_segredo else {}
+    inicio = time.monotonic()
+    estado.aguardando_confirmacao.setdefault(chat_id, deque()).append(inicio)
+    try:
+        resposta = await _cliente_http().post(estado.webhook_url, json=update, headers=cabecalhos)
+        aceito = resposta.is_success
+        erro = None if aceito else f'Wrong response from the webhook: {resposta.status_code}'
+    except httpx.HTTPError as e:
+        aceito, erro = False, f'Connection failed: {e}'
+    estado.latencias_webhook.append(time.monotonic() - inicio)
+    if aceito:
+        estado.updates_entregues += 1
+    else:
+        estado.updates_falhos += 1
+        estado.ultimo_erro_webhook, estado.ultimo_erro_em = erro, int(time.time())
+        estado.aguardando_confirmacao[chat_id].remove(inicio)
+    return aceito
+
+async def _responder_pergunta(mensagem: dict):
+    """Modo --responder: o "líder" responde (reply) à pergunta com um horário por linha do resumo"""
+    await asyncio.sleep(estado.atraso_resposta_ms / 1000)
+    linhas = _LINHAS_RESUMO.search(mensagem['text'])
+    texto = ' '.join([estado.responder] * (int(linhas.group(1)) if linhas else 1))
+    estado.respostas_automaticas += 1
+    await entregar(montar_update(texto, mensagem['chat']['id'], mensagem['message_id']))
+
+# Métodos da API
+
+def send_message(parametros: dict):
+    chat_id, texto = parametros.get('chat_id'), parametros.get('text')
+    if chat_id in (None, ''):
+        return _resposta('Bad Request: chat_id is empty', 400)
+    if not texto:
+        return _resposta('Bad Request: message text is empty', 400)
+    chat_id = _id_chat(chat_id)
+    agora = time.monotonic()
+    if random.random() < estado.taxa_429 or (
+        estado.limite_por_chat > 0 and agora - estado.ultimo_envio_chat.get(chat_id, -1e9) < 1 / estado.limite_por_chat
+    ):
+        estado.limitados_injetados += 1
+        return _resposta(f'Too Many Requests: retry after {estado.retry_after}', 429,
+                         parameters={'retry_after': estado.retry_after})
+    estado.ultimo_envio_chat[chat_id] = agora
+    mensagem = {
+        'message_id': next(estado.ids_mensagem),
+        'from': {'id': 1, 'is_bot': True, 'first_name': 'Bot Falso', 'username': 'bot_falso_bot'},
+        'chat': {'id': chat_id, 'type': 'private'},
+        'date': int(time.time()),
+        'text': texto
+    }
+    if parametros.get('reply_to_message_id'):
+        mensagem['reply_to_message'] = {'message_id': int(parametros['reply_to_message_id'])}
+    estado.mensagens.append(mensagem)
+
+    if _PERGUNTA.search(texto):
+        if estado.responder:
+            asyncio.get_running_loop().create_task(_responder_pergunta(mensagem))
+    else:
+        # Primeira resposta ao chat após um update entregue: fim do ciclo webhook → banco → confirmação
+        pendentes = estado.aguardando_confirmacao.get(chat_id)
+        if pendentes:
+            estado.latencias_ciclo.append(agora - pendentes.popleft())
+    return _resposta(mensagem)
+
+def set_webhook(parametros: dict):
+    estado.webhook_url = parametros.get('url') or None
+    estado.webhook_segredo = parametros.get('secret_token') or None
+    if str(parametros.get('drop_pending_updates')).lower() == 'true':
+        estado.updates_pendentes.clear()
+    return _resposta(True, description='Webhook was set' if estado.webhook_url else 'Webhook was deleted')
+
+def delete_webhook(parametros: dict):
+    estado.webhook_url = None
+    estado.webhook_segredo = None
+    if str(parametros.get('drop_pending_updates')).lower() == 'true':
+        estado.updates_pendentes.clear()
+    return _resposta(True, description='Webhook was deleted')
+
+def get_webhook_info(parametros: dict):
+    info = {
+        'url': estado.webhook_url or '',
+        'has_custom_certificate': False,
+        'pending_update_count': len(estado.updates_pendentes)
+    }
+    if estado.ultimo_erro_webhook:
+        info['last_error_date'] = estado.ultimo_erro_em
+        info['last_error_message'] = estado.ultimo_erro_webhook
+    return _resposta(info)
+
+def get_me(parametros: dict):
+    return _resposta({'id': 1, 'is_bot': True, 'first_name': 'Bot Falso', 'username': 'bot_falso_bot',
+                      'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False})
+
+async def get_updates(parametros: dict):
+    if estado.webhook_url:
+        return _resposta("Conflict: can't use getUpdates method while webhook is active; "
+                         "use deleteWebhook to delete the webhook first", 409)
+    offset = int(parametros.get('offset') or 0)
+    if offset:
+        estado.updates_pendentes = [u for u in estado.updates_pendentes if u['update_id'] >= offset]
+    if not estado.updates_pendentes and float(parametros.get('timeout') or 0) > 0:
+        # Long polling: espera um update novo até o timeout
+        estado.novo_update.clear()
+        try:
+            await asyncio.wait_for(estado.novo_update.wait(), float(parametros['timeout']))
+        except asyncio.TimeoutError:
+            pass
+    limite = int(parametros.get('limit') or 100)
+    return _resposta(estado.updates_pendentes[:limite])
+
+METODOS = {
+    'sendMessage': send_message,
+    'setWebhook': set_webhook,
+    'deleteWebhook': delete_webhook,
+    'getWebhookInfo': get_webhook_info,
+    'getMe': get_me,
+    'getUpdates': get_updates
+}
+
+@app.api_route('/bot{token}/{metodo}', methods=['GET', 'POST'])
+async def chamar_metodo(token: str, metodo: str, request: Request):
+    parametros = await _parametros(request)
+    estado.chamadas[metodo] += 1
+    if estado.latencia_ms or estado.variacao_ms:
+        atraso = estado.latencia_ms + random.uniform(-estado.variacao_ms, estado.variacao_ms)
+        await asyncio.sleep(max(atraso, 0) / 1000)
+    funcao = METODOS.get(metodo)
+    if funcao is None:
+        return _resposta('Not Found: method not found', 404)
+    if random.random() < estado.taxa_erro:
+        estado.erros_injetados += 1
+        return _resposta('Internal Server Error', 500)
+    resultado = funcao(parametros)
+    return await resultado if asyncio.iscoroutine(resultado) else resultado
+
+# Rotas de controle
+
+@app.post('/_fake/updates')
+async def enviar_update(request: Request):
+    dados = await request.json()
+    update = montar_update(
+        dados.get('texto', '15:30'), dados.get('chat_id', LIDER_ID), dados.get('reply_to_message_id'),
+        dados.get('first_name', LIDER_NOME[0]), dados.get('last_name', LIDER_NOME[1])
+    )
+    aceito = await entregar(update)
+    return {'aceito': aceito, 'update': update}
+
+@app.post('/_fake/carga')
+async def gerar_carga(request: Request):
+    """Envia quantidade updates ao webhook, por_segundo por segundo (0 = todos de uma vez), e mede o ack"""
+    dados = await request.json()
+    quantidade = int(dados.get('quantidade', 100))
+    por_segundo = float(dados.get('por_segundo', 0))
+    texto = dados.get('texto', '15:30')
+    chat_id = dados.get('chat_id', LIDER_ID)
+    inicio = time.monotonic()
+    tarefas = []
+    for numero in range(quantidade):
+        if por_segundo > 0:
+            espera = inicio + numero / por_segundo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+        tarefas.append(asyncio.create_task(entregar(montar_update(texto, chat_id))))
+    aceitos = await asyncio.gather(*tarefas)
+    duracao = time.monotonic() - inicio
+    return {
+        'enviados': quantidade,
+        'aceitos': sum(aceitos),
+        'duracao_s': round(duracao, 3),
+        'updates_por_segundo': round(quantidade / duracao, 1) if duracao else None,
+        'ack_webhook': _resumo_ms(list(estado.latencias_webhook)[-quantidade:])
+    }
+
+@app.get('/_fake/mensagens')
+def listar_mensagens(chat_id: str = None, limite: int = 100):
+    mensagens = [m for m in estado.mensagens if chat_id is None or str(m['chat']['id']) == chat_id]
+    return {'mensagens': mensagens[-limite:], 'total': len(mensagens)}
+
+@app.get('/_fake/estatisticas')
+def estatisticas():
+    return {
+        'webhook_url': estado.webhook_url,
+        'chamadas': dict(estado.chamadas),
+        'mensagens_recebidas': len(estado.mensagens),
+        'erros_injetados': estado.erros_injetados,
+        'limitados_429': estado.limitados_injetados,
+        'updates_entregues': estado.updates_entregues,
+        'updates_falhos': estado.updates_falhos,
+        'updates_pendentes': len(estado.updates_pendentes),
+        'respostas_automaticas': estado.respostas_automaticas,
+        'ack_webhook': _resumo_ms(estado.latencias_webhook),
+        'ciclo_webhook_confirmacao': _resumo_ms(estado.latencias_ciclo),
+        'config': configuracao()
+    }
+
+def configuracao():
+    return {campo: getattr(estado, campo) for campo in (
+        'latencia_ms', 'variacao_ms', 'taxa_erro', 'taxa_429', 'retry_after', 'limite_por_chat',
+        'responder', 'atraso_resposta_ms'
+    )}
+
+@app.post('/_fake/config')
+async def alterar_configuracao(request: Request):
+    dados = await request.json()
+    for campo, valor in dados.items():
+        if campo not in configuracao():
+            return JSONResponse({'erro': f'Campo desconhecido: {campo}'}, status_code=400)
+        setattr(estado, campo, valor)
+    return configuracao()
+
+@app.post('/_fake/reiniciar')
+def reiniciar():
+    estado.reiniciar()
+    return {'status': 'ok'}
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor falso da API de bots do Telegram')
+    parser.add_argument('--host', default=os.getenv('FAKE_TELEGRAM_HOST', '127.0.0.1'))
+    parser.add_argument('--porta', type=int, default=int(os.getenv('FAKE_TELEGRAM_PORTA', '8081')))
+    parser.add_argument('--latencia', type=float, default=0, help='latência média de cada chamada (ms)')
+    parser.add_argument('--variacao', type=float, default=0, help='variação aleatória da latência, para mais ou menos (ms)')
+    parser.add_argument('--taxa-erro', type=float, default=0, help='fração das chamadas respondidas com 500')
+    parser.add_argument('--taxa-429', type=float, default=0, help='fração dos sendMessage respondidos com 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after (s) das respostas 429')
+    parser.add_argument('--limite-por-chat', type=float, default=0,
+                        help='mensagens/s aceitas por chat antes de responder 429, como o Telegram (0 = sem limite)')
+    parser.add_argument('--responder', default=None, metavar='HH:MM',
+                        help='responde (reply) sozinho a cada pergunta de alerta com este horário')
+    parser.add_argument('--atraso-resposta', type=float, default=0, help='espera antes da resposta automática (ms)')
+    args = parser.parse_args()
+
+    estado.latencia_ms = args.latencia
+    estado.variacao_ms = args.variacao
+    estado.taxa_erro = args.taxa_erro
+    estado.taxa_429 = args.taxa_429
+    estado.retry_after = args.retry_after
+    estado.limite_por_chat = args.limite_por_chat
+    estado.responder = args.responder
+    estado.atraso_resposta_ms = args.atraso_resposta
+
+    print(f"🤖 Telegram falso em http://{args.host}:{args.porta} "
+          f"(use TELEGRAM_API_BASE=http://{args.host}:{args.porta})")
+    uvicorn.run(app, host=args.host, port=args.porta, log_level='warning')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# conftest.py - Ambiente dos testes: banco SQLite isolado e servidor falso do Telegram (fake_telegram.py)
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# Configuração lida pelo backend na importação: o banco (sqlite:///temp_database.db, relativo ao diretório
+# atual) fica num diretório temporário e todas as chamadas à API do Telegram vão para o servidor falso
+PORTA_TELEGRAM = _porta_livre()
+os.environ['TELEGRAM_BOT_TOKEN'] = 'teste'
+os.environ['TELEGRAM_API_BASE'] = f'http://127.0.0.1:{PORTA_TELEGRAM}'
+os.environ['CHAT_IDS'] = ''
+os.chdir(tempfile.mkdtemp(prefix='decision-tree-testes-'))
+
+import uvicorn  # noqa: E402
+import fake_telegram  # noqa: E402
+
+@pytest.fixture(scope='session')
+def servidor_telegram():
+    """Servidor falso do Telegram rodando numa thread durante toda a sessão de testes"""
+    servidor = uvicorn.Server(uvicorn.Config(fake_telegram.app, host='127.0.0.1', port=PORTA_TELEGRAM, log_level='warning'))
+    thread = threading.Thread(target=servidor.run, daemon=True)
+    thread.start()
+    limite = time.monotonic() + 10
+    while not servidor.started:
+        if time.monotonic() > limite:
+            raise RuntimeError('Servidor falso do Telegram não iniciou')
+        time.sleep(0.01)
+    yield fake_telegram.estado
+    servidor.should_exit = True
+    thread.join(timeout=5)
+
+@pytest.fixture
+def telegram_falso(servidor_telegram):
+    """Estado do servidor falso, zerado (mensagens, estatísticas e configuração) para o teste"""
+    estado = servidor_telegram
+    estado.reiniciar()
+    estado.latencia_ms = estado.variacao_ms = 0.0
+    estado.taxa_erro = estado.taxa_429 = 0.0
+    estado.limite_por_chat = 0.0
+    estado.responder = None
+    yield estado
+
+@pytest.fixture(autouse=True)
+def banco():
+    """Recria todas as tabelas e zera o estado em memória dos serviços antes de cada teste"""
+    from backend.models.responses_model import Base as ResponseBase, engine, init_db
+    from backend.models.alerta_model import Base as AlertaBase
+    from backend.models.auto_alert_config_model import Base as AutoAlertConfigBase
+    from backend.models.telegram_update_model import Base as TelegramUpdateBase
+    from backend.services.alerta_estado import alerta_estado
+    from backend.services.telegram_client import Disjuntor, telegram
+
+    for base in (AlertaBase, ResponseBase, AutoAlertConfigBase, TelegramUpdateBase):
+        base.metadata.drop_all(bind=engine, checkfirst=True)
+    init_db()
+
+    alerta_estado.parar()
+    alerta_estado.carregado = False
+    alerta_estado.versao_mudancas = 0
+    telegram.disjuntor = Disjuntor()
+    yield engine
+    alerta_estado.parar()
+
+def esperar(condicao, timeout: float = 5.0, intervalo: float = 0.02):
+    """Espera até a condição ser verdadeira (trabalho feito por threads em segundo plano)"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if condicao():
+            return True
+        time.sleep(intervalo)
+    return condicao()
+
+def criar_alertas(quantidade: int = 1, **campos):
+    """Grava alertas direto no banco (passando pelos hooks de sessão) e retorna os ids, na ordem de criação"""
+    from backend.models.alerta_model import Alerta
+    from backend.models.responses_model import SessionLocal
+
+    db = SessionLocal()
+    try:
+        alertas = []
+        for i in range(quantidade):
+            valores = {'chat_id': '6435800936', 'problema': f'Problema {i}', 'status_operacao': 'não operando'}
+            valores.update(campos)
+            alerta = Alerta(**valores)
+            db.add(alerta)
+            db.flush()
+            alertas.append(alerta.id)
+        db.commit()
+        return alertas
+    finally:
+        db.close()
@@ -0,0 +1,135 @@
+# Registro das previsões do líder (alerta_previsoes): reply, fila de pendentes e reserva concorrente
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from conftest import criar_alertas
+from backend.config import TZ_BR
+from backend.models.alerta_model import Alerta
+from backend.models.responses_model import SessionLocal, engine
+from backend.services.alerta_contadores import resumo_contadores
+from backend.services.alerta_estado import alerta_estado
+from backend.services.alerta_mudancas import listar_mudancas
+from backend.services.alerta_previsoes import registrar_previsoes
+from backend.services.alerta_versao import alerta_versao
+
+CHAT = '6435800936'
+
+def previsoes(*textos):
+    agora = datetime.now(TZ_BR)
+    return [(texto, agora + timedelta(hours=i + 1)) for i, texto in enumerate(textos)]
+
+def registrar(textos, mensagem_respondida=None):
+    db = SessionLocal()
+    try:
+        resultado = registrar_previsoes(db, previsoes(*textos), datetime.now(TZ_BR), 'Rafael Cabral',
+                                        chat_id=CHAT, mensagem_respondida=mensagem_respondida)
+        db.commit()
+        alertas, restantes, resposta_direta, sem_alerta = resultado
+        return [(alerta.id, alerta.previsao) for alerta in alertas], restantes, resposta_direta, sem_alerta
+    finally:
+        db.close()
+
+def previsao_de(alerta_id):
+    db = SessionLocal()
+    try:
+        return db.get(Alerta, alerta_id).previsao
+    finally:
+        db.close()
+
+def test_reply_grava_no_alerta_da_mensagem():
+    antigo, = criar_alertas(mensagem_id=101, mensagem_linha=1)
+    respondido, = criar_alertas(mensagem_id=102, mensagem_linha=1)
+    aplicados, restantes, resposta_direta, sem_alerta = registrar(['17:00'], mensagem_respondida=102)
+    assert aplicados == [(respondido, '17:00')]
+    assert resposta_direta and restantes == 1 and sem_alerta == []
+    assert previsao_de(antigo) is None
+
+def test_segunda_resposta_nao_sobrescreve_a_previsao():
+    respondido, = criar_alertas(mensagem_id=101, mensagem_linha=1)
+    pendente, = criar_alertas(mensagem_id=102, mensagem_linha=1)
+    registrar(['17:00'], mensagem_respondida=101)
+
+    # A mesma pergunta respondida de novo: a previsão vai para o pendente mais antigo
+    aplicados, restantes, resposta_direta, _ = registrar(['18:00'], mensagem_respondida=101)
+    assert previsao_de(respondido) == '17:00'
+    assert aplicados == [(pendente, '18:00')]
+    assert not resposta_direta and restantes == 0
+
+    aplicados, _, _, sem_alerta = registrar(['19:00'], mensagem_respondida=101)
+    assert aplicados == [] and sem_alerta == ['19:00']
+    assert previsao_de(respondido) == '17:00'
+
+def test_resumo_com_linha_ja_respondida():
+    linha1, linha2, linha3 = (criar_alertas(mensagem_id=200, mensagem_linha=linha)[0] for linha in (1, 2, 3))
+    avulso, = criar_alertas()
+    registrar(['10:00', '11:00'], mensagem_respondida=200)
+    assert (previsao_de(linha1), previsao_de(linha2), previsao_de(linha3)) == ('10:00', '11:00', None)
+
+    # Linhas 1 e 2 já têm previsão: as delas vão para a fila, a da linha 3 para a linha 3
+    aplicados, _, _, sem_alerta = registrar(['12:00', '13:00', '14:00'], mensagem_respondida=200)
+    assert aplicados == [(linha3, '14:00'), (avulso, '12:00')]
+    assert sem_alerta == ['13:00']
+    assert (previsao_de(linha1), previsao_de(linha2)) == ('10:00', '11:00')
+
+def test_fila_aplica_em_ordem_e_informa_sobras():
+    ids = criar_alertas(2)
+    aplicados, restantes, resposta_direta, sem_alerta = registrar(['08:00', '09:00', '10:00'])
+    assert aplicados == [(ids[0], '08:00'), (ids[1], '09:00')]
+    assert restantes == 0 and not resposta_direta
+    assert sem_alerta == ['10:00']
+
+def test_hooks_atualizados_sem_segundo_update():
+    ids = criar_alertas(2, unidade='U1')
+    alerta_estado.carregar()
+    versao = alerta_versao.atual()
+    db = SessionLocal()
+    try:
+        journal = listar_mudancas(db, 0)[0]
+    finally:
+        db.close()
+
+    comandos = []
+    def registrar_comando(conn, cursor, statement, parameters, context, executemany):
+        if 'UPDATE alertas SET' in statement:
+            comandos.append(statement)
+    event.listen(engine, 'before_cursor_execute', registrar_comando)
+    try:
+        registrar(['08:00', '09:00'])
+    finally:
+        event.remove(engine, 'before_cursor_execute', registrar_comando)
+
+    assert len(comandos) == 1
+    db = SessionLocal()
+    try:
+        assert resumo_contadores(db)['por_unidade']['U1'] == {'pendentes': 0, 'escaladas': 2, 'atrasadas': 0, 'encerradas': 0}
+        _, alterados, _, _ = listar_mudancas(db, journal)
+        assert sorted(linha[0] for linha in alterados) == ids
+        assert {a.categoria_contada for a in db.query(Alerta)} == {'escaladas'}
+    finally:
+        db.close()
+    assert alerta_versao.atual() == versao + 1
+    assert alerta_estado.contagens()['escaladas'] == 2
+
+def test_respostas_simultaneas_nunca_reservam_o_mesmo_alerta():
+    ids = criar_alertas(5)
+    reservados = []
+    lock = threading.Lock()
+
+    def responder(texto):
+        aplicados, _, _, _ = registrar([texto])
+        with lock:
+            reservados.extend(alerta_id for alerta_id, _ in aplicados)
+
+    threads = [threading.Thread(target=responder, args=(f'1{i}:00',)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(reservados) == ids
+    db = SessionLocal()
+    try:
+        assert resumo_contadores(db)['total']['pendentes'] == 0
+        assert resumo_contadores(db)['total']['escaladas'] == 5
+    finally:
+        db.close()
@@ -0,0 +1,39 @@
+# Categoria do alerta: a expressão SQL (categoria_alerta) e a regra em Python (classificar_alerta) concordam
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from conftest import criar_alertas
+from backend.config import TZ_BR
+from backend.models.alerta_model import Alerta, categoria_alerta, classificar_alerta
+from backend.models.responses_model import SessionLocal
+
+def test_sql_e_python_classificam_igual():
+    agora = datetime.now(TZ_BR).replace(microsecond=0)
+    casos = {
+        'sem previsão': ({'previsao': None}, 'pendentes'),
+        'previsão vazia': ({'previsao': ''}, 'pendentes'),
+        'previsão vazia e operando': ({'previsao': '', 'status_operacao': 'operando'}, 'pendentes'),
+        'operando sem previsão': ({'previsao': None, 'status_operacao': 'operando'}, 'pendentes'),
+        'operando com prazo vencido': ({'previsao': '08:00', 'status_operacao': 'operando',
+                                        'previsao_datetime': agora - timedelta(hours=2)}, 'encerradas'),
+        'previsão sem data': ({'previsao': '15:30', 'previsao_datetime': None}, 'escaladas'),
+        'prazo no futuro': ({'previsao': '15:30', 'previsao_datetime': agora + timedelta(hours=1)}, 'escaladas'),
+        'prazo vencido': ({'previsao': '08:00', 'previsao_datetime': agora - timedelta(hours=1)}, 'atrasadas'),
+        'prazo vencido ontem': ({'previsao': '23:00', 'previsao_datetime': agora - timedelta(days=1)}, 'atrasadas'),
+        'prazo vencido há 1 s': ({'previsao': '08:00', 'previsao_datetime': agora - timedelta(seconds=1)}, 'atrasadas'),
+        'prazo neste instante': ({'previsao': '08:00', 'previsao_datetime': agora}, 'escaladas'),
+    }
+    ids = {nome: criar_alertas(**campos)[0] for nome, (campos, _) in casos.items()}
+
+    db = SessionLocal()
+    try:
+        pelo_sql = dict(db.execute(select(Alerta.id, categoria_alerta(agora))).all())
+        em_python = {
+            alerta.id: classificar_alerta(alerta.previsao, alerta.status_operacao, alerta.previsao_datetime, agora)
+            for alerta in db.query(Alerta)
+        }
+    finally:
+        db.close()
+
+    for nome, (_, esperada) in casos.items():
+        assert (nome, pelo_sql[ids[nome]]) == (nome, esperada)
+        assert (nome, em_python[ids[nome]]) == (nome, esperada)
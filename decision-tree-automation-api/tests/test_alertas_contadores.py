@@ -0,0 +1,77 @@
+# Contadores por categoria/dimensão (alerta_contadores) e GET /alertas/summary
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from conftest import criar_alertas
+from backend.config import TZ_BR
+from backend.main import app
+from backend.models.alerta_model import Alerta
+from backend.models.responses_model import SessionLocal
+from backend.services.alerta_contadores import recalcular_contadores, resumo_contadores
+from backend.services.alerta_mudancas import versao_atual
+
+cliente = TestClient(app)
+
+def resumo():
+    resposta = cliente.get('/alertas/summary')
+    assert resposta.status_code == 200
+    return resposta.json()
+
+def test_contadores_acompanham_criacao_alteracao_e_remocao():
+    futuro = datetime.now(TZ_BR) + timedelta(hours=2)
+    [pendente] = criar_alertas(unidade='U1', frente='F1')
+    criar_alertas(2, unidade='U2', previsao='15:00', previsao_datetime=futuro)
+    dados = resumo()
+    assert dados['total'] == {'pendentes': 1, 'escaladas': 2, 'atrasadas': 0, 'encerradas': 0}
+    assert dados['por_unidade']['U2']['escaladas'] == 2
+    assert dados['por_frente']['não informado']['escaladas'] == 2
+
+    db = SessionLocal()
+    try:
+        alerta = db.get(Alerta, pendente)
+        alerta.previsao, alerta.status_operacao = '10:00', 'operando'
+        db.query(Alerta).filter(Alerta.unidade == 'U2').delete()
+        db.commit()
+    finally:
+        db.close()
+
+    dados = resumo()
+    assert dados['total'] == {'pendentes': 0, 'escaladas': 0, 'atrasadas': 0, 'encerradas': 1}
+    assert dados['por_unidade'] == {'U1': {'pendentes': 0, 'escaladas': 0, 'atrasadas': 0, 'encerradas': 1}}
+
+def test_resumo_conta_vencidas_sem_escrever_no_banco():
+    passado = datetime.now(TZ_BR) - timedelta(minutes=5)
+    [alerta_id] = criar_alertas(unidade='U1', previsao='15:00', previsao_datetime=datetime.now(TZ_BR) + timedelta(hours=1))
+    db = SessionLocal()
+    try:
+        # Prazo vencido ainda não aplicado pela varredura (Core, sem hooks): contado como escaladas no banco
+        db.execute(Alerta.__table__.update().where(Alerta.__table__.c.id == alerta_id).values(previsao_datetime=passado))
+        db.commit()
+        versao = versao_atual(db)
+    finally:
+        db.close()
+
+    for url in ('/alertas/summary', '/alertas/debug'):
+        assert cliente.get(url).status_code == 200
+    assert cliente.post('/alertas/forcar-atualizacao').status_code == 200
+    dados = resumo()
+    assert dados['total']['atrasadas'] == 1 and dados['total']['escaladas'] == 0
+    assert dados['por_unidade']['U1']['atrasadas'] == 1
+
+    db = SessionLocal()
+    try:
+        assert db.get(Alerta, alerta_id).categoria_contada == 'escaladas'
+        assert versao_atual(db) == versao
+    finally:
+        db.close()
+
+def test_recalculo_reproduz_os_contadores_incrementais():
+    criar_alertas(3, unidade='U1')
+    criar_alertas(2, unidade='U2', previsao='15:00', status_operacao='operando')
+    db = SessionLocal()
+    try:
+        incremental = resumo_contadores(db)
+        recalcular_contadores(db.connection())
+        db.commit()
+        assert resumo_contadores(db) == incremental
+    finally:
+        db.close()
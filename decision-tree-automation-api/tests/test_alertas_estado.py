@@ -0,0 +1,108 @@
+# Estado em memória (alerta_estado) e versão dos alertas (ETag de GET /alertas)
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from conftest import criar_alertas, esperar
+from fake_telegram import montar_update
+from backend.controllers.telegram_webhook import processar_update
+from backend.main import app
+from backend.config import TZ_BR
+from backend.models.alerta_model import Alerta
+from backend.models.alerta_mudanca_model import AlertaMudanca
+from backend.models.responses_model import SessionLocal
+from backend.services.alerta_estado import alerta_estado
+from backend.services.alerta_mudancas import JOURNAL_ALTERADO
+from backend.services.alerta_serializacao import POSICAO
+from backend.services.alerta_versao import alerta_versao
+from backend.services.auto_alert_scheduler import auto_alert_scheduler
+
+cliente = TestClient(app)
+
+def test_versao_sobe_uma_vez_por_commit():
+    alerta_estado.carregar()
+    antes = alerta_versao.atual()
+    criar_alertas(3)
+    assert alerta_versao.atual() == antes + 1
+    assert alerta_estado.contagens()['pendentes'] == 3
+
+def test_commit_sem_alertas_nao_muda_a_versao():
+    antes = alerta_versao.atual()
+    db = SessionLocal()
+    try:
+        db.commit()
+    finally:
+        db.close()
+    assert alerta_versao.atual() == antes
+
+def test_vencimento_move_para_atrasadas_e_sobe_a_versao():
+    criar_alertas(previsao='15:00', previsao_datetime=datetime.now(TZ_BR) + timedelta(milliseconds=200))
+    alerta_estado.carregar()
+    assert alerta_estado.contagens()['escaladas'] == 1
+    antes = alerta_versao.atual()
+
+    assert esperar(lambda: alerta_estado.contagens()['atrasadas'] == 1)
+    assert alerta_estado.contagens()['escaladas'] == 0
+    assert alerta_versao.atual() == antes + 1
+
+def _gravar_no_journal(db, mudanca_id, alerta_id):
+    db.execute(insert(AlertaMudanca.__table__).values(
+        id=mudanca_id, alerta_id=alerta_id, tipo='upsert', registrado_em=datetime.now(TZ_BR)
+    ))
+    db.info[JOURNAL_ALTERADO] = True
+    db.commit()
+
+def test_sincronizacao_aplica_id_confirmado_fora_de_ordem():
+    criar_alertas(1)
+    alerta_estado.carregar()
+    versao = alerta_estado.versao_mudancas
+
+    # Dois alertas gravados sem hooks; o journal do segundo (id maior) fica visível antes do primeiro
+    db = SessionLocal()
+    try:
+        atrasado = db.execute(insert(Alerta.__table__).values(chat_id='1', problema='A').returning(Alerta.id)).scalar()
+        adiantado = db.execute(insert(Alerta.__table__).values(chat_id='1', problema='B').returning(Alerta.id)).scalar()
+        _gravar_no_journal(db, versao + 2, adiantado)
+        assert alerta_estado.versao_mudancas == versao + 2
+        _gravar_no_journal(db, versao + 1, atrasado)
+    finally:
+        db.close()
+
+    categorias, _, _ = alerta_estado.listar({}, {})
+    assert {linha[POSICAO['id']] for linha in categorias['pendentes']} >= {atrasado, adiantado}
+    assert alerta_estado.versao_mudancas == versao + 2
+
+def test_etag_atual_responde_304_sem_corpo():
+    criar_alertas()
+    resposta = cliente.get('/alertas')
+    etag = resposta.headers['etag']
+    assert resposta.status_code == 200
+
+    condicional = cliente.get('/alertas', headers={'If-None-Match': etag})
+    assert condicional.status_code == 304
+    assert condicional.headers['etag'] == etag and condicional.content == b''
+
+    criar_alertas()
+    assert cliente.get('/alertas', headers={'If-None-Match': etag}).status_code == 200
+
+def _criar_pelo_scheduler(_):
+    db = SessionLocal()
+    try:
+        auto_alert_scheduler._create_alert_directly(db, {'problema': 'Alerta automático'})
+    finally:
+        db.close()
+
+@pytest.mark.parametrize('escrever', [
+    lambda _: cliente.post('/alertas', json={'problema': 'Vazamento'}),
+    lambda alerta_id: cliente.put(f'/alertas/{alerta_id}/status', json={'status_operacao': 'operando'}),
+    lambda _: processar_update(montar_update('15:30')),
+    _criar_pelo_scheduler,
+    lambda _: cliente.delete('/alertas/all'),
+], ids=['criar_alerta', 'status', 'webhook', 'scheduler', 'apagar_todos'])
+def test_cada_escrita_muda_o_etag(escrever):
+    alerta_id, = criar_alertas()
+    etag = cliente.get('/alertas').headers['etag']
+    escrever(alerta_id)
+    novo = cliente.get('/alertas', headers={'If-None-Match': etag})
+    assert novo.status_code == 200
+    assert novo.headers['etag'] != etag
@@ -0,0 +1,117 @@
+# Listagem paginada de GET /alertas (limites por categoria, cursor das encerradas usado pelo painel e filtros)
+from datetime import datetime, timezone
+import pytest
+from fastapi.testclient import TestClient
+from conftest import criar_alertas
+from backend.controllers.alerta_controller import _serializar_em_lotes
+from backend.main import app
+from backend.models.alerta_model import Alerta
+from backend.models.responses_model import engine
+from backend.services.alerta_estado import alerta_estado
+from backend.services.alerta_serializacao import POSICAO, selecionar_alertas
+
+cliente = TestClient(app)
+
+ENCERRADA = {'previsao': '15:00', 'status_operacao': 'operando'}
+
+def test_limite_acima_do_maximo_e_recusado():
+    resposta = cliente.get('/alertas?limit_encerradas=501')
+    assert resposta.status_code == 400
+    assert cliente.get('/alertas?limit_encerradas=500').status_code == 200
+
+@pytest.mark.parametrize('em_memoria', [False, True])
+def test_encerradas_paginadas_por_cursor(em_memoria):
+    ids = criar_alertas(7, **ENCERRADA)
+    if em_memoria:
+        alerta_estado.carregar()
+
+    vistos = []
+    url = '/alertas?limit_encerradas=3'
+    while True:
+        dados = cliente.get(url).json()
+        vistos.extend(alerta['id'] for alerta in dados['encerradas'])
+        cursor = dados['cursores']['encerradas']
+        if cursor is None:
+            break
+        url = f'/alertas?limit_encerradas=3&cursor_encerradas={cursor}'
+
+    # Mais recentes primeiro, cada alerta uma única vez
+    assert vistos == list(reversed(ids))
+
+def test_cursor_invalido_e_recusado():
+    assert cliente.get('/alertas?cursor_encerradas=xyz').status_code == 400
+
+def test_categorias_sem_limite_do_banco_em_streaming():
+    pendentes = criar_alertas(3, unidade='U1')
+    encerradas = criar_alertas(2, unidade='U1', **ENCERRADA)
+    criar_alertas(2, unidade='U2')
+    conexoes = engine.pool.checkedout()
+
+    resposta = cliente.get('/alertas?unidade=U1&limit_encerradas=1')
+    assert 'content-length' not in resposta.headers
+    dados = resposta.json()
+    assert [alerta['id'] for alerta in dados['pendentes']] == list(reversed(pendentes))
+    assert [alerta['id'] for alerta in dados['encerradas']] == [encerradas[-1]]
+    assert dados['cursores']['encerradas'] is not None
+    # Nenhuma sessão fica aberta depois do envio
+    assert engine.pool.checkedout() == conexoes
+
+    colunar = cliente.get('/alertas?unidade=U1&format=columnar').json()
+    assert colunar['pendentes']['id'] == list(reversed(pendentes))
+    assert engine.pool.checkedout() == conexoes
+
+def test_streaming_le_em_lotes_sem_transacao_aberta_entre_eles():
+    ids = criar_alertas(5)
+    conexoes = engine.pool.checkedout()
+    consulta = selecionar_alertas().order_by(Alerta.criado_em.desc(), Alerta.id.desc())
+    linhas = _serializar_em_lotes(consulta, lote=2)
+
+    primeira = next(linhas)
+    # Entre os lotes nenhuma conexão fica presa: um commit no meio do envio não espera pela leitura
+    assert engine.pool.checkedout() == conexoes
+    novo, = criar_alertas()
+    restantes = list(linhas)
+    assert [linha[POSICAO['id']] for linha in [primeira, *restantes]] == list(reversed(ids))
+    assert novo not in [linha[POSICAO['id']] for linha in restantes]
+
+def listar_ids(**filtros):
+    resposta = cliente.get('/alertas', params=filtros)
+    assert resposta.status_code == 200
+    dados = resposta.json()
+    return sorted(alerta['id'] for categoria in ('pendentes', 'escaladas', 'atrasadas', 'encerradas')
+                  for alerta in dados[categoria])
+
+def test_filtros_por_unidade_frente_e_equipamento():
+    usina_a = criar_alertas(2, unidade='Usina A', frente='F1', equipamento='Colhedora')
+    usina_a_f2 = criar_alertas(unidade='Usina A', frente='F2', equipamento='Trator', **ENCERRADA)
+    usina_b = criar_alertas(unidade='Usina B', frente='F1', equipamento='Colhedora')
+    alerta_estado.carregar()
+
+    assert listar_ids(unidade='Usina A') == usina_a + usina_a_f2
+    assert listar_ids(unidade='Usina A', frente='F1') == usina_a
+    assert listar_ids(equipamento='Colhedora') == usina_a + usina_b
+    assert listar_ids(unidade='Usina B', equipamento='Trator') == []
+    assert listar_ids() == usina_a + usina_a_f2 + usina_b
+
+def test_filtro_por_intervalo_de_criacao():
+    def criado(dia, hora):
+        return datetime(2025, 3, dia, hora, tzinfo=timezone.utc)
+
+    antes, = criar_alertas(criado_em=criado(1, 12))
+    dentro = criar_alertas(2, criado_em=criado(2, 12))
+    depois, = criar_alertas(criado_em=criado(3, 12))
+
+    assert listar_ids(criado_de='2025-03-02T00:00:00+00:00', criado_ate='2025-03-02T23:59:59+00:00') == dentro
+    assert listar_ids(criado_de='2025-03-02T00:00:00+00:00') == dentro + [depois]
+    assert listar_ids(criado_ate='2025-03-02T23:59:59+00:00') == [antes] + dentro
+    # Sem fuso: horário de Brasília (UTC-3), 12:00 UTC = 09:00
+    assert listar_ids(criado_de='2025-03-03T09:00:00') == [depois]
+    assert listar_ids(criado_de='2025-03-03T09:00:01') == []
+
+@pytest.mark.parametrize('filtros', [
+    {'criado_de': '2025-03-03', 'criado_ate': '2025-03-02'},
+    {'criado_de': 'ontem'},
+    {'criado_ate': '2025-13-01'},
+])
+def test_intervalo_invalido_e_recusado(filtros):
+    assert cliente.get('/alertas', params=filtros).status_code == 400
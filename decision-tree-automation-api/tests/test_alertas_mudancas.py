@@ -0,0 +1,71 @@
+# Journal de mudanças (alerta_mudancas) e deltas de GET /alertas/changes
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from conftest import criar_alertas, esperar
+from backend.config import TZ_BR
+from backend.main import app
+from backend.models.alerta_model import Alerta
+from backend.models.alerta_mudanca_model import AlertaMudanca
+from backend.models.responses_model import SessionLocal
+from backend.services.alerta_estado import alerta_estado
+from backend.services.alerta_mudancas import podar_mudancas
+
+cliente = TestClient(app)
+
+def mudancas(since):
+    resposta = cliente.get(f'/alertas/changes?since={since}')
+    assert resposta.status_code == 200
+    return resposta.json()
+
+def test_delta_de_criacao_alteracao_e_remocao():
+    primeiro, segundo = criar_alertas(2)
+    dados = mudancas(0)
+    assert sorted(a['id'] for a in dados['alterados']) == [primeiro, segundo]
+    versao = dados['versao']
+
+    db = SessionLocal()
+    try:
+        db.get(Alerta, primeiro).status_operacao = 'operando'
+        db.delete(db.get(Alerta, segundo))
+        db.commit()
+    finally:
+        db.close()
+
+    dados = mudancas(versao)
+    assert [a['id'] for a in dados['alterados']] == [primeiro]
+    assert dados['removidos'] == [segundo]
+    assert mudancas(dados['versao'])['alterados'] == []
+
+def test_previsao_vencida_entra_no_delta_uma_unica_vez():
+    prazo = datetime.now(TZ_BR) + timedelta(milliseconds=300)
+    [alerta_id] = criar_alertas(previsao='15:00', previsao_datetime=prazo)
+    alerta_estado.carregar()
+    versao = mudancas(0)['versao']
+
+    # A thread de prazos grava a passagem para atrasadas no journal quando a previsão vence
+    assert esperar(lambda: mudancas(versao)['alterados'])
+    dados = mudancas(versao)
+    assert [(a['id'], a['categoria']) for a in dados['alterados']] == [(alerta_id, 'atrasadas')]
+    assert alerta_estado.contagens()['atrasadas'] == 1
+
+    # Polls seguintes não repetem o alerta
+    assert mudancas(dados['versao'])['alterados'] == []
+    assert mudancas(dados['versao'])['versao'] == dados['versao']
+
+def test_since_anterior_ao_journal_podado_pede_recarga():
+    criar_alertas(3)
+    db = SessionLocal()
+    try:
+        antigo = datetime.now(TZ_BR) - timedelta(hours=48)
+        db.query(AlertaMudanca).update({AlertaMudanca.registrado_em: antigo})
+        db.commit()
+        versao = db.query(AlertaMudanca.id).order_by(AlertaMudanca.id.desc()).limit(1).scalar()
+        assert podar_mudancas(db, retencao_horas=24) == 2
+        # O registro mais recente é mantido: a versão não volta a 0
+        assert db.query(AlertaMudanca.id).all() == [(versao,)]
+    finally:
+        db.close()
+
+    assert mudancas(0)['recarregar'] is True
+    assert mudancas(versao - 1)['recarregar'] is False
+    assert mudancas(versao)['recarregar'] is False
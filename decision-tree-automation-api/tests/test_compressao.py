@@ -0,0 +1,100 @@
+# Compressão das respostas (CompressaoMiddleware): escolha da codificação, streaming, 304 e cache por ETag
+import gzip
+import brotli
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from backend.views.compressao import CacheCompressao, CompressaoMiddleware, escolher_codificacao
+from backend.views import compressao
+
+CORPO = b'{"alertas": [' + b','.join(b'{"id": %d, "problema": "Vazamento"}' % i for i in range(200)) + b']}'
+
+app = FastAPI()
+app.add_middleware(CompressaoMiddleware)
+
+@app.get('/grande')
+def grande(request: Request, versao: int = 1):
+    etag = f'W/"v{versao}"'
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'ETag': etag})
+    return Response(CORPO.replace(b'Vazamento', f'Vazamento {versao}'.encode()), media_type='application/json',
+                    headers={'ETag': etag})
+
+@app.get('/pequeno')
+def pequeno():
+    return Response(b'{"ok": true}', media_type='application/json')
+
+@app.get('/stream')
+def stream():
+    return StreamingResponse((CORPO for _ in range(3)), media_type='application/json')
+
+cliente = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def cache_limpo(monkeypatch):
+    monkeypatch.setattr(compressao, 'cache_compressao', CacheCompressao())
+
+def pedir(caminho, accept_encoding, **cabecalhos):
+    """Resposta e corpo como saiu do servidor (sem a descompressão automática do cliente)"""
+    with cliente.stream('GET', caminho, headers={'Accept-Encoding': accept_encoding, **cabecalhos}) as resposta:
+        return resposta, b''.join(resposta.iter_raw())
+
+@pytest.mark.parametrize('accept_encoding, esperada', [
+    ('br, gzip', 'br'),
+    ('gzip, deflate', 'gzip'),
+    ('*', 'br'),
+    ('br;q=0, gzip', 'gzip'),
+    ('gzip;q=0', None),
+    ('identity', None),
+    ('', None),
+])
+def test_escolhe_a_codificacao_pelo_accept_encoding(accept_encoding, esperada):
+    assert escolher_codificacao(accept_encoding) == esperada
+
+@pytest.mark.parametrize('accept_encoding, descomprimir', [('br', brotli.decompress), ('gzip', gzip.decompress)])
+def test_resposta_comprimida_com_etag_fraco(accept_encoding, descomprimir):
+    resposta, bruto = pedir('/grande', accept_encoding)
+    assert resposta.headers['content-encoding'] == accept_encoding
+    assert resposta.headers['vary'] == 'Accept-Encoding'
+    assert resposta.headers['etag'] == 'W/"v1"'
+    assert int(resposta.headers['content-length']) == len(bruto)
+    assert descomprimir(bruto) == CORPO.replace(b'Vazamento', b'Vazamento 1')
+
+@pytest.mark.parametrize('accept_encoding', ['identity', 'gzip;q=0, br;q=0'])
+def test_sem_codificacao_aceita_responde_sem_comprimir(accept_encoding):
+    resposta, bruto = pedir('/grande', accept_encoding)
+    assert 'content-encoding' not in resposta.headers
+    assert bruto == CORPO.replace(b'Vazamento', b'Vazamento 1')
+
+def test_resposta_pequena_nao_e_comprimida():
+    resposta, bruto = pedir('/pequeno', 'br, gzip')
+    assert 'content-encoding' not in resposta.headers
+    assert bruto == b'{"ok": true}'
+
+@pytest.mark.parametrize('accept_encoding, descomprimir', [('br', brotli.decompress), ('gzip', gzip.decompress)])
+def test_streaming_comprimido_bloco_a_bloco(accept_encoding, descomprimir):
+    resposta, bruto = pedir('/stream', accept_encoding)
+    assert resposta.headers['content-encoding'] == accept_encoding
+    assert 'content-length' not in resposta.headers
+    assert descomprimir(bruto) == CORPO * 3
+
+def test_304_passa_sem_corpo_nem_compressao():
+    resposta, bruto = pedir('/grande', 'br, gzip', **{'If-None-Match': 'W/"v1"'})
+    assert resposta.status_code == 304
+    assert resposta.headers['etag'] == 'W/"v1"'
+    assert 'content-encoding' not in resposta.headers
+    assert bruto == b''
+
+def test_cache_por_caminho_etag_e_codificacao():
+    cache = compressao.cache_compressao
+    primeira = pedir('/grande', 'br')[1]
+    assert pedir('/grande', 'br')[1] == primeira
+    assert cache.estatisticas()['acertos'] == 1
+
+    # Outra codificação, outra URL ou outro ETag: outra entrada
+    pedir('/grande', 'gzip')
+    _, outra_versao = pedir('/grande?versao=2', 'br')
+    assert brotli.decompress(outra_versao) == CORPO.replace(b'Vazamento', b'Vazamento 2')
+    assert cache.estatisticas()['acertos'] == 1
+    assert cache.estatisticas()['itens'] == 3
@@ -0,0 +1,68 @@
+# Disjuntor (circuit breaker) das chamadas à API do Telegram: fechado, aberto e meio aberto
+import time
+import pytest
+from backend.services.telegram_client import Disjuntor, TelegramIndisponivel, telegram
+
+def chamar(disjuntor, falhou=False, duracao=0.01):
+    sondagem = disjuntor.antes()
+    disjuntor.depois(sondagem, duracao, falhou)
+    return sondagem
+
+def abrir(disjuntor):
+    for _ in range(disjuntor.minimo_chamadas):
+        chamar(disjuntor, falhou=True)
+    assert disjuntor.estado == Disjuntor.ABERTO
+
+def test_abre_com_falhas_acima_da_taxa_e_recusa_na_hora():
+    disjuntor = Disjuntor(taxa=0.5, minimo_chamadas=4, tempo_aberto=60)
+    for falhou in (True, False, True):
+        chamar(disjuntor, falhou=falhou)
+    # Abaixo do mínimo de chamadas: continua fechado
+    assert disjuntor.estado == Disjuntor.FECHADO
+    chamar(disjuntor, falhou=False)
+    assert disjuntor.estado == Disjuntor.ABERTO
+    with pytest.raises(TelegramIndisponivel) as erro:
+        disjuntor.antes()
+    assert 0 < erro.value.tentar_em <= 60
+    assert disjuntor.espera() > 0
+
+def test_abre_com_chamadas_lentas():
+    disjuntor = Disjuntor(taxa=0.5, lentidao=1, minimo_chamadas=2)
+    chamar(disjuntor, duracao=2)
+    chamar(disjuntor, duracao=2)
+    assert disjuntor.estado == Disjuntor.ABERTO
+
+def test_meio_aberto_deixa_uma_sondagem_por_vez():
+    disjuntor = Disjuntor(minimo_chamadas=2, tempo_aberto=0.05)
+    abrir(disjuntor)
+    time.sleep(0.06)
+    assert disjuntor.espera() == 0
+    assert disjuntor.antes() is True
+    assert disjuntor.estado == Disjuntor.MEIO_ABERTO
+    with pytest.raises(TelegramIndisponivel):
+        disjuntor.antes()
+
+    disjuntor.depois(True, 0.01, falhou=False)
+    assert disjuntor.estado == Disjuntor.FECHADO
+    assert chamar(disjuntor) is False
+
+def test_sondagem_com_falha_volta_a_abrir():
+    disjuntor = Disjuntor(minimo_chamadas=2, tempo_aberto=0.05)
+    abrir(disjuntor)
+    time.sleep(0.06)
+    assert chamar(disjuntor, falhou=True) is True
+    assert disjuntor.estado == Disjuntor.ABERTO
+    assert disjuntor.aberturas == 2
+
+def test_respostas_5xx_abrem_e_4xx_nao(telegram_falso):
+    telegram.disjuntor = Disjuntor(minimo_chamadas=3, tempo_aberto=60)
+    for _ in range(3):
+        assert telegram.chamar('sendMessage', data={'chat_id': 1, 'text': ''}).status_code == 400
+    assert telegram.disjuntor.estado == Disjuntor.FECHADO
+
+    telegram_falso.taxa_erro = 1.0
+    for _ in range(3):
+        assert telegram.chamar('sendMessage', data={'chat_id': 1, 'text': 'Aviso'}).status_code >= 500
+    assert telegram.disjuntor.estado == Disjuntor.ABERTO
+    with pytest.raises(TelegramIndisponivel):
+        telegram.chamar('sendMessage', data={'chat_id': 1, 'text': 'Aviso'})
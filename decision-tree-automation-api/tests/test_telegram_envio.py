@@ -0,0 +1,71 @@
+# Fila de saída do Telegram (telegram_envio): baldes de tokens, prioridades, 429 e descarte de baldes ociosos
+import time
+import pytest
+from conftest import esperar
+from backend.services import telegram_envio
+from backend.services.telegram_envio import (
+    BaldeTokens, FilaEnvio, PRIORIDADE_CONFIRMACAO, PRIORIDADE_INFORMATIVA, PRIORIDADE_PERGUNTA
+)
+
+def test_balde_ocioso_quando_cheio_e_sem_bloqueio():
+    balde = BaldeTokens(taxa=10, capacidade=1)
+    agora = time.monotonic()
+    balde.consumir(agora)
+    assert not balde.ocioso(agora + 0.05)
+    assert balde.ocioso(agora + 0.1)
+    balde.bloquear(agora + 1)
+    assert not balde.ocioso(agora + 0.5)
+    assert balde.ocioso(agora + 1)
+
+def test_baldes_de_chats_ociosos_sao_descartados(telegram_falso, monkeypatch):
+    monkeypatch.setattr(telegram_envio, 'INTERVALO_LIMPEZA_BALDES', 0)
+    fila = FilaEnvio(limite_global=1000, limite_por_chat=20)
+    try:
+        futuros = [fila.enviar({'chat_id': chat_id, 'text': 'Aviso'}) for chat_id in range(1, 51)]
+        assert all(futuro.result(timeout=5).ok for futuro in futuros)
+
+        # Após a janela de reposição (1 / 20 s) os baldes estão cheios: o próximo despacho os descarta
+        time.sleep(0.1)
+        assert fila.enviar({'chat_id': 99, 'text': 'Aviso'}).result(timeout=5).ok
+        assert list(fila._baldes_chat) == ['99']
+        assert fila.estatisticas()['baldes_chat'] == 1
+    finally:
+        fila.parar()
+    assert len(telegram_falso.mensagens) == 51
+
+def test_confirmacao_sai_antes_das_outras_mensagens_do_chat(telegram_falso):
+    fila = FilaEnvio(limite_global=1000, limite_por_chat=5)
+    try:
+        # A primeira esvazia o balde do chat; as seguintes esperam por ele e saem por prioridade
+        assert fila.enviar({'chat_id': 7, 'text': 'primeira'}).result(timeout=5).ok
+        futuros = [fila.enviar({'chat_id': 7, 'text': texto}, prioridade) for texto, prioridade in (
+            ('informativa', PRIORIDADE_INFORMATIVA), ('pergunta', PRIORIDADE_PERGUNTA),
+            ('confirmacao', PRIORIDADE_CONFIRMACAO)
+        )]
+        for futuro in futuros:
+            futuro.result(timeout=5)
+    finally:
+        fila.parar()
+    assert [mensagem['text'] for mensagem in telegram_falso.mensagens] == ['primeira', 'confirmacao', 'pergunta', 'informativa']
+
+@pytest.mark.parametrize('limite_por_chat, pausa_global', [(20, True), (0.5, False)])
+def test_429_maior_que_o_intervalo_do_chat_pausa_todos_os_chats(telegram_falso, limite_por_chat, pausa_global):
+    # retry_after de 1 s: maior que o intervalo de 0,05 s (limite global atingido), menor que o de 2 s
+    fila = FilaEnvio(limite_global=1000, limite_por_chat=limite_por_chat)
+    try:
+        telegram_falso.taxa_429 = 1.0
+        limitado = fila.enviar({'chat_id': 1, 'text': 'limitado'})
+        assert esperar(lambda: fila.limitados == 1)
+        telegram_falso.taxa_429 = 0.0
+
+        inicio = time.monotonic()
+        assert fila.enviar({'chat_id': 2, 'text': 'outro chat'}).result(timeout=5).ok
+        espera = time.monotonic() - inicio
+        assert limitado.result(timeout=5).ok
+    finally:
+        fila.parar()
+    assert fila.estatisticas()['pausas_globais_429'] == int(pausa_global)
+    if pausa_global:
+        assert espera > 0.8
+    else:
+        assert espera < 0.5
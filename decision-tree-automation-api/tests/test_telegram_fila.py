@@ -0,0 +1,139 @@
+# Fila durável do webhook (telegram_fila): conclusão na transação do processador, novas tentativas e recuperação ao reiniciar
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+from conftest import criar_alertas, esperar
+from fake_telegram import montar_update
+from backend.config import TZ_BR
+from backend.controllers.telegram_webhook import processar_update
+from backend.models.alerta_model import Alerta
+from backend.models.responses_model import SessionLocal, engine
+from backend.models.telegram_update_model import AtualizacaoTelegram
+from backend.services.telegram_fila import MAXIMO_TENTATIVAS, RETENCAO_ERROS, fila_webhook
+
+_updates = AtualizacaoTelegram.__table__
+
+def enfileirar(texto: str):
+    dados = montar_update(texto)
+    fila_webhook._recentes.clear()
+    return fila_webhook.enfileirar(dados, json.dumps(dados).encode())
+
+def status(fila_id):
+    with engine.connect() as conexao:
+        return conexao.execute(select(_updates.c.status).where(_updates.c.id == fila_id)).scalar()
+
+def processar_na_fila(processador, condicao):
+    """Roda os workers da fila com o processador até a condição ser satisfeita"""
+    fila_webhook.iniciar(processador)
+    try:
+        return esperar(condicao)
+    finally:
+        fila_webhook.parar()
+
+def previsoes():
+    db = SessionLocal()
+    try:
+        return [alerta.previsao for alerta in db.query(Alerta).order_by(Alerta.id)]
+    finally:
+        db.close()
+
+def interromper(processador):
+    """Reserva o update e roda o processador como um worker, mas para antes de _concluir (queda do serviço)"""
+    fila_id, _, corpo, _ = fila_webhook._reservar()
+    fila_webhook._chats_ocupados.clear()
+    processador(json.loads(corpo), fila_id)
+    return fila_id
+
+def test_update_concluido_no_commit_nao_reaplica_ao_reiniciar():
+    criar_alertas(2)
+    fila_id = enfileirar('15:30')
+    assert interromper(processar_update) == fila_id
+    assert status(fila_id) == 'concluido'
+    assert previsoes() == ['15:30', None]
+
+    processados = []
+    fila_webhook.iniciar(lambda dados, fila_id: processados.append(dados))
+    try:
+        assert not esperar(lambda: processados, timeout=0.5)
+    finally:
+        fila_webhook.parar()
+    assert status(fila_id) == 'concluido'
+    assert previsoes() == ['15:30', None]
+
+def test_update_sem_commit_volta_para_a_fila():
+    criar_alertas()
+
+    def cair_antes_do_commit(dados, fila_id):
+        db = SessionLocal()
+        db.query(Alerta).update({'previsao': '09:00'})
+        db.close()
+
+    enfileirar('15:30')
+    fila_id = interromper(cair_antes_do_commit)
+    assert status(fila_id) == 'processando'
+
+    assert processar_na_fila(processar_update, lambda: status(fila_id) == 'concluido')
+    assert previsoes() == ['15:30']
+
+def test_excecao_do_processador_volta_para_a_fila():
+    criar_alertas()
+    chamadas = []
+
+    def banco_travado_na_primeira(dados, fila_id):
+        chamadas.append(fila_id)
+        if len(chamadas) == 1:
+            raise OperationalError('UPDATE alertas', {}, Exception('database is locked'))
+        return processar_update(dados, fila_id)
+
+    fila_id = enfileirar('15:30')
+    assert processar_na_fila(banco_travado_na_primeira, lambda: status(fila_id) == 'concluido')
+    assert chamadas == [fila_id, fila_id]
+    assert previsoes() == ['15:30']
+
+def test_excecao_em_todas_as_tentativas_fica_com_erro():
+    chamadas = []
+
+    def sempre_falha(dados, fila_id):
+        chamadas.append(fila_id)
+        raise RuntimeError('falha')
+
+    fila_id = enfileirar('15:30')
+    assert processar_na_fila(sempre_falha, lambda: status(fila_id) == 'erro')
+    assert len(chamadas) == MAXIMO_TENTATIVAS
+
+def test_erro_devolvido_pelo_processador_e_definitivo():
+    chamadas = []
+
+    def responde_erro(dados, fila_id):
+        chamadas.append(fila_id)
+        return {"status": "error", "msg": "falha"}
+
+    fila_id = enfileirar('15:30')
+    assert processar_na_fila(responde_erro, lambda: status(fila_id) == 'erro')
+    assert chamadas == [fila_id]
+
+def test_updates_com_erro_removidos_apos_a_retencao():
+    agora = datetime.now(TZ_BR)
+    with engine.begin() as conexao:
+        for processado_em in (agora - RETENCAO_ERROS - timedelta(minutes=1), agora):
+            conexao.execute(insert(_updates).values(corpo='{}', status='erro', tentativas=1,
+                                                    recebido_em=processado_em, processado_em=processado_em))
+    fila_webhook._ultima_limpeza = agora - timedelta(days=1)
+    fila_webhook._limpar_concluidos()
+    with engine.connect() as conexao:
+        restantes = conexao.execute(select(_updates.c.processado_em).where(_updates.c.status == 'erro')).scalars().all()
+    assert len(restantes) == 1
+
+def test_reenvio_do_mesmo_update_id_e_descartado():
+    dados = montar_update('15:30')
+    corpo = json.dumps(dados).encode()
+    fila_webhook._recentes.clear()
+    assert fila_webhook.enfileirar(dados, corpo) is not None
+    # Pelo LRU em memória e, esquecido o LRU (ex.: reinício), pela tabela de update_ids recebidos
+    assert fila_webhook.ja_recebido(dados['update_id'])
+    assert fila_webhook.enfileirar(dados, corpo) is None
+    fila_webhook._recentes.clear()
+    assert fila_webhook.enfileirar(dados, corpo) is None
+    with engine.connect() as conexao:
+        assert len(conexao.execute(select(_updates.c.id)).all()) == 1
@@ -0,0 +1,162 @@
+# Outbox do Telegram (telegram_saida): novas tentativas, dead-letter, prazo das mensagens em envio e resumos
+from concurrent.futures import Future
+from sqlalchemy import select
+from conftest import criar_alertas, esperar
+from fake_telegram import montar_update
+from backend.controllers.telegram_webhook import processar_update
+from backend.models.alerta_model import Alerta
+from backend.models.responses_model import SessionLocal, engine
+from backend.models.telegram_update_model import MensagemSaida
+from backend.services.telegram_client import telegram
+from backend.services.telegram_saida import MAXIMO_LINHAS_RESUMO, SaidaTelegram
+
+CHAT = '6435800936'
+
+def registrar(saida, *textos):
+    db = SessionLocal()
+    try:
+        for texto in textos:
+            saida.registrar_mensagem(db, CHAT, texto)
+        db.commit()
+    finally:
+        db.close()
+
+def registrar_perguntas(saida, quantidade):
+    """Cria alertas com a pergunta no outbox (como os controllers) e retorna os ids"""
+    db = SessionLocal()
+    try:
+        alertas = [Alerta(chat_id=CHAT, problema=f'Problema {i}', status_operacao='não operando') for i in range(quantidade)]
+        for alerta in alertas:
+            db.add(alerta)
+            saida.registrar_pergunta(db, alerta)
+        db.commit()
+        return [alerta.id for alerta in alertas]
+    finally:
+        db.close()
+
+def alertas(*ids):
+    """(mensagem_id, mensagem_linha, previsao) de cada alerta"""
+    db = SessionLocal()
+    try:
+        por_id = {alerta.id: alerta for alerta in db.query(Alerta).filter(Alerta.id.in_(ids))}
+        return [(por_id[i].mensagem_id, por_id[i].mensagem_linha, por_id[i].previsao) for i in ids]
+    finally:
+        db.close()
+
+def outbox():
+    with engine.connect() as conexao:
+        return conexao.execute(select(MensagemSaida.status, MensagemSaida.tentativas)).all()
+
+def test_falhas_temporarias_sao_reenviadas(telegram_falso):
+    saida = SaidaTelegram(espera_maxima=0.05)
+    telegram_falso.taxa_erro = 1.0
+    registrar(saida, 'Aviso')
+    saida.iniciar()
+    try:
+        assert esperar(lambda: saida.reagendadas >= 2)
+        telegram_falso.taxa_erro = 0.0
+        assert esperar(lambda: not outbox())
+    finally:
+        saida.parar()
+    assert [mensagem['text'] for mensagem in telegram_falso.mensagens] == ['Aviso']
+    assert saida.listar_falhas() == []
+
+def test_tentativas_esgotadas_vao_para_as_falhas_e_podem_ser_reenviadas(telegram_falso):
+    saida = SaidaTelegram(tentativas=3, espera_maxima=0.05)
+    telegram_falso.taxa_erro = 1.0
+    registrar(saida, 'Aviso')
+    saida.iniciar()
+    try:
+        assert esperar(lambda: saida.listar_falhas() and not outbox())
+        falha, = saida.listar_falhas()
+        assert (falha['texto'], falha['tentativas']) == ('Aviso', 3)
+        assert falha['ultimo_erro'].startswith('5')
+
+        telegram_falso.taxa_erro = 0.0
+        assert saida.reenviar_falhas() == 1
+        assert esperar(lambda: len(telegram_falso.mensagens) == 1 and not outbox())
+    finally:
+        saida.parar()
+    assert saida.listar_falhas() == []
+
+def test_recusa_definitiva_vai_direto_para_as_falhas(telegram_falso):
+    saida = SaidaTelegram()
+    registrar(saida, '')
+    saida.iniciar()
+    try:
+        assert esperar(lambda: saida.listar_falhas() and not outbox())
+    finally:
+        saida.parar()
+    falha, = saida.listar_falhas()
+    assert falha['tentativas'] == 1 and falha['ultimo_erro'].startswith('400')
+
+class FilaPerdida:
+    """Fila de saída que aceita o envio e nunca devolve o resultado (thread ou callback perdidos)"""
+
+    cliente = telegram
+
+    def __init__(self):
+        self.envios = []
+
+    def enviar(self, data, prioridade):
+        self.envios.append(data)
+        return Future()
+
+def test_envio_sem_resultado_volta_ao_outbox_apos_o_prazo():
+    fila = FilaPerdida()
+    saida = SaidaTelegram(fila=fila, prazo_envio=0.2)
+    registrar(saida, 'Aviso')
+    saida.iniciar()
+    try:
+        assert esperar(lambda: len(fila.envios) >= 2)
+    finally:
+        saida.parar()
+    assert saida.retomadas >= 1
+    (status, tentativas), = outbox()
+    assert status == 'enviando' and tentativas == len(fila.envios)
+
+def test_perguntas_da_janela_saem_num_resumo_numerado(telegram_falso):
+    saida = SaidaTelegram(janela=0.3)
+    ids = registrar_perguntas(saida, 3)
+    saida.iniciar()
+    try:
+        # Dentro da janela nada sai; ao fim dela, um único resumo
+        assert not esperar(lambda: telegram_falso.mensagens, timeout=0.15)
+        assert esperar(lambda: not outbox())
+    finally:
+        saida.parar()
+    resumo, = telegram_falso.mensagens
+    assert '1. Problema 0\n2. Problema 1\n3. Problema 2' in resumo['text']
+    assert alertas(*ids) == [(resumo['message_id'], linha, None) for linha in (1, 2, 3)]
+    assert (saida.resumos, saida.alertas_agrupados) == (1, 3)
+
+def test_resumo_tem_no_maximo_o_limite_de_linhas(telegram_falso):
+    saida = SaidaTelegram(janela=60)
+    ids = registrar_perguntas(saida, MAXIMO_LINHAS_RESUMO + 5)
+    saida.iniciar()
+    try:
+        # O lote cheio sai sem esperar a janela; os 5 restantes continuam esperando
+        assert esperar(lambda: len(outbox()) == 5)
+        assert not esperar(lambda: len(telegram_falso.mensagens) > 1, timeout=0.2)
+    finally:
+        saida.parar()
+    resumo, = telegram_falso.mensagens
+    assert f'{MAXIMO_LINHAS_RESUMO}. Problema {MAXIMO_LINHAS_RESUMO - 1}' in resumo['text']
+    assert f'{MAXIMO_LINHAS_RESUMO + 1}.' not in resumo['text']
+    assert [linha for _, linha, _ in alertas(*ids)] == list(range(1, MAXIMO_LINHAS_RESUMO + 1)) + [None] * 5
+
+def test_resposta_ao_resumo_preenche_os_alertas_pelas_linhas(telegram_falso):
+    # Alerta mais antigo, fora do resumo: pela fila ele receberia a primeira previsão
+    antigo, = criar_alertas()
+    saida = SaidaTelegram(janela=0.05)
+    ids = registrar_perguntas(saida, 3)
+    saida.iniciar()
+    try:
+        assert esperar(lambda: not outbox())
+    finally:
+        saida.parar()
+    resumo, = telegram_falso.mensagens
+
+    resultado = processar_update(montar_update('10:00 11:00', reply_to_message_id=resumo['message_id']))
+    assert resultado['resposta_direta'] and resultado['alertas_ids'] == ids[:2]
+    assert [previsao for _, _, previsao in alertas(antigo, *ids)] == [None, '10:00', '11:00', None]
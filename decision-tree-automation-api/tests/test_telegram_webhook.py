@@ -0,0 +1,56 @@
+# Respostas do webhook ao líder (processar_update): gravadas no outbox e entregues quando o Telegram volta
+import time
+from sqlalchemy import select
+from conftest import criar_alertas, esperar
+from fake_telegram import LIDER_ID, montar_update
+from backend.controllers.telegram_webhook import processar_update
+from backend.models.responses_model import engine
+from backend.models.telegram_update_model import MensagemSaida
+from backend.services.telegram_client import Disjuntor, telegram
+from backend.services.telegram_envio import PRIORIDADE_CONFIRMACAO
+from backend.services.telegram_saida import saida_telegram
+
+def outbox():
+    with engine.connect() as conexao:
+        return conexao.execute(
+            select(MensagemSaida.tipo, MensagemSaida.chat_id, MensagemSaida.texto, MensagemSaida.prioridade)
+            .order_by(MensagemSaida.id)
+        ).all()
+
+def abrir_disjuntor(segundos: float):
+    telegram.disjuntor = Disjuntor(tempo_aberto=segundos)
+    telegram.disjuntor._abrir(time.monotonic(), 'teste')
+
+def test_confirmacao_espera_o_disjuntor_no_outbox(telegram_falso):
+    criar_alertas()
+    abrir_disjuntor(0.5)
+
+    assert processar_update(montar_update('15:30'))['status'] == 'success'
+    (tipo, chat_id, texto, prioridade), = outbox()
+    assert (tipo, chat_id, prioridade) == ('mensagem', str(LIDER_ID), PRIORIDADE_CONFIRMACAO)
+    assert texto.startswith('✅ Previsão registrada: 15:30')
+
+    saida_telegram.iniciar()
+    try:
+        assert esperar(lambda: len(telegram_falso.mensagens) == 1 and not outbox())
+    finally:
+        saida_telegram.parar()
+    assert telegram_falso.mensagens[0]['text'] == texto
+    assert telegram.disjuntor.estado == Disjuntor.FECHADO
+
+def test_formato_invalido_grava_instrucoes_no_outbox():
+    alerta_id, = criar_alertas()
+    abrir_disjuntor(60)
+
+    assert processar_update(montar_update('amanhã cedo'))['status'] == 'invalid_format'
+    (tipo, _, texto, prioridade), = outbox()
+    assert tipo == 'mensagem' and prioridade == PRIORIDADE_CONFIRMACAO
+    assert texto.startswith('Por favor, informe a previsão apenas no formato HH:MM')
+    assert f'Alerta ID: {alerta_id}' in texto
+
+def test_sem_pendentes_grava_aviso_no_outbox():
+    abrir_disjuntor(60)
+
+    assert processar_update(montar_update('15:30'))['status'] == 'no_pending'
+    (_, _, texto, _), = outbox()
+    assert texto.startswith('Não há alertas pendentes aguardando previsão')